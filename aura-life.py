@@ -6,18 +6,63 @@ Pour lancer : streamlit run aura_streamlit.py
 Déploiement : Streamlit Cloud, Railway, Render
 
 pip install streamlit sqlalchemy plotly pandas
+
+Import / export en masse (CSV ou NDJSON) :
+    python aura-life.py import habit_logs historique.csv
+    python aura-life.py export journal journal.ndjson
+
+Benchmark (base synthétique jetable, rendu headless des pages) :
+    python aura-life.py bench --habits 20 --years 3 --out bench.json [--baseline ref.json]
+
+Configuration (variables d'environnement) :
+    AURA_DATABASE_URL           URL SQLAlchemy (défaut : sqlite:///./data/aura_life.db)
+    AURA_DB_ECHO                1 pour tracer le SQL émis
+    AURA_SQLITE_JOURNAL_MODE    défaut : WAL
+    AURA_SQLITE_SYNCHRONOUS     défaut : NORMAL
+    AURA_SQLITE_MMAP_SIZE       octets mappés en mémoire (défaut : 268435456)
+    AURA_SQLITE_CACHE_SIZE      pages, ou KiB si négatif (défaut : -65536)
+    AURA_SQLITE_BUSY_TIMEOUT    attente sur verrou en ms (défaut : 5000)
+    AURA_SQL_PROFILE            1 pour activer le profileur SQL (aussi activable dans la sidebar)
+    AURA_SQL_SLOW_MS            seuil de requête lente journalisée (défaut : 50)
+    AURA_SQL_N_PLUS_ONE         répétitions d'une même requête suspectes de N+1 (défaut : 5)
 """
 
 import os
+import re
+import io
+import sys
+import csv
+import json
+import hashlib
+import math
+import argparse
+import itertools
+import tempfile
+import statistics
+import time
+import tracemalloc
+import bisect
+import logging
 import datetime
 import random
+import sqlite3
+import collections
+import contextvars
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as concurrent_wait
+from types import SimpleNamespace
 from typing import Optional
 
 import streamlit as st
+from streamlit import runtime
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Date
+from sqlalchemy import create_engine, event, text, func, select, update, bindparam, tuple_, Column, Integer, String, Float, DateTime, Text, Date, Index, LargeBinary
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -168,10 +213,22 @@ st.markdown("""
 # DATABASE SETUP (conservé de l'original)
 # ══════════════════════════════════════════════════════════════════════════════
 
-os.makedirs('data', exist_ok=True)
-DATABASE_URL = "sqlite:///./data/aura_life.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# L'engine, le schéma et les données par défaut sont construits une seule fois
+# par process dans bootstrap() (voir MAIN APP), pas à chaque rerun Streamlit.
+
+DATABASE_URL = os.environ.get("AURA_DATABASE_URL", "sqlite:///./data/aura_life.db")
+DB_ECHO = os.environ.get("AURA_DB_ECHO", "0") == "1"
+SQL_PROFILE = os.environ.get("AURA_SQL_PROFILE", "0") == "1"
+SQL_SLOW_MS = float(os.environ.get("AURA_SQL_SLOW_MS", 50))
+SQL_N_PLUS_ONE = int(os.environ.get("AURA_SQL_N_PLUS_ONE", 5))
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("AURA_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("AURA_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("AURA_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("AURA_SQLITE_CACHE_SIZE", -64 * 1024)),
+    "busy_timeout": int(os.environ.get("AURA_SQLITE_BUSY_TIMEOUT", 5000)),
+}
+
 Base = declarative_base()
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -191,10 +248,20 @@ class Investment(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     notes = Column(Text, default="")
 
+class ValuationSnapshot(Base):
+    """Valeur d'un investissement à une date (série temporelle du portefeuille)"""
+    __tablename__ = "valuation_snapshots"
+    __table_args__ = (Index("ix_valuation_snapshots_date", "date", "delta", "flow"),)
+    investment_id = Column(Integer, primary_key=True)
+    date = Column(Date, primary_key=True)
+    value = Column(Float, nullable=False)
+    delta = Column(Float, default=0)  # value - valeur précédente de la même position
+    flow = Column(Float, default=0)   # apport : montant investi pour la première valorisation, sinon 0
+
 class EnergyLog(Base):
     __tablename__ = "energy_logs"
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     level = Column(Integer)
     mood = Column(String(50))
     activity = Column(String(100))
@@ -206,7 +273,7 @@ class Project(Base):
     id = Column(Integer, primary_key=True)
     title = Column(String(200))
     description = Column(Text, default="")
-    status = Column(String(50), default="idea")
+    status = Column(String(50), default="idea", index=True)
     priority = Column(Integer, default=5)
     category = Column(String(50), default="general")
     deadline = Column(Date, nullable=True)
@@ -224,10 +291,12 @@ class Habit(Base):
     best_streak = Column(Integer, default=0)
     skill_target = Column(String(50), default="Discipline")
     xp_reward = Column(Integer, default=10)
+    last_completed_on = Column(Date, nullable=True)  # dénormalisé depuis habit_logs
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class HabitLog(Base):
     __tablename__ = "habit_logs"
+    __table_args__ = (Index("ix_habit_logs_habit_id_completed_at", "habit_id", "completed_at"),)
     id = Column(Integer, primary_key=True)
     habit_id = Column(Integer)
     completed_at = Column(Date, default=datetime.date.today)
@@ -243,6 +312,15 @@ class Goal(Base):
     category = Column(String(50), default="finance")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class GoalProgress(Base):
+    """Valeur d'un objectif à un instant (série en ajout seul)"""
+    __tablename__ = "goal_progress"
+    __table_args__ = (Index("ix_goal_progress_goal_id_recorded_at", "goal_id", "recorded_at"),)
+    id = Column(Integer, primary_key=True)
+    goal_id = Column(Integer, nullable=False)
+    recorded_at = Column(DateTime, default=datetime.datetime.utcnow)
+    value = Column(Float, nullable=False)
+
 class UserProfile(Base):
     __tablename__ = "user_profile"
     id = Column(Integer, primary_key=True)
@@ -273,7 +351,7 @@ class Skill(Base):
 class Achievement(Base):
     __tablename__ = "achievements"
     id = Column(Integer, primary_key=True)
-    name = Column(String(100))
+    name = Column(String(100), index=True)
     description = Column(String(200))
     icon = Column(String(30))
     unlocked = Column(Integer, default=0)
@@ -285,7 +363,7 @@ class JournalEntry(Base):
     content = Column(Text)
     mood = Column(String(30))
     tags = Column(String(200), default="")
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
 
 class XPLog(Base):
     __tablename__ = "xp_logs"
@@ -293,10 +371,41 @@ class XPLog(Base):
     amount = Column(Integer)
     source = Column(String(100))
     skill_name = Column(String(50))
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class XPDaily(Base):
+    """Rollup de xp_logs par (jour, compétence), maintenu par award_xp"""
+    __tablename__ = "xp_daily"
+    day = Column(Date, primary_key=True)
+    skill_name = Column(String(50), primary_key=True, default="")
+    amount = Column(Integer, default=0)
+    events = Column(Integer, default=0)
+
+class DailyFeature(Base):
+    """Agrégats d'une journée (énergie, sommeil, habitudes, XP, journal, humeur), maintenus à l'écriture"""
+    __tablename__ = "daily_features"
+    day = Column(Date, primary_key=True)
+    energy_sum = Column(Float, default=0)
+    energy_count = Column(Integer, default=0)
+    sleep_hours = Column(Float, nullable=True)
+    sleep_quality = Column(Float, nullable=True)
+    habits_done = Column(Integer, default=0)
+    xp = Column(Integer, default=0)
+    xp_by_skill = Column(Text, default="{}")  # {"Santé": 25, ...}
+    journal_count = Column(Integer, default=0)
+    mood_sum = Column(Float, default=0)
+    mood_count = Column(Integer, default=0)
+
+class HabitDayBits(Base):
+    """Complétions d'une habitude sur une année : 1 bit par jour (jour de l'année - 1)"""
+    __tablename__ = "habit_day_bits"
+    habit_id = Column(Integer, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    bits = Column(LargeBinary(46), nullable=False)
 
 class Quest(Base):
     __tablename__ = "quests"
+    __table_args__ = (Index("ix_quests_quest_type_created_at", "quest_type", "created_at"),)
     id = Column(Integer, primary_key=True)
     title = Column(String(200))
     description = Column(Text)
@@ -305,16 +414,19 @@ class Quest(Base):
     skill_target = Column(String(50))
     target_value = Column(Integer, default=1)
     current_value = Column(Integer, default=0)
-    completed = Column(Integer, default=0)
+    trigger_event = Column(String(30), nullable=True)
+    completed = Column(Integer, default=0, index=True)
     expires_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class SleepLog(Base):
     __tablename__ = "sleep_logs"
     id = Column(Integer, primary_key=True)
-    date = Column(Date, default=datetime.date.today)
+    date = Column(Date, default=datetime.date.today, index=True)
     bedtime = Column(String(10))
     waketime = Column(String(10))
+    bed_minutes = Column(Integer)   # minutes depuis minuit, parsées de bedtime
+    wake_minutes = Column(Integer)  # minutes depuis minuit, parsées de waketime
     duration = Column(Float)
     quality = Column(Integer)
     deep_sleep = Column(Float, default=0)
@@ -333,8 +445,157 @@ class Note(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-# Créer les tables
-Base.metadata.create_all(bind=engine)
+class NoteLink(Base):
+    """Arête [[lien]] d'une note vers une autre, maintenue à l'enregistrement"""
+    __tablename__ = "note_links"
+    __table_args__ = (Index("ix_note_links_dst", "dst"),)
+    src = Column(Integer, primary_key=True)
+    dst = Column(Integer, primary_key=True)
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, index=True)
+
+class EntityTag(Base):
+    """Association tag <-> entrée de journal / note (index normalisé des chaînes tags)"""
+    __tablename__ = "entity_tags"
+    __table_args__ = (Index("ix_entity_tags_tag_id_entity", "tag_id", "entity", "entity_id"),)
+    entity = Column(String(20), primary_key=True)
+    entity_id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, primary_key=True)
+
+class StatCounter(Base):
+    """Compteurs agrégés maintenus en O(1) par les événements"""
+    __tablename__ = "stat_counters"
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, default=0)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200))
+    duration_ms = Column(Float, default=0)
+    applied_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SCHEMA MIGRATIONS
+# ══════════════════════════════════════════════════════════════════════════════
+# create_all ne modifie jamais une table existante : chaque évolution du schéma
+# (colonne, index, backfill) est une migration numérotée, appliquée une seule
+# fois et rejouable sans effet sur une base déjà à jour.
+
+logger = logging.getLogger("aura")
+
+def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """Ajoute une colonne si elle n'existe pas encore"""
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+    if column in existing:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+def _create_index(conn, name: str, table: str, *columns: str):
+    """Crée un index s'il n'existe pas encore"""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+def _migration_habit_completion(conn):
+    if _add_column(conn, "habits", "last_completed_on", "DATE"):
+        conn.execute(text(
+            "UPDATE habits SET last_completed_on = "
+            "(SELECT MAX(completed_at) FROM habit_logs WHERE habit_logs.habit_id = habits.id)"
+        ))
+    _create_index(conn, "ix_habit_logs_habit_id_completed_at", "habit_logs", "habit_id", "completed_at")
+
+def _migration_filter_indexes(conn):
+    _create_index(conn, "ix_xp_logs_created_at", "xp_logs", "created_at")
+    _create_index(conn, "ix_energy_logs_timestamp", "energy_logs", "timestamp")
+    _create_index(conn, "ix_quests_quest_type_created_at", "quests", "quest_type", "created_at")
+    _create_index(conn, "ix_quests_completed", "quests", "completed")
+    _create_index(conn, "ix_sleep_logs_date", "sleep_logs", "date")
+    _create_index(conn, "ix_journal_created_at", "journal", "created_at")
+    _create_index(conn, "ix_projects_status", "projects", "status")
+    _create_index(conn, "ix_achievements_name", "achievements", "name")
+
+def _migration_sleep_minutes(conn):
+    _add_column(conn, "sleep_logs", "bed_minutes", "INTEGER")
+    _add_column(conn, "sleep_logs", "wake_minutes", "INTEGER")
+    backfill_sleep_minutes(conn)
+    update_chronotype(conn)
+
+QUEST_TRIGGERS_BY_TITLE = {
+    "Lève-tôt": "energy_logged",
+    "Triple Habitude": "habit_completed",
+    "Pensée du Jour": "journal_written",
+    "🐉 Boss: Procrastination": "habit_completed",
+    "🐉 Boss: Chaos Mental": "journal_written",
+    "🐉 Boss: Fatigue": "sleep_logged",
+}
+
+def _migration_quest_triggers(conn):
+    _add_column(conn, "quests", "trigger_event", "VARCHAR(30)")
+    conn.execute(text("UPDATE quests SET trigger_event = :trigger WHERE title = :title AND trigger_event IS NULL"),
+                 [{"title": title, "trigger": trigger} for title, trigger in QUEST_TRIGGERS_BY_TITLE.items()])
+
+def _migration_xp_daily(conn):
+    rebuild_xp_daily(conn)
+
+def _migration_streaks(conn):
+    recompute_streaks(conn)
+    # la migration 5 a jugé les achievements de série sur l'ancien best_streak
+    evaluate_all_achievements(conn)
+
+def _migration_xp_local_day(conn):
+    rebuild_xp_daily(conn)
+    rebuild_daily_features(conn)
+
+MIGRATIONS = [
+    (1, "habits.last_completed_on + index habit_logs(habit_id, completed_at)", _migration_habit_completion),
+    (2, "index des colonnes filtrées (xp, énergie, quêtes, sommeil, journal, projets, achievements)",
+     _migration_filter_indexes),
+    (3, "rollup xp_daily reconstruit depuis xp_logs", _migration_xp_daily),
+    (4, "niveaux recalculés sur la table de progression", lambda conn: recompute_levels(conn)),
+    (5, "compteurs d'achievements + évaluation complète des règles", lambda conn: evaluate_all_achievements(conn)),
+    (6, "index plein texte FTS5 (journal, notes, projets, objectifs) + triggers", lambda conn: install_search_index(conn)),
+    (7, "graphe note_links construit depuis les [[liens]] + index notes(title)", lambda conn: rebuild_note_links(conn)),
+    (8, "index des tags (tags, entity_tags) reconstruit depuis journal.tags et notes.tags",
+     lambda conn: [rebuild_entity_tags(conn, entity) for entity in TAGGED_ENTITIES]),
+    (9, "séries et records recalculés depuis habit_logs, puis achievements réévalués", _migration_streaks),
+    (10, "bitsets annuels habit_day_bits construits depuis habit_logs", lambda conn: rebuild_habit_day_bits(conn)),
+    (11, "valuation_snapshots initialisés (montant investi, puis valeur actuelle)",
+     lambda conn: seed_valuation_snapshots(conn)),
+    (12, "goal_progress initialisé avec la valeur actuelle de chaque objectif", lambda conn: seed_goal_progress(conn)),
+    (13, "sleep_logs.bed_minutes / wake_minutes parsées + chronotype du profil", _migration_sleep_minutes),
+    (14, "daily_features construit depuis énergie, sommeil, habitudes, journal et XP",
+     lambda conn: rebuild_daily_features(conn)),
+    (15, "quests.trigger_event : quêtes existantes rattachées à leur événement", _migration_quest_triggers),
+    (16, "valuation_snapshots.flow recalculé depuis le montant investi", lambda conn: rebuild_valuation_deltas(conn)),
+    (17, "xp_daily (et daily_features) recalés sur le jour local", _migration_xp_local_day),
+]
+
+def run_migrations(bind=None) -> list:
+    """Applique les migrations manquantes et retourne leurs durées"""
+    bind = bind or engine
+    with bind.connect() as conn:
+        applied = {v for (v,) in conn.execute(text("SELECT version FROM schema_version"))}
+    report = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        start = time.perf_counter()
+        with bind.begin() as conn:
+            migrate(conn)
+            duration_ms = (time.perf_counter() - start) * 1000
+            conn.execute(
+                SchemaVersion.__table__.insert().values(
+                    version=version, description=description, duration_ms=duration_ms,
+                    applied_at=datetime.datetime.utcnow()
+                )
+            )
+        logger.info("migration %s appliquée en %.1f ms : %s", version, duration_ms, description)
+        report.append((version, description, duration_ms))
+    return report
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 # DATABASE HELPERS
@@ -361,192 +622,2912 @@ def init_skills(db):
             db.add(Skill(**s))
         db.commit()
 
-def init_profile(db):
-    """Initialise le profil utilisateur"""
-    if db.query(UserProfile).count() == 0:
-        db.add(UserProfile())
-        db.commit()
+def init_profile(db):
+    """Initialise le profil utilisateur"""
+    if db.query(UserProfile).count() == 0:
+        db.add(UserProfile())
+        db.commit()
+
+def init_achievements(db):
+    """Initialise les achievements (ajoute ceux des nouvelles règles)"""
+    existing = {name for (name,) in db.query(Achievement.name)}
+    missing = [rule for rule in ACHIEVEMENT_RULES if rule["name"] not in existing]
+    for rule in missing:
+        db.add(Achievement(name=rule["name"], description=rule["description"], icon=rule["icon"]))
+    if missing:
+        db.commit()
+
+# ══════════════════════════════════════════════════════════════════════════════
+# UNIT OF WORK & EVENT BUS
+# ══════════════════════════════════════════════════════════════════════════════
+# Une action utilisateur = une transaction. La page exécute une commande dans un
+# UnitOfWork ; la commande publie des événements métier et leurs abonnés (XP,
+# niveaux, achievements, rollups...) écrivent dans la même session. Un seul
+# commit, donc un seul fsync, clôt l'action.
+
+_EVENT_HANDLERS = collections.defaultdict(list)
+
+def subscribe(*event_names):
+    """Décorateur : abonne un handler(uow, **payload) à des événements métier"""
+    def decorator(fn):
+        for name in event_names:
+            _EVENT_HANDLERS[name].append(fn)
+        return fn
+    return decorator
+
+@st.cache_resource
+def _write_stats() -> SimpleNamespace:
+    """Commits d'écriture (≈ fsync) et dernières actions, pour tout le process"""
+    return SimpleNamespace(write_commits=0, actions=collections.deque(maxlen=20))
+
+class UnitOfWork:
+    """Session d'une action utilisateur : événements synchrones, un seul commit"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.db = get_db()
+        self.events = []
+
+    def emit(self, event_name: str, **payload):
+        """Publie un événement ; ses handlers s'exécutent dans la transaction"""
+        self.events.append(event_name)
+        for handler in _EVENT_HANDLERS.get(event_name, ()):
+            handler(self, **payload)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._commits_before = _write_stats().write_commits
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.db.close()
+        stats = _write_stats()
+        commits = stats.write_commits - self._commits_before
+        if commits or self.events:
+            action = SimpleNamespace(
+                label=self.label or (self.events[0] if self.events else "écriture"),
+                events=len(self.events), commits=commits,
+                ms=(time.perf_counter() - self._started) * 1000,
+            )
+            stats.actions.appendleft(action)
+            logger.debug("action %s : %d événement(s), %d commit(s), %.1f ms",
+                         action.label, action.events, action.commits, action.ms)
+        return False
+
+def last_action():
+    """Dernière action enregistrée (ou None)"""
+    actions = _write_stats().actions
+    return actions[0] if actions else None
+
+# ══════════════════════════════════════════════════════════════════════════════
+# HABIT TRACKING
+# ══════════════════════════════════════════════════════════════════════════════
+
+def habits_completed_on(db, day: datetime.date) -> set:
+    """Ids des habitudes complétées à une date, en une seule requête"""
+    rows = db.query(HabitLog.habit_id).filter(HabitLog.completed_at == day).distinct()
+    return {habit_id for (habit_id,) in rows}
+
+def complete_habit(uow, habit_id: int, day: Optional[datetime.date] = None):
+    """Enregistre une complétion, met à jour la série et publie habit_completed (rien si déjà complétée)"""
+    day = day or datetime.date.today()
+    logged = uow.db.query(HabitLog.id).filter(HabitLog.habit_id == habit_id, HabitLog.completed_at == day)
+    if logged.first() is not None:
+        return None
+    habit = uow.db.get(Habit, habit_id)
+    uow.db.add(HabitLog(habit_id=habit.id, completed_at=day))
+    uow.db.flush()
+    apply_completion_to_streak(uow.db, habit, day)
+    uow.emit("habit_completed", habit=habit, day=day, best_streak=habit.best_streak)
+    return habit
+
+def uncomplete_habit(uow, habit_id: int, day: Optional[datetime.date] = None):
+    """Annule la complétion d'un jour, recalcule la série et publie habit_uncompleted (rien si absente)"""
+    day = day or datetime.date.today()
+    removed = uow.db.query(HabitLog).filter(HabitLog.habit_id == habit_id, HabitLog.completed_at == day).delete()
+    if not removed:
+        return None
+    recompute_streaks(uow.db, [habit_id])
+    habit = uow.db.get(Habit, habit_id)
+    uow.db.refresh(habit)
+    uow.emit("habit_uncompleted", habit=habit, day=day)
+    return habit
+
+def delete_habit(uow, habit_id: int):
+    """Supprime une habitude et son historique"""
+    days = [d for (d,) in uow.db.query(HabitLog.completed_at).filter(HabitLog.habit_id == habit_id)]
+    uow.db.query(HabitLog).filter(HabitLog.habit_id == habit_id).delete()
+    uow.db.query(Habit).filter(Habit.id == habit_id).delete()
+    uow.emit("habit_deleted", habit_id=habit_id, days=days)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# STREAK ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+# Une série = une suite de périodes consécutives (jours, ou semaines ISO pour les
+# habitudes hebdomadaires) avec au moins une complétion. Le calcul complet lit
+# l'historique en une passe sur l'index et découpe les îlots avec numpy ; ensuite
+# une complétion du jour ne fait qu'allonger la série, et le passage de jour
+# remet à zéro les séries interrompues.
+
+_EPOCH_MONDAY = datetime.date(1970, 1, 5)
+
+def habit_period(frequency: str, day: datetime.date) -> int:
+    """Numéro de période d'un jour (jour, ou semaine commençant le lundi)"""
+    days = (day - _EPOCH_MONDAY).days
+    return days // 7 if frequency == "weekly" else days
+
+def streak_stats(periods: np.ndarray, current_period: int) -> tuple:
+    """(série en cours, record) d'après les périodes complétées"""
+    periods = np.sort(periods)
+    periods = periods[np.r_[True, np.diff(periods) != 0]]
+    breaks = np.flatnonzero(np.diff(periods) != 1)
+    lengths = np.r_[breaks, len(periods) - 1] - np.r_[-1, breaks]
+    current = int(lengths[-1]) if periods[-1] >= current_period - 1 else 0
+    return current, int(lengths.max())
+
+def csv_array(values: Optional[str], dtype=float) -> np.ndarray:
+    """Tableau numpy d'une liste group_concat ("1,2,3") ; vide si None"""
+    if not values:
+        return np.empty(0, dtype=dtype)
+    return np.array(values.split(","), dtype=dtype)
+
+def recompute_streaks(conn, habit_ids=None, today: Optional[datetime.date] = None) -> int:
+    """Recalcule séries, records et dernière complétion depuis l'historique (toutes ou certaines habitudes)"""
+    today = today or datetime.date.today()
+    scope = "1 = 1" if habit_ids is None else f"id IN ({', '.join(str(int(h)) for h in habit_ids) or 'NULL'})"
+    frequencies = dict(conn.execute(text(f"SELECT id, frequency FROM habits WHERE {scope}")).all())
+    # une ligne par habitude : jours depuis _EPOCH_MONDAY, lus sur l'index (habit_id, completed_at)
+    history = conn.execute(text(
+        "SELECT habit_id, group_concat(CAST(julianday(completed_at) - julianday('1970-01-05') AS INTEGER)) "
+        f"FROM habit_logs WHERE habit_id IN (SELECT id FROM habits WHERE {scope}) GROUP BY habit_id"
+    )).all()
+
+    updates = []
+    for habit_id, days in history:
+        days = csv_array(days, dtype=np.int64)
+        span = 7 if frequencies.get(habit_id) == "weekly" else 1
+        streak, best = streak_stats(days // span, habit_period(frequencies.get(habit_id), today))
+        last = _EPOCH_MONDAY + datetime.timedelta(days=int(days.max()))
+        updates.append({"habit_id": habit_id, "streak": streak, "best_streak": best,
+                        "last_completed_on": last.isoformat()})
+
+    conn.execute(text(f"UPDATE habits SET streak = 0, best_streak = 0, last_completed_on = NULL WHERE {scope}"))
+    if updates:
+        conn.execute(text("UPDATE habits SET streak = :streak, best_streak = :best_streak, "
+                          "last_completed_on = :last_completed_on WHERE id = :habit_id"), updates)
+    return len(updates)
+
+def apply_completion_to_streak(db, habit, day: datetime.date):
+    """Mise à jour incrémentale après une complétion (recalcul ciblé si elle est antérieure)"""
+    period = habit_period(habit.frequency, day)
+    last = habit_period(habit.frequency, habit.last_completed_on) if habit.last_completed_on else None
+    if last is not None and period < last:
+        recompute_streaks(db, [habit.id])
+        db.refresh(habit)
+        return
+    if last is None or period > last:
+        habit.streak = habit.streak + 1 if last is not None and period == last + 1 else 1
+        habit.best_streak = max(habit.best_streak or 0, habit.streak)
+    if habit.last_completed_on is None or day > habit.last_completed_on:
+        habit.last_completed_on = day
+
+def roll_over_streaks(db, today: Optional[datetime.date] = None) -> int:
+    """Remet à zéro les séries dont la période précédente n'a pas été complétée"""
+    today = today or datetime.date.today()
+    week_start = _EPOCH_MONDAY + datetime.timedelta(days=7 * habit_period("weekly", today))
+    result = db.execute(text(
+        "UPDATE habits SET streak = 0 WHERE streak > 0 AND (last_completed_on IS NULL OR last_completed_on < "
+        "CASE WHEN frequency = 'weekly' THEN :weekly_cut ELSE :daily_cut END)"
+    ), {"daily_cut": (today - datetime.timedelta(days=1)).isoformat(),
+        "weekly_cut": (week_start - datetime.timedelta(days=7)).isoformat()})
+    return result.rowcount
+
+@st.cache_resource(show_spinner=False)
+def _rollover_state() -> SimpleNamespace:
+    return SimpleNamespace(day=None)
+
+def ensure_daily_rollover(today: Optional[datetime.date] = None):
+    """Passage de jour : une fois par jour et par process"""
+    today = today or datetime.date.today()
+    state = _rollover_state()
+    if state.day == today:
+        return
+    with UnitOfWork("Passage de jour") as uow:
+        reset = roll_over_streaks(uow.db, today)
+    state.day = today
+    if reset:
+        logger.info("passage de jour %s : %d série(s) interrompue(s)", today, reset)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# HEATMAP BITSETS
+# ══════════════════════════════════════════════════════════════════════════════
+# Une ligne (habitude, année) porte 46 octets = 368 bits, un par jour de l'année.
+# Les heatmaps et les taux de complétion se lisent sur ces bitsets (popcount),
+# sans charger une seule ligne de habit_logs.
+
+YEAR_BYTES = 46
+
+def _day_bit(day: datetime.date) -> int:
+    return day.timetuple().tm_yday - 1
+
+def set_habit_day(db, habit_id: int, day: datetime.date, done: bool = True):
+    """Allume ou éteint le bit d'un jour"""
+    row = db.get(HabitDayBits, (habit_id, day.year))
+    if row is None:
+        if not done:
+            return
+        row = HabitDayBits(habit_id=habit_id, year=day.year, bits=bytes(YEAR_BYTES))
+        db.add(row)
+    bits = bytearray(row.bits)
+    bit = _day_bit(day)
+    if done:
+        bits[bit >> 3] |= 1 << (bit & 7)
+    else:
+        bits[bit >> 3] &= ~(1 << (bit & 7)) & 0xFF
+    row.bits = bytes(bits)
+
+def rebuild_habit_day_bits(conn):
+    """Reconstruit tous les bitsets depuis l'historique (une ligne lue par habitude et année)"""
+    rows = conn.execute(text(
+        "SELECT habit_id, CAST(strftime('%Y', completed_at) AS INTEGER), "
+        "group_concat(CAST(strftime('%j', completed_at) AS INTEGER) - 1) "
+        "FROM habit_logs GROUP BY habit_id, strftime('%Y', completed_at)"
+    )).all()
+    conn.execute(text("DELETE FROM habit_day_bits"))
+    values = []
+    for habit_id, year, days in rows:
+        flags = np.zeros(YEAR_BYTES * 8, dtype=bool)
+        flags[csv_array(days, dtype=np.int64)] = True
+        values.append({"habit_id": habit_id, "year": year,
+                       "bits": np.packbits(flags, bitorder="little").tobytes()})
+    if values:
+        conn.execute(HabitDayBits.__table__.insert(), values)
+
+def year_completion_rate(bits: bytes, year: int) -> float:
+    """Part des jours d'une année complétés (popcount)"""
+    days = 366 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 365
+    return int.from_bytes(bits, "little").bit_count() / days
+
+def habit_day_matrix(db, end: datetime.date, days: int = 365) -> SimpleNamespace:
+    """Matrice (habitudes x jours) des complétions sur la fenêtre [end - days + 1, end]"""
+    start = end - datetime.timedelta(days=days - 1)
+    habit_ids = [h for (h,) in db.query(Habit.id).order_by(Habit.id)]
+    index = {h: i for i, h in enumerate(habit_ids)}
+    years = list(range(start.year, end.year + 1))
+    # bits de chaque année concaténés : la colonne d'un jour = son décalage depuis le 1er janvier de start
+    full = np.zeros((len(habit_ids), YEAR_BYTES * 8 * len(years)), dtype=bool)
+    for habit_id, year, bits in db.query(HabitDayBits.habit_id, HabitDayBits.year, HabitDayBits.bits).filter(
+            HabitDayBits.year.in_(years)).order_by(HabitDayBits.habit_id, HabitDayBits.year):
+        if habit_id in index:
+            offset = (datetime.date(year, 1, 1) - datetime.date(start.year, 1, 1)).days
+            year_days = (datetime.date(year + 1, 1, 1) - datetime.date(year, 1, 1)).days
+            flags = np.unpackbits(np.frombuffer(bits, dtype=np.uint8), bitorder="little").astype(bool)
+            full[index[habit_id], offset:offset + year_days] = flags[:year_days]
+    first = _day_bit(start)
+    matrix = full[:, first:first + days]
+    return SimpleNamespace(habit_ids=habit_ids, start=start, matrix=matrix,
+                           rates=matrix.mean(axis=1) if days else np.zeros(len(habit_ids)))
+
+def heatmap_grid(values: np.ndarray, start: datetime.date) -> tuple:
+    """Valeurs journalières -> grille 7 x semaines (lundi en haut) façon GitHub, et dates"""
+    pad = start.weekday()
+    cells = np.full(pad + len(values), np.nan)
+    cells[pad:] = values
+    weeks = -(-len(cells) // 7)
+    cells = np.pad(cells, (0, weeks * 7 - len(cells)), constant_values=np.nan)
+    dates = [(start + datetime.timedelta(days=i - pad)).strftime("%d/%m/%Y") for i in range(weeks * 7)]
+    return cells.reshape(weeks, 7).T, np.array(dates, dtype=object).reshape(weeks, 7).T
+
+def heatmap_figure(rows: list, start: datetime.date, colorscale="Greens") -> go.Figure:
+    """Heatmaps (titre, valeurs) empilées en blocs de 7 lignes dans une seule trace"""
+    grids, names = [], []
+    dates = None
+    for title, values in rows:
+        grid, dates = heatmap_grid(np.asarray(values, dtype=float), start)
+        grids.append(np.vstack([grid, np.full((1, grid.shape[1]), np.nan)]))
+        names.append(title)
+    z = np.vstack(grids)
+    hover = np.vstack([np.vstack([dates, np.full((1, dates.shape[1]), "", dtype=object)])] * len(rows))
+    fig = go.Figure(go.Heatmap(z=z, text=hover, hovertemplate="%{text} : %{z:.0%}<extra></extra>",
+                               colorscale=colorscale, zmin=0, zmax=1, showscale=False, xgap=2, ygap=2))
+    fig.update_yaxes(autorange="reversed", tickvals=[8 * i + 3 for i in range(len(rows))], ticktext=names)
+    fig.update_xaxes(showticklabels=False)
+    fig.update_layout(height=60 + 110 * len(rows), margin=dict(l=0, r=0, t=10, b=0),
+                      paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white')
+    return fig
+
+@subscribe("habit_completed")
+def _mark_habit_day(uow, habit, day, **_):
+    set_habit_day(uow.db, habit.id, day, True)
+
+@subscribe("habit_uncompleted")
+def _unmark_habit_day(uow, habit, day, **_):
+    set_habit_day(uow.db, habit.id, day, False)
+
+@subscribe("habit_deleted")
+def _drop_habit_days(uow, habit_id, **_):
+    uow.db.query(HabitDayBits).filter(HabitDayBits.habit_id == habit_id).delete()
+
+# ══════════════════════════════════════════════════════════════════════════════
+# XP ROLLUP
+# ══════════════════════════════════════════════════════════════════════════════
+
+def record_xp_daily(db, day: datetime.date, skill_name: str, amount: int, events: int = 1):
+    """Incrémente le rollup xp_daily dans la transaction courante"""
+    stmt = sqlite_insert(XPDaily).values(day=day, skill_name=skill_name, amount=amount, events=events)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["day", "skill_name"],
+        set_={"amount": XPDaily.amount + stmt.excluded.amount,
+              "events": XPDaily.events + stmt.excluded.events}
+    ))
+
+@subscribe("xp_awarded")
+def _rollup_xp_daily(uow, amount: int, skill_name: str, day: datetime.date, **_):
+    record_xp_daily(uow.db, day, skill_name, amount)
+
+def rebuild_xp_daily(conn):
+    """Reconstruit entièrement xp_daily à partir de xp_logs (created_at UTC, jour local)"""
+    conn.execute(text("DELETE FROM xp_daily"))
+    conn.execute(text(
+        "INSERT INTO xp_daily (day, skill_name, amount, events) "
+        "SELECT date(created_at, 'localtime'), COALESCE(skill_name, ''), SUM(amount), COUNT(*) "
+        "FROM xp_logs GROUP BY date(created_at, 'localtime'), COALESCE(skill_name, '')"
+    ))
+
+def xp_per_day(db, start: datetime.date, end: datetime.date, skill_name: Optional[str] = None) -> dict:
+    """XP total par jour sur [start, end], lu dans le rollup"""
+    query = db.query(XPDaily.day, func.sum(XPDaily.amount)).filter(
+        XPDaily.day >= start, XPDaily.day <= end)
+    if skill_name is not None:
+        query = query.filter(XPDaily.skill_name == skill_name)
+    return dict(query.group_by(XPDaily.day).all())
+
+def xp_per_skill_day(db, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+    """XP par jour et par compétence sur [start, end], lu dans le rollup"""
+    rows = db.query(XPDaily.day, XPDaily.skill_name, XPDaily.amount).filter(
+        XPDaily.day >= start, XPDaily.day <= end).all()
+    return pd.DataFrame(rows, columns=["Jour", "Compétence", "XP"])
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PROGRESSION ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+# Les seuils de niveau et les titres sont précalculés une fois : level_from_xp et
+# get_title ne font plus qu'une recherche dichotomique. Toute modification de la
+# courbe doit s'accompagner d'une migration qui appelle recompute_levels().
+
+LEVEL_CURVE_BASE = 100
+LEVEL_CURVE_EXPONENT = 1.5
+MAX_LEVEL = 10000
+
+def xp_for_level(level: int) -> int:
+    """XP nécessaire pour atteindre un niveau"""
+    return int(LEVEL_CURVE_BASE * (level ** LEVEL_CURVE_EXPONENT))
+
+# LEVEL_THRESHOLDS[i] = XP nécessaire pour atteindre le niveau i + 2
+LEVEL_THRESHOLDS = [xp_for_level(level) for level in range(2, MAX_LEVEL + 1)]
+_LEVEL_THRESHOLDS_NP = np.asarray(LEVEL_THRESHOLDS, dtype=np.int64)
+
+TITLES = [
+    (1, "Apprenti de la Vie"),
+    (5, "Explorateur"),
+    (10, "Aventurier"),
+    (15, "Guerrier du Quotidien"),
+    (20, "Maître de Soi"),
+    (25, "Sage"),
+    (30, "Légende Vivante"),
+    (40, "Architecte de Destin"),
+    (50, "Transcendant"),
+]
+_TITLE_LEVELS = [lvl for lvl, _ in TITLES]
+
+def level_from_xp(xp: int) -> int:
+    """Calcule le niveau à partir de l'XP total"""
+    return 1 + bisect.bisect_right(LEVEL_THRESHOLDS, xp)
+
+def get_title(level: int) -> str:
+    """Titre basé sur le niveau"""
+    index = bisect.bisect_right(_TITLE_LEVELS, level) - 1
+    return TITLES[max(index, 0)][1]
+
+def level_progress(xp: int, level: int) -> float:
+    """Fraction (0-1) du niveau courant déjà parcourue"""
+    start = xp_for_level(level) if level > 1 else 0
+    end = xp_for_level(level + 1)
+    return max(0.0, min((xp - start) / (end - start), 1.0)) if end > start else 0.0
+
+def recompute_levels(conn):
+    """Recalcule en une passe vectorisée les niveaux du profil et des compétences"""
+    for table in (Skill.__table__, UserProfile.__table__):
+        xp_column = table.c.xp if table is Skill.__table__ else table.c.total_xp
+        rows = conn.execute(table.select().with_only_columns(table.c.id, xp_column)).all()
+        if not rows:
+            continue
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        xp = np.fromiter((r[1] or 0 for r in rows), dtype=np.int64, count=len(rows))
+        levels = 1 + np.searchsorted(_LEVEL_THRESHOLDS_NP, xp, side="right")
+        values = [{"_id": int(i), "level": int(lvl)} for i, lvl in zip(ids, levels)]
+        if table is UserProfile.__table__:
+            for v in values:
+                v["title"] = get_title(v["level"])
+        stmt = table.update().where(table.c.id == bindparam("_id"))
+        conn.execute(stmt.values({k: bindparam(k) for k in values[0] if k != "_id"}), values)
+
+def forecast_days_to_level(db, total_xp: int, level: int, span: int = 14,
+                           history_days: int = 60) -> Optional[int]:
+    """Jours estimés avant le prochain niveau (moyenne exponentielle de l'XP/jour)"""
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=i) for i in range(history_days, 0, -1)]
+    per_day = xp_per_day(db, days[0], today)
+    series = pd.Series([per_day.get(d, 0) for d in days], dtype=float)
+    rate = series.ewm(span=span, adjust=False).mean().iloc[-1]
+    if rate <= 0:
+        # Pas d'historique complet : on se rabat sur l'XP du jour
+        rate = float(per_day.get(today, 0))
+    if rate <= 0:
+        return None
+    xp_needed = xp_for_level(level + 1) - total_xp
+    return max(1, math.ceil(xp_needed / rate))
+
+# ══════════════════════════════════════════════════════════════════════════════
+# GAMIFICATION FUNCTIONS
+# ══════════════════════════════════════════════════════════════════════════════
+
+def award_xp(uow, amount: int, source: str, skill_name: str = None):
+    """Attribue de l'XP au profil et à une compétence, puis publie xp_awarded"""
+    db = uow.db
+    profile = db.query(UserProfile).first()
+    if not profile:
+        # pas de commit ici : le profil est créé dans la transaction de l'action
+        profile = UserProfile()
+        db.add(profile)
+        db.flush()
+    
+    old_level = profile.level
+    profile.total_xp += amount
+    profile.level = level_from_xp(profile.total_xp)
+    profile.title = get_title(profile.level)
+    
+    skill = None
+    if skill_name:
+        skill = db.query(Skill).filter(Skill.name == skill_name).first()
+        if skill:
+            skill.xp += amount
+            skill.level = level_from_xp(skill.xp)
+    
+    db.add(XPLog(amount=amount, source=source, skill_name=skill_name or "", created_at=datetime.datetime.utcnow()))
+    # jour local, comme les habitudes, les quêtes et les prévisions
+    uow.emit("xp_awarded", amount=amount, skill_name=skill_name or "", day=datetime.date.today(),
+             profile_level=profile.level, total_xp=profile.total_xp,
+             skill_level=skill.level if skill else 0)
+    
+    return profile.level > old_level
+
+def generate_daily_quests(db):
+    """Génère les quêtes quotidiennes"""
+    today = datetime.date.today()
+    existing = len(load_quests("daily", datetime.datetime.combine(today, datetime.time.min)))
+    
+    if existing == 0:
+        daily_quests = [
+            {"title": "Lève-tôt", "description": "Logger ton énergie", "quest_type": "daily", "xp_reward": 30, "skill_target": "Énergie", "target_value": 1, "trigger_event": "energy_logged"},
+            {"title": "Triple Habitude", "description": "Compléter 3 habitudes", "quest_type": "daily", "xp_reward": 50, "skill_target": "Discipline", "target_value": 3, "trigger_event": "habit_completed"},
+            {"title": "Pensée du Jour", "description": "Écrire dans le journal", "quest_type": "daily", "xp_reward": 25, "skill_target": "Intelligence", "target_value": 1, "trigger_event": "journal_written"},
+        ]
+        tomorrow = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min)
+        for q in daily_quests:
+            q["expires_at"] = tomorrow
+            db.add(Quest(**q))
+        invalidate_quest_index(db)
+
+def generate_weekly_quest(db):
+    """Génère la quête boss hebdomadaire"""
+    today = datetime.date.today()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    existing = len(load_quests("boss", datetime.datetime.combine(week_start, datetime.time.min)))
+    
+    if existing == 0:
+        bosses = [
+            {"title": "🐉 Boss: Procrastination", "description": "Compléter 20 habitudes cette semaine", "xp_reward": 500, "skill_target": "Discipline", "target_value": 20, "trigger_event": "habit_completed"},
+            {"title": "🐉 Boss: Chaos Mental", "description": "Écrire 5 entrées journal", "xp_reward": 400, "skill_target": "Intelligence", "target_value": 5, "trigger_event": "journal_written"},
+            {"title": "🐉 Boss: Fatigue", "description": "Logger 7 nuits de sommeil", "xp_reward": 450, "skill_target": "Santé", "target_value": 7, "trigger_event": "sleep_logged"},
+        ]
+        boss = random.choice(bosses)
+        boss["quest_type"] = "boss"
+        boss["expires_at"] = datetime.datetime.combine(week_start + datetime.timedelta(days=7), datetime.time.min)
+        db.add(Quest(**boss))
+        invalidate_quest_index(db)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ACHIEVEMENT ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+# Chaque règle s'abonne à un événement métier et compare une métrique à un seuil.
+# Les métriques viennent du payload de l'événement ou de compteurs stat_counters
+# incrémentés en O(1) : seules les règles encore verrouillées de l'événement
+# reçu sont évaluées, sans jamais rescanner les tables.
+
+ACHIEVEMENT_RULES = [
+    {"name": "Premier Pas", "description": "Compléter ta première habitude", "icon": "🚩",
+     "event": "habit_completed", "metric": "habit_completions", "threshold": 1},
+    {"name": "Série de 7", "description": "Maintenir une habitude 7 jours", "icon": "🔥",
+     "event": "habit_completed", "metric": "best_streak", "threshold": 7},
+    {"name": "Série de 30", "description": "Maintenir une habitude 30 jours", "icon": "🏆",
+     "event": "habit_completed", "metric": "best_streak", "threshold": 30},
+    {"name": "Niveau 5", "description": "Atteindre le niveau 5", "icon": "⭐",
+     "event": "xp_awarded", "metric": "profile_level", "threshold": 5},
+    {"name": "Niveau 10", "description": "Atteindre le niveau 10", "icon": "👑",
+     "event": "xp_awarded", "metric": "profile_level", "threshold": 10},
+    {"name": "Millionnaire XP", "description": "Accumuler 10000 XP", "icon": "💎",
+     "event": "xp_awarded", "metric": "total_xp", "threshold": 10000},
+    {"name": "Penseur", "description": "Écrire 10 entrées de journal", "icon": "📖",
+     "event": "journal_written", "metric": "journal_entries", "threshold": 10},
+    {"name": "Maître Skill", "description": "Avoir une compétence niveau 10", "icon": "🏅",
+     "event": "xp_awarded", "metric": "skill_level", "threshold": 10},
+]
+
+# Compteurs incrémentés à chaque événement (nom du compteur -> incrément)
+ACHIEVEMENT_COUNTERS = {
+    "habit_completed": {"habit_completions": 1},
+    "habit_uncompleted": {"habit_completions": -1},
+    "journal_written": {"journal_entries": 1},
+}
+
+_RULES_BY_EVENT = collections.defaultdict(list)
+for _rule in ACHIEVEMENT_RULES:
+    _RULES_BY_EVENT[_rule["event"]].append(_rule)
+
+def bump_counter(db, name: str, delta: int = 1) -> int:
+    """Incrémente un compteur et retourne sa nouvelle valeur"""
+    stmt = sqlite_insert(StatCounter).values(name=name, value=delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"], set_={"value": StatCounter.value + stmt.excluded.value}
+    ).returning(StatCounter.value)
+    return db.execute(stmt).scalar_one()
+
+def process_achievement_event(db, event_name: str, **payload) -> list:
+    """Met à jour les compteurs de l'événement et n'évalue que ses règles"""
+    metrics = dict(payload)
+    for counter, delta in ACHIEVEMENT_COUNTERS.get(event_name, {}).items():
+        metrics[counter] = bump_counter(db, counter, delta)
+    
+    rules = _RULES_BY_EVENT.get(event_name)
+    if not rules:
+        return []
+    locked = load_locked_achievement_names()
+    unlocks = [r["name"] for r in rules
+               if r["name"] in locked and metrics.get(r["metric"], 0) >= r["threshold"]]
+    if unlocks:
+        db.query(Achievement).filter(
+            Achievement.name.in_(unlocks), Achievement.unlocked == 0
+        ).update({"unlocked": 1, "unlocked_at": datetime.datetime.utcnow()}, synchronize_session=False)
+    return unlocks
+
+def _achievement_handler(event_name: str):
+    def handler(uow, **payload):
+        process_achievement_event(uow.db, event_name, **payload)
+    return handler
+
+for _event_name in sorted(_RULES_BY_EVENT.keys() | ACHIEVEMENT_COUNTERS.keys()):
+    subscribe(_event_name)(_achievement_handler(_event_name))
+
+def evaluate_all_achievements(conn) -> list:
+    """Évaluation complète (backfill) : compteurs recalculés puis toutes les règles"""
+    def scalar(sql):
+        return conn.execute(text(sql)).scalar() or 0
+    
+    metrics = {
+        "habit_completions": scalar("SELECT COUNT(*) FROM habit_logs"),
+        "journal_entries": scalar("SELECT COUNT(*) FROM journal"),
+        "best_streak": scalar("SELECT MAX(best_streak) FROM habits"),
+        "profile_level": scalar("SELECT MAX(level) FROM user_profile"),
+        "total_xp": scalar("SELECT MAX(total_xp) FROM user_profile"),
+        "skill_level": scalar("SELECT MAX(level) FROM skills"),
+    }
+    counters = {name for deltas in ACHIEVEMENT_COUNTERS.values() for name in deltas}
+    for name in counters:
+        conn.execute(text("INSERT OR REPLACE INTO stat_counters (name, value) VALUES (:name, :value)"),
+                     {"name": name, "value": metrics[name]})
+    
+    unlocks = [r["name"] for r in ACHIEVEMENT_RULES if metrics.get(r["metric"], 0) >= r["threshold"]]
+    if unlocks:
+        table = Achievement.__table__
+        conn.execute(table.update().where(table.c.name.in_(unlocks), table.c.unlocked == 0)
+                     .values(unlocked=1, unlocked_at=datetime.datetime.utcnow()))
+    return unlocks
+
+# ══════════════════════════════════════════════════════════════════════════════
+# USER ACTIONS
+# ══════════════════════════════════════════════════════════════════════════════
+# Commandes appelées par les pages dans un UnitOfWork, et récompenses XP
+# branchées sur les événements qu'elles publient.
+
+def log_energy(uow, **fields):
+    """Enregistre un niveau d'énergie"""
+    log = EnergyLog(**fields)
+    uow.db.add(log)
+    uow.db.flush()
+    uow.emit("energy_logged", log=log)
+    return log
+
+def log_sleep(uow, **fields):
+    """Enregistre une nuit"""
+    fields.setdefault("bed_minutes", clock_minutes(fields.get("bedtime")))
+    fields.setdefault("wake_minutes", clock_minutes(fields.get("waketime")))
+    log = SleepLog(**fields)
+    uow.db.add(log)
+    uow.db.flush()
+    uow.emit("sleep_logged", log=log)
+    return log
+
+def write_journal_entry(uow, **fields):
+    """Ajoute une entrée au journal"""
+    entry = JournalEntry(**fields)
+    uow.db.add(entry)
+    uow.db.flush()
+    uow.emit("journal_written", entry=entry)
+    return entry
+
+def delete_journal_entry(uow, entry_id: int):
+    """Supprime une entrée du journal"""
+    entry = uow.db.get(JournalEntry, entry_id)
+    if entry is None:
+        return
+    created_at, mood = entry.created_at, entry.mood
+    uow.db.query(JournalEntry).filter(JournalEntry.id == entry_id).delete()
+    uow.emit("journal_deleted", entry_id=entry_id, created_at=created_at, mood=mood)
+
+def set_project_status(uow, project_id: int, status: str):
+    """Change le statut d'un projet (publie project_completed à la complétion)"""
+    project = uow.db.get(Project, project_id)
+    project.status = status
+    if status == "completed":
+        project.completed_at = datetime.datetime.utcnow()
+        uow.emit("project_completed", project=project)
+    return project
+
+def complete_quest(uow, quest_id: int):
+    """Marque une quête comme complétée"""
+    quest = uow.db.get(Quest, quest_id)
+    if not quest.completed:
+        quest.completed = 1
+        uow.emit("quest_completed", quest=quest)
+    return quest
+
+@subscribe("habit_completed")
+def _reward_habit(uow, habit, **_):
+    award_xp(uow, habit.xp_reward, f"Habitude: {habit.name}", habit.skill_target)
+
+@subscribe("habit_uncompleted")
+def _revoke_habit_reward(uow, habit, **_):
+    award_xp(uow, -habit.xp_reward, f"Habitude annulée: {habit.name}", habit.skill_target)
+
+@subscribe("energy_logged")
+def _reward_energy(uow, **_):
+    award_xp(uow, 5, "Log énergie", "Énergie")
+
+@subscribe("sleep_logged")
+def _reward_sleep(uow, **_):
+    award_xp(uow, 10, "Log sommeil", "Santé")
+
+@subscribe("journal_written")
+def _reward_journal(uow, **_):
+    award_xp(uow, 5, "Entrée journal", "Intelligence")
+
+@subscribe("project_completed")
+def _reward_project(uow, project, **_):
+    award_xp(uow, 50, f"Projet: {project.title}", "Business")
+
+@subscribe("quest_completed")
+def _reward_quest(uow, quest, **_):
+    award_xp(uow, quest.xp_reward, f"Quête: {quest.title}", quest.skill_target)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# QUÊTES (progression)
+# ══════════════════════════════════════════════════════════════════════════════
+# Chaque quête active compte un événement métier (trigger_event). Un index en
+# mémoire trigger -> quêtes actives évite toute relecture : un événement coûte
+# une UPDATE par clé primaire, et la quête qui atteint sa cible est complétée
+# (XP comprise) dans la même transaction. Aucun scan des tables de logs.
+
+QUEST_TRIGGERS = ("habit_completed", "journal_written", "sleep_logged", "energy_logged")
+QUEST_SPAN_DAYS = {"daily": 1, "boss": 7}  # fenêtre d'une quête : les jours qui précèdent expires_at
+
+@st.cache_resource(show_spinner=False)
+def _quest_index() -> SimpleNamespace:
+    """trigger -> {quest_id: (premier jour, expires_at)} des quêtes actives, pour tout le process"""
+    return SimpleNamespace(by_trigger=None, day=None, lock=threading.Lock())
+
+def invalidate_quest_index(db=None):
+    """À appeler quand des quêtes sont créées : l'index sera relu au prochain événement.
+
+    Avec une session, l'index est aussi invalidé à son commit : une relecture
+    faite entre-temps par un autre rerun ne voyait pas encore les nouvelles quêtes.
+    """
+    index = _quest_index()
+    index.by_trigger = None
+    if db is not None:
+        event.listen(db, "after_commit", lambda session: setattr(index, "by_trigger", None), once=True)
+
+def active_quests_by_trigger(now: datetime.datetime) -> dict:
+    """Index des quêtes actives, relu une fois par jour ou après invalidation"""
+    index = _quest_index()
+    by_trigger = index.by_trigger
+    if by_trigger is not None and index.day == now.date():
+        return by_trigger
+    with index.lock:
+        db = get_db()
+        try:
+            rows = db.execute(text(
+                "SELECT id, trigger_event, quest_type, expires_at FROM quests "
+                "WHERE completed = 0 AND trigger_event IS NOT NULL "
+                "AND (expires_at IS NULL OR expires_at > :now)"
+            ), {"now": now}).all()
+        finally:
+            db.close()
+        by_trigger = {trigger: {} for trigger in QUEST_TRIGGERS}
+        for quest_id, trigger, quest_type, expires_at in rows:
+            if trigger in by_trigger:
+                if isinstance(expires_at, str):
+                    expires_at = datetime.datetime.fromisoformat(expires_at)
+                first_day = None
+                if expires_at is not None and quest_type in QUEST_SPAN_DAYS:
+                    first_day = (expires_at - datetime.timedelta(days=QUEST_SPAN_DAYS[quest_type])).date()
+                by_trigger[trigger][quest_id] = (first_day, expires_at)
+        index.by_trigger, index.day = by_trigger, now.date()
+    return by_trigger
+
+def advance_quests(uow, trigger: str, day: Optional[datetime.date] = None, step: int = 1) -> list:
+    """Fait avancer les quêtes d'un trigger dont la fenêtre contient day (aujourd'hui par défaut)"""
+    now = datetime.datetime.now()  # même horloge (locale) que expires_at des quêtes générées
+    day = day or now.date()
+    quests = active_quests_by_trigger(now).get(trigger)
+    if not quests:
+        return []
+    # un événement antidaté ne compte que pour les quêtes dont la fenêtre couvre son jour
+    ids = [quest_id for quest_id, (first_day, expires_at) in quests.items()
+           if (expires_at is None or expires_at > now)
+           and (first_day is None or first_day <= day < expires_at.date())]
+    if not ids:
+        return []
+    rows = uow.db.execute(text(
+        "UPDATE quests SET current_value = MAX(COALESCE(current_value, 0) + :step, 0) "
+        "WHERE id IN :ids AND completed = 0 RETURNING id, current_value, target_value"
+    ).bindparams(bindparam("ids", expanding=True)), {"step": step, "ids": ids}).all()
+    # Quête complétée ou supprimée entre-temps : absente du résultat, retirée de l'index
+    for quest_id in set(ids) - {row.id for row in rows}:
+        quests.pop(quest_id, None)
+    completed = []
+    for row in rows:
+        if row.current_value >= (row.target_value or 1):
+            completed.append(complete_quest(uow, row.id))
+    return completed
+
+@subscribe("habit_completed")
+def _quest_habit(uow, day, **_):
+    advance_quests(uow, "habit_completed", day)
+
+@subscribe("habit_uncompleted")
+def _quest_habit_undone(uow, day, **_):
+    advance_quests(uow, "habit_completed", day, step=-1)
+
+@subscribe("journal_written")
+def _quest_journal(uow, **_):
+    advance_quests(uow, "journal_written")
+
+@subscribe("sleep_logged")
+def _quest_sleep(uow, log, **_):
+    advance_quests(uow, "sleep_logged", log.date)
+
+@subscribe("energy_logged")
+def _quest_energy(uow, **_):
+    advance_quests(uow, "energy_logged")
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BULK IMPORT / EXPORT
+# ══════════════════════════════════════════════════════════════════════════════
+# Import en flux (CSV ou NDJSON) par paquets : chaque paquet est inséré par un
+# executemany "INSERT ... WHERE NOT EXISTS" appuyé sur les index de la clé de
+# déduplication, puis les données dérivées sont resynchronisées en une passe.
+# L'export lit la table par lots (yield_per) sans jamais la charger en entier.
+
+IMPORT_CHUNK_SIZE = 10000
+EXPORT_BATCH_SIZE = 5000
+
+def _parse_datetime(value) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+_CONVERTERS = {
+    "int": lambda v: int(float(v)),
+    "float": float,
+    "str": str,
+    "date": lambda v: datetime.date.fromisoformat(str(v).strip()[:10]),
+    "datetime": _parse_datetime,
+}
+
+def _resolve_habit_names(conn, records: list):
+    """Accepte une colonne "habit" (nom) à la place de habit_id ; crée les habitudes inconnues"""
+    now = datetime.datetime.utcnow()
+    
+    def valid(record):
+        try:
+            _convert_record("habit_logs", {**record, "habit_id": 0}, now)
+            return True
+        except (ValueError, TypeError, KeyError):
+            return False
+    named = [r for r in records if not r.get("habit_id") and r.get("habit")]
+    if not named:
+        return
+    table = Habit.__table__
+    ids = dict(conn.execute(table.select().with_only_columns(table.c.name, table.c.id)
+                            .where(table.c.name.in_({r["habit"] for r in named}))).all())
+    # une habitude inconnue n'est créée que pour une ligne valide
+    for name in sorted({r["habit"] for r in named if valid(r)} - ids.keys()):
+        ids[name] = conn.execute(table.insert().values(
+            name=name, streak=0, best_streak=0, created_at=now)).inserted_primary_key[0]
+    for r in named:
+        # ligne invalide d'une habitude inconnue : id fictif, l'erreur portera sur la vraie colonne
+        r["habit_id"] = ids.get(r["habit"], 0)
+
+# Colonnes importables : nom -> (type, défaut ; None = obligatoire) ; key = clé de déduplication
+IMPORT_SPECS = {
+    "energy_logs": {
+        "model": EnergyLog,
+        "columns": {"timestamp": ("datetime", None), "level": ("int", None), "mood": ("str", ""),
+                    "activity": ("str", ""), "sleep_hours": ("float", 0.0), "notes": ("str", "")},
+        "key": ("timestamp",),
+    },
+    "sleep_logs": {
+        "model": SleepLog,
+        "columns": {"date": ("date", None), "bedtime": ("str", ""), "waketime": ("str", ""),
+                    "duration": ("float", None), "quality": ("int", None), "deep_sleep": ("float", 0.0),
+                    "notes": ("str", ""), "created_at": ("datetime", None)},
+        "key": ("date",),
+    },
+    "habit_logs": {
+        "model": HabitLog,
+        "columns": {"habit_id": ("int", None), "completed_at": ("date", None)},
+        "key": ("habit_id", "completed_at"),
+        "resolve": _resolve_habit_names,
+    },
+    "journal": {
+        "model": JournalEntry,
+        "columns": {"content": ("str", None), "mood": ("str", ""), "tags": ("str", ""),
+                    "created_at": ("datetime", None)},
+        "key": ("created_at", "content"),
+    },
+    "xp_logs": {
+        "model": XPLog,
+        "columns": {"amount": ("int", None), "source": ("str", "Import"), "skill_name": ("str", ""),
+                    "created_at": ("datetime", None)},
+        "key": ("created_at", "source", "skill_name", "amount"),
+    },
+    "investments": {
+        "model": Investment,
+        "columns": {"name": ("str", None), "category": ("str", "Other"), "amount": ("float", 0.0),
+                    "current_value": ("float", 0.0), "yield_pct": ("float", 0.0), "notes": ("str", ""),
+                    "created_at": ("datetime", None)},
+        "key": ("name", "category"),
+    },
+}
+
+# sleep_logs.created_at / investments.created_at : défaut "maintenant" plutôt qu'obligatoire
+_NOW_DEFAULT_COLUMNS = {("sleep_logs", "created_at"), ("investments", "created_at")}
+
+def _insert_unique_statement(table_name: str):
+    spec = IMPORT_SPECS[table_name]
+    table = spec["model"].__table__
+    columns = list(spec["columns"])
+    where = " AND ".join(f"{k} = :{k}" for k in spec["key"])
+    sql = (f"INSERT INTO {table.name} ({', '.join(columns)}) "
+           f"SELECT {', '.join(':' + c for c in columns)} "
+           f"WHERE NOT EXISTS (SELECT 1 FROM {table.name} WHERE {where})")
+    return text(sql).bindparams(*[bindparam(c, type_=table.c[c].type) for c in columns])
+
+def _convert_record(table_name: str, record: dict, now: datetime.datetime) -> dict:
+    row = {}
+    for column, (kind, default) in IMPORT_SPECS[table_name]["columns"].items():
+        value = record.get(column)
+        if value is None or value == "":
+            if (table_name, column) in _NOW_DEFAULT_COLUMNS:
+                value = now
+            elif default is None:
+                raise ValueError(f"colonne obligatoire manquante : {column}")
+            else:
+                value = default
+        else:
+            value = _CONVERTERS[kind](value)
+        row[column] = value
+    return row
+
+def iter_records(stream, fmt: str):
+    """Itère les enregistrements d'un flux texte CSV ou NDJSON"""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+def import_records(table_name: str, records, chunk_size: int = IMPORT_CHUNK_SIZE) -> SimpleNamespace:
+    """Importe un flux d'enregistrements par paquets (dédupliqués) et rapporte le débit"""
+    spec = IMPORT_SPECS[table_name]
+    stmt = _insert_unique_statement(table_name)
+    report = SimpleNamespace(table=table_name, read=0, inserted=0, duplicates=0, invalid=0,
+                             errors=[], seconds=0.0, rows_per_s=0.0)
+    started = time.perf_counter()
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        report.read += len(chunk)
+        now = datetime.datetime.utcnow()
+        with engine.begin() as conn:
+            if "resolve" in spec:
+                spec["resolve"](conn, chunk)
+            rows = []
+            first_line = report.read - len(chunk) + 1
+            for line, record in enumerate(chunk, first_line):
+                try:
+                    rows.append(_convert_record(table_name, record, now))
+                except (ValueError, TypeError, KeyError) as exc:
+                    report.invalid += 1
+                    if len(report.errors) < 5:
+                        report.errors.append(f"ligne {line} : {exc}")
+            if rows:
+                inserted = conn.execute(stmt, rows).rowcount
+                report.inserted += inserted
+                report.duplicates += len(rows) - inserted
+    
+    if report.inserted:
+        with UnitOfWork(f"Import {table_name}") as uow:
+            uow.emit("logs_imported", table=table_name, inserted=report.inserted)
+    report.seconds = time.perf_counter() - started
+    report.rows_per_s = report.read / report.seconds if report.seconds else 0.0
+    logger.info("import %s : %d lus, %d insérés, %d doublons, %d invalides en %.2f s (%.0f lignes/s)",
+                table_name, report.read, report.inserted, report.duplicates, report.invalid,
+                report.seconds, report.rows_per_s)
+    return report
+
+def import_file(table_name: str, stream, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> SimpleNamespace:
+    """Importe un fichier CSV/NDJSON (flux texte ou binaire)"""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    return import_records(table_name, iter_records(stream, fmt), chunk_size)
+
+def resync_derived_data(db, table: str):
+    """Resynchronise en une passe les données dérivées d'une table chargée en masse"""
+    if table == "habit_logs":
+        recompute_streaks(db)
+        rebuild_habit_day_bits(db)
+    if table == "xp_logs":
+        rebuild_xp_daily(db)
+        db.execute(text(
+            "UPDATE skills SET xp = (SELECT COALESCE(SUM(amount), 0) FROM xp_logs "
+            "WHERE xp_logs.skill_name = skills.name)"
+        ))
+        db.execute(text("UPDATE user_profile SET total_xp = (SELECT COALESCE(SUM(amount), 0) FROM xp_logs)"))
+        recompute_levels(db)
+    if table == "journal":
+        rebuild_entity_tags(db, "journal")
+    if table == "investments":
+        seed_valuation_snapshots(db)
+    if table == "sleep_logs":
+        backfill_sleep_minutes(db)
+        update_chronotype(db)
+    if table in DAILY_FEATURE_SOURCES:
+        rebuild_daily_features(db)
+    evaluate_all_achievements(db)
+
+@subscribe("logs_imported")
+def _refresh_after_import(uow, table: str, **_):
+    resync_derived_data(uow.db, table)
+
+def _export_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def export_table(table_name: str, out, fmt: str = "csv", batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """Écrit une table en CSV/NDJSON dans un flux texte, lot par lot"""
+    table = IMPORT_SPECS[table_name]["model"].__table__
+    count = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(table.select().order_by(table.c.id))
+        columns = list(result.keys())
+        writer = csv.writer(out) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        for partition in result.partitions():
+            for row in partition:
+                values = [_export_value(v) for v in row]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    out.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+            count += len(partition)
+    return count
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RECHERCHE (FTS5)
+# ══════════════════════════════════════════════════════════════════════════════
+# Un seul index FTS5 pour journal, notes, projets et objectifs, tenu à jour par
+# des triggers. Le rowid encode la source (id * 4 + code) : une mise à jour ou
+# une suppression touche exactement une ligne de l'index, sans scan.
+
+# source -> (code rowid, table, colonnes title / body / tags)
+SEARCH_SOURCES = {
+    "journal": (0, "journal", None, "content", "tags"),
+    "note": (1, "notes", "title", "content", "tags"),
+    "project": (2, "projects", "title", "description", "category"),
+    "goal": (3, "goals", "title", None, "category"),
+}
+SEARCH_ICONS = {"journal": "📔", "note": "🗒️", "project": "🧪", "goal": "🎯"}
+_SEARCH_KINDS = {code: kind for kind, (code, *_) in SEARCH_SOURCES.items()}
+
+def install_search_index(conn):
+    """Crée la table FTS5, ses triggers, et indexe l'existant"""
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "title, body, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    ))
+    for code, table, *columns in SEARCH_SOURCES.values():
+        def values(prefix):
+            fields = [f"COALESCE({prefix}{c}, '')" if c else "''" for c in columns]
+            return f"{prefix}id * 4 + {code}, {', '.join(fields)}"
+        insert = f"INSERT INTO search_index (rowid, title, body, tags) VALUES ({values('new.')})"
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code}"
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} BEGIN {insert}; END"))
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} BEGIN {delete}; END"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE ON {table} BEGIN {delete}; {insert}; END"
+        ))
+        conn.execute(text(f"DELETE FROM search_index WHERE rowid % 4 = {code}"))
+        conn.execute(text(f"INSERT INTO search_index (rowid, title, body, tags) SELECT {values('')} FROM {table}"))
+
+def fts_query(query: str) -> str:
+    """Requête utilisateur -> expression FTS5 (termes entre guillemets, préfixe sur le dernier)"""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    return " ".join(f'"{t}"' for t in terms[:-1]) + (" " if len(terms) > 1 else "") + f'"{terms[-1]}"*'
+
+def search_all(db, query: str, kinds=None, limit: int = 30) -> list:
+    """Résultats classés (bm25) avec extraits surlignés"""
+    match = fts_query(query)
+    if not match:
+        return []
+    codes = [SEARCH_SOURCES[k][0] for k in (kinds or SEARCH_SOURCES)]
+    rows = db.execute(text(
+        "SELECT rowid, highlight(search_index, 0, '**', '**'), "
+        "snippet(search_index, 1, '**', '**', '…', 24), tags, bm25(search_index, 4.0, 1.0, 2.0) AS rank "
+        "FROM search_index WHERE search_index MATCH :match AND rowid % 4 IN :codes "
+        "ORDER BY rank LIMIT :limit"
+    ).bindparams(bindparam("codes", expanding=True)), {"match": match, "codes": codes, "limit": limit}).all()
+    
+    results = [SimpleNamespace(kind=_SEARCH_KINDS[rowid % 4], ref_id=rowid // 4, title=title, snippet=snippet,
+                               tags=tags, rank=rank, created_at=None) for rowid, title, snippet, tags, rank in rows]
+    journal_ids = [r.ref_id for r in results if r.kind == "journal"]
+    if journal_ids:
+        dates = dict(db.query(JournalEntry.id, JournalEntry.created_at).filter(JournalEntry.id.in_(journal_ids)).all())
+        for r in results:
+            if r.kind == "journal":
+                r.created_at = dates.get(r.ref_id)
+    return results
+
+# ══════════════════════════════════════════════════════════════════════════════
+# NOTES & LIENS
+# ══════════════════════════════════════════════════════════════════════════════
+# Les [[liens]] du contenu d'une note sont normalisés en arêtes note_links
+# (src, dst) : à l'enregistrement, on diffe les liens avant / après au lieu de
+# reparser le coffre. Un lien pointe vers la note de même titre (exact) ; un
+# lien vers un titre encore inexistant se résout quand la note est créée.
+
+WIKI_LINK = re.compile(r"\[\[([^\[\]|#]+)(?:[|#][^\]]*)?\]\]")
+GRAPH_NODE_LIMIT = 300
+NOTE_TYPES = ["free", "idea", "reference", "project"]
+
+def extract_links(content: str) -> set:
+    """Titres référencés par [[Titre]], [[Titre|alias]] ou [[Titre#section]]"""
+    return {m.strip() for m in WIKI_LINK.findall(content or "") if m.strip()}
+
+def _note_ids_by_title(db, titles) -> dict:
+    if not titles:
+        return {}
+    return dict(db.query(Note.title, func.min(Note.id)).filter(Note.title.in_(titles)).group_by(Note.title).all())
+
+def sync_note_links(db, note_id: int, content: str) -> tuple:
+    """Diffe les liens d'une note et applique ajouts / retraits ; renvoie (ajoutés, retirés)"""
+    targets = set(_note_ids_by_title(db, extract_links(content)).values()) - {note_id}
+    current = {dst for (dst,) in db.query(NoteLink.dst).filter(NoteLink.src == note_id)}
+    added, removed = targets - current, current - targets
+    if removed:
+        db.query(NoteLink).filter(NoteLink.src == note_id, NoteLink.dst.in_(removed)).delete(synchronize_session=False)
+    if added:
+        db.execute(NoteLink.__table__.insert(), [{"src": note_id, "dst": dst} for dst in added])
+    return added, removed
+
+def _notes_mentioning(db, title: str) -> list:
+    """Notes dont le contenu contient [[title]] (présélection FTS puis vérification)"""
+    words = re.findall(r"\w+", title)
+    if words:
+        phrase = " ".join(words).replace('"', "")
+        candidates = [rowid // 4 for (rowid,) in db.execute(text(
+            "SELECT rowid FROM search_index WHERE search_index MATCH :match AND rowid % 4 = 1"
+        ), {"match": f'body : "{phrase}"'})]
+        rows = db.query(Note.id, Note.content).filter(Note.id.in_(candidates)) if candidates else []
+    else:
+        rows = db.query(Note.id, Note.content).filter(Note.content.contains(f"[[{title}"))
+    return [note_id for note_id, content in rows if title in extract_links(content)]
+
+def save_note(uow, note_id: Optional[int] = None, **fields):
+    """Crée ou met à jour une note et son voisinage dans le graphe"""
+    db = uow.db
+    note = db.get(Note, note_id) if note_id else None
+    renamed = note is None or fields.get("title", note.title) != note.title
+    if note is None:
+        note = Note(**fields)
+        db.add(note)
+    else:
+        for key, value in fields.items():
+            setattr(note, key, value)
+        note.updated_at = datetime.datetime.utcnow()
+    db.flush()
+    
+    added, removed = sync_note_links(db, note.id, note.content)
+    if renamed:
+        # les notes qui pointaient vers l'ancien titre ou pointent vers le nouveau
+        sources = {src for (src,) in db.query(NoteLink.src).filter(NoteLink.dst == note.id)}
+        sources |= set(_notes_mentioning(db, note.title))
+        for src in sources - {note.id}:
+            source = db.get(Note, src)
+            sync_note_links(db, src, source.content)
+    uow.emit("note_saved", note=note, added=added, removed=removed)
+    return note
+
+def delete_note(uow, note_id: int):
+    """Supprime une note et ses arêtes"""
+    db = uow.db
+    db.query(NoteLink).filter((NoteLink.src == note_id) | (NoteLink.dst == note_id)).delete(synchronize_session=False)
+    db.query(Note).filter(Note.id == note_id).delete()
+    uow.emit("note_deleted", note_id=note_id)
+
+def rebuild_note_links(conn):
+    """Reconstruit tout le graphe depuis le contenu des notes"""
+    _create_index(conn, "ix_notes_title", "notes", "title")
+    _create_index(conn, "ix_note_links_dst", "note_links", "dst")
+    notes = conn.execute(text("SELECT id, title, content FROM notes ORDER BY id")).all()
+    ids = {}
+    for note_id, title, _ in notes:
+        ids.setdefault(title, note_id)
+    edges = {(note_id, ids[t]) for note_id, _, content in notes
+             for t in extract_links(content) if t in ids and ids[t] != note_id}
+    conn.execute(text("DELETE FROM note_links"))
+    if edges:
+        conn.execute(NoteLink.__table__.insert(), [{"src": a, "dst": b} for a, b in edges])
+
+def note_neighbourhood(db, note_id: int, hops: int = 2) -> dict:
+    """Distance (en sauts, liens dans les deux sens) des notes autour d'une note"""
+    distance = {note_id: 0}
+    frontier = {note_id}
+    for hop in range(1, hops + 1):
+        if not frontier:
+            break
+        outgoing = db.query(NoteLink.dst).filter(NoteLink.src.in_(frontier))
+        incoming = db.query(NoteLink.src).filter(NoteLink.dst.in_(frontier))
+        found = {n for (n,) in outgoing} | {n for (n,) in incoming}
+        frontier = found - distance.keys()
+        distance.update(dict.fromkeys(frontier, hop))
+    return distance
+
+def force_layout(n: int, src: np.ndarray, dst: np.ndarray, iterations: int = 80, seed: int = 7) -> np.ndarray:
+    """Placement force-directed (Fruchterman-Reingold vectorisé), déterministe"""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, (n, 2))
+    if n < 2:
+        return pos
+    k = 1 / math.sqrt(n)
+    temperature = 0.1
+    for _ in range(iterations):
+        # répulsion k²/d entre toutes les paires : sum_j w_ij (p_i - p_j), avec w = k² / d²
+        sq = (pos ** 2).sum(axis=1)
+        dist2 = np.maximum(sq[:, None] + sq[None, :] - 2 * pos @ pos.T, 1e-6)
+        weights = k * k / dist2
+        np.fill_diagonal(weights, 0)
+        disp = pos * weights.sum(axis=1)[:, None] - weights @ pos
+        edge = pos[src] - pos[dst]
+        pull = edge * (np.linalg.norm(edge, axis=1) / k)[:, None]
+        np.add.at(disp, src, -pull)
+        np.add.at(disp, dst, pull)
+        length = np.linalg.norm(disp, axis=1) + 1e-9
+        pos += disp / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+    return pos
+
+def note_graph(db, focus: Optional[int] = None, limit: int = GRAPH_NODE_LIMIT) -> SimpleNamespace:
+    """Sous-graphe affiché (voisinage à 2 sauts, ou notes les plus connectées) et son placement"""
+    if focus:
+        distance = note_neighbourhood(db, focus)
+        nodes = sorted(distance, key=lambda n: (distance[n], n))[:limit]
+    else:
+        nodes = sorted(n for (n,) in db.execute(text(
+            "SELECT n FROM (SELECT src AS n FROM note_links UNION ALL SELECT dst FROM note_links) "
+            "GROUP BY n ORDER BY COUNT(*) DESC, n LIMIT :limit"
+        ), {"limit": limit}))
+    index = {n: i for i, n in enumerate(nodes)}
+    edges = db.query(NoteLink.src, NoteLink.dst).filter(NoteLink.src.in_(nodes), NoteLink.dst.in_(nodes)).all() if nodes else []
+    src = np.array([index[a] for a, _ in edges], dtype=int)
+    dst = np.array([index[b] for _, b in edges], dtype=int)
+    pos = force_layout(len(nodes), src, dst)
+    return SimpleNamespace(nodes=nodes, x=pos[:, 0].tolist(), y=pos[:, 1].tolist(),
+                           edges=list(zip(src.tolist(), dst.tolist())))
+
+# ══════════════════════════════════════════════════════════════════════════════
+# TAGS
+# ══════════════════════════════════════════════════════════════════════════════
+# Les chaînes "a, b, c" restent la saisie ; tags / entity_tags en sont l'index
+# normalisé, diffé à chaque écriture. Filtrer par tag devient une jointure
+# indexée, et les facettes un seul GROUP BY.
+
+# entité -> modèle porteur de la colonne tags
+TAGGED_ENTITIES = {"journal": JournalEntry, "note": Note}
+
+def parse_tags(raw: str) -> set:
+    """"Sport, #focus , sport" -> {"sport", "focus"}"""
+    return {t.strip().lstrip("#").strip().lower() for t in (raw or "").split(",") if t.strip().lstrip("#").strip()}
+
+def _tag_ids(db, names: set) -> dict:
+    """Id de chaque tag, créés au besoin"""
+    if not names:
+        return {}
+    table = Tag.__table__
+    db.execute(sqlite_insert(table).on_conflict_do_nothing(), [{"name": n} for n in names])
+    return dict(db.execute(table.select().with_only_columns(table.c.name, table.c.id)
+                           .where(table.c.name.in_(names))).all())
+
+def sync_entity_tags(db, entity: str, entity_id: int, raw: str):
+    """Diffe les tags d'une entité avec l'index"""
+    wanted = set(_tag_ids(db, parse_tags(raw)).values())
+    current = {t for (t,) in db.query(EntityTag.tag_id).filter(EntityTag.entity == entity, EntityTag.entity_id == entity_id)}
+    if current - wanted:
+        db.query(EntityTag).filter(EntityTag.entity == entity, EntityTag.entity_id == entity_id,
+                                   EntityTag.tag_id.in_(current - wanted)).delete(synchronize_session=False)
+    if wanted - current:
+        db.execute(EntityTag.__table__.insert(),
+                   [{"entity": entity, "entity_id": entity_id, "tag_id": t} for t in wanted - current])
+
+def rebuild_entity_tags(conn, entity: str):
+    """Reconstruit l'index des tags d'une entité depuis les chaînes"""
+    table = TAGGED_ENTITIES[entity].__table__
+    parsed = [(entity_id, parse_tags(raw)) for entity_id, raw in
+              conn.execute(table.select().with_only_columns(table.c.id, table.c.tags).where(table.c.tags != ""))]
+    ids = _tag_ids(conn, set().union(*(names for _, names in parsed)))
+    conn.execute(EntityTag.__table__.delete().where(EntityTag.entity == entity))
+    rows = [{"entity": entity, "entity_id": entity_id, "tag_id": ids[n]} for entity_id, names in parsed for n in names]
+    for offset in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        conn.execute(EntityTag.__table__.insert(), rows[offset:offset + IMPORT_CHUNK_SIZE])
+
+@subscribe("journal_written")
+def _index_journal_tags(uow, entry, **_):
+    sync_entity_tags(uow.db, "journal", entry.id, entry.tags)
+
+@subscribe("note_saved")
+def _index_note_tags(uow, note, **_):
+    sync_entity_tags(uow.db, "note", note.id, note.tags)
+
+@subscribe("journal_deleted", "note_deleted")
+def _unindex_tags(uow, entry_id=None, note_id=None, **_):
+    entity, entity_id = ("journal", entry_id) if entry_id is not None else ("note", note_id)
+    uow.db.query(EntityTag).filter(EntityTag.entity == entity, EntityTag.entity_id == entity_id).delete()
+
+def tagged_with(entity: str, names):
+    """Sous-requête des ids d'entités portant tous ces tags"""
+    return (select(EntityTag.entity_id).join(Tag, Tag.id == EntityTag.tag_id)
+            .where(EntityTag.entity == entity, Tag.name.in_(names))
+            .group_by(EntityTag.entity_id).having(func.count() == len(set(names))))
+
+def tag_facets(db, entity: str = "journal") -> pd.DataFrame:
+    """Nombre d'entrées par tag et par mois, en un GROUP BY"""
+    model = TAGGED_ENTITIES[entity]
+    month = func.strftime("%Y-%m", model.created_at)
+    rows = (db.query(Tag.name, month, func.count())
+            .join(EntityTag, EntityTag.tag_id == Tag.id)
+            .join(model, model.id == EntityTag.entity_id)
+            .filter(EntityTag.entity == entity)
+            .group_by(Tag.name, month).all())
+    return pd.DataFrame(rows, columns=["Tag", "Mois", "Entrées"])
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PORTFOLIO
+# ══════════════════════════════════════════════════════════════════════════════
+# Chaque valorisation est un point (investissement, date, valeur) ; Investment.
+# current_value reste la dernière valeur connue. Chaque point stocke aussi sa
+# variation depuis le point précédent de la même position (delta) et l'apport
+# qu'il représente (flow, le montant investi sur le premier point) : la série du
+# portefeuille est alors un simple SUM(delta) GROUP BY date cumulé, sur un index
+# couvrant, sans pivot ni report de la dernière valeur.
+
+def record_valuation(uow, investment_id: int, value: float, day: Optional[datetime.date] = None):
+    """Enregistre (ou remplace) la valeur d'un investissement à une date"""
+    day = day or datetime.date.today()
+    db = uow.db
+    same_position = ValuationSnapshot.investment_id == investment_id
+    previous = (db.query(ValuationSnapshot.value).filter(same_position, ValuationSnapshot.date < day)
+                .order_by(ValuationSnapshot.date.desc()).limit(1).scalar())
+    flow = 0.0
+    if previous is None:
+        amount = db.query(Investment.amount).filter(Investment.id == investment_id).scalar()
+        flow = value if amount is None else amount
+    fields = {"value": value, "delta": value - (previous or 0.0), "flow": flow}
+    stmt = sqlite_insert(ValuationSnapshot).values(investment_id=investment_id, date=day, **fields)
+    db.execute(stmt.on_conflict_do_update(index_elements=["investment_id", "date"], set_=fields))
+    
+    following = (db.query(ValuationSnapshot).filter(same_position, ValuationSnapshot.date > day)
+                 .order_by(ValuationSnapshot.date).first())
+    if following:
+        following.delta = following.value - value
+        following.flow = 0.0
+    else:
+        db.query(Investment).filter(Investment.id == investment_id).update({"current_value": value})
+    uow.emit("valuation_recorded", investment_id=investment_id, day=day, value=value)
+
+def add_investment(uow, **fields):
+    """Crée un investissement et sa première valorisation"""
+    investment = Investment(**fields)
+    uow.db.add(investment)
+    uow.db.flush()
+    record_valuation(uow, investment.id, investment.current_value or investment.amount or 0.0)
+    return investment
+
+def delete_investment(uow, investment_id: int):
+    """Supprime un investissement et son historique de valorisation"""
+    uow.db.query(ValuationSnapshot).filter(ValuationSnapshot.investment_id == investment_id).delete()
+    uow.db.query(Investment).filter(Investment.id == investment_id).delete()
+    uow.emit("investment_deleted", investment_id=investment_id)
+
+def seed_valuation_snapshots(conn):
+    """Historique minimal des positions qui n'en ont pas : montant investi à la création, valeur actuelle aujourd'hui"""
+    today = datetime.date.today().isoformat()
+    conn.execute(text(
+        "INSERT OR IGNORE INTO valuation_snapshots (investment_id, date, value) "
+        "SELECT id, COALESCE(date(created_at), :today), COALESCE(amount, 0) FROM investments "
+        "WHERE id NOT IN (SELECT investment_id FROM valuation_snapshots)"
+    ), {"today": today})
+    conn.execute(text(
+        "INSERT OR REPLACE INTO valuation_snapshots (investment_id, date, value) "
+        "SELECT i.id, :today, i.current_value FROM investments i "
+        "WHERE i.current_value IS NOT NULL AND i.current_value != 0 AND NOT EXISTS "
+        "(SELECT 1 FROM valuation_snapshots v WHERE v.investment_id = i.id AND v.date > date(i.created_at))"
+    ), {"today": today})
+    rebuild_valuation_deltas(conn)
+
+def rebuild_valuation_deltas(conn):
+    """Recalcule delta / flow de toutes les valorisations (après un chargement en masse)"""
+    conn.execute(text(
+        "UPDATE valuation_snapshots SET delta = value - COALESCE(p.prev, 0), "
+        "flow = CASE WHEN p.prev IS NULL THEN COALESCE((SELECT amount FROM investments i "
+        "WHERE i.id = valuation_snapshots.investment_id), value) ELSE 0 END "
+        "FROM (SELECT investment_id AS id, date AS day, "
+        "      LAG(value) OVER (PARTITION BY investment_id ORDER BY date) AS prev FROM valuation_snapshots) AS p "
+        "WHERE valuation_snapshots.investment_id = p.id AND valuation_snapshots.date = p.day"
+    ))
+
+def portfolio_totals(db) -> SimpleNamespace:
+    """Totaux du portefeuille en un agrégat SQL"""
+    count, invested, value = db.query(
+        func.count(Investment.id), func.coalesce(func.sum(Investment.amount), 0.0),
+        func.coalesce(func.sum(Investment.current_value), 0.0)
+    ).one()
+    return SimpleNamespace(count=count, invested=invested, value=value)
+
+def portfolio_history(db, start: Optional[datetime.date] = None) -> SimpleNamespace:
+    """Valeur du portefeuille dans le temps, rendements simple et pondéré par le temps, drawdown max"""
+    rows = db.execute(text(
+        "SELECT date, SUM(delta) AS delta, SUM(flow) AS flow FROM valuation_snapshots GROUP BY date ORDER BY date"
+    )).all()
+    empty = SimpleNamespace(series=pd.DataFrame(columns=["Date", "Valeur", "Apports"]),
+                            twr=0.0, max_drawdown=0.0)
+    if not rows:
+        return empty
+    dates = pd.to_datetime([r.date for r in rows])
+    value = np.cumsum([r.delta for r in rows])
+    flow = np.array([r.flow for r in rows], dtype=float)
+    
+    # rendement de chaque période, apports comptés en début de période : V_t / (V_{t-1} + apports_t) - 1
+    invested = np.r_[0.0, value[:-1]] + flow
+    with np.errstate(divide="ignore", invalid="ignore"):
+        period_returns = np.where(invested > 0, value / invested - 1, 0.0)
+    wealth = np.cumprod(1 + period_returns)
+    drawdown = wealth / np.maximum.accumulate(wealth) - 1
+    
+    series = pd.DataFrame({"Date": dates, "Valeur": value, "Apports": np.cumsum(flow)})
+    if start is not None:
+        series = series[series["Date"] >= pd.Timestamp(start)]
+    return SimpleNamespace(series=series, twr=float(wealth[-1] - 1), max_drawdown=float(drawdown.min()))
+
+def portfolio_allocation(db) -> pd.DataFrame:
+    """Répartition actuelle par catégorie (valeur), agrégée en SQL"""
+    rows = (db.query(Investment.category, func.sum(Investment.current_value), func.sum(Investment.amount))
+            .group_by(Investment.category).all())
+    return pd.DataFrame(rows, columns=["Catégorie", "Valeur", "Investi"])
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SÉRIES TEMPORELLES
+# ══════════════════════════════════════════════════════════════════════════════
+# Les courbes d'énergie et de sommeil couvrent une période choisie (semaine,
+# mois, année, tout). La série est lue en une ligne (group_concat sur l'index de
+# date) puis réduite côté serveur par Largest-Triangle-Three-Buckets à un budget
+# fixe de points : la charge envoyée à Plotly reste bornée quelle que soit la
+# profondeur de l'historique, et les pics restent visibles.
+
+CHART_POINT_BUDGET = 400
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+DATE_RANGES = {"Semaine": 7, "Mois": 30, "Année": 365, "Tout": None}
+
+# source -> (table, colonne de date, colonnes tracées)
+SERIES_SOURCES = {
+    "energy": ("energy_logs", "timestamp", ("level",)),
+    "sleep": ("sleep_logs", "date", ("duration", "quality")),
+}
+
+def range_start(label: str, today: Optional[datetime.date] = None) -> Optional[datetime.date]:
+    """Premier jour d'une période de DATE_RANGES (None = tout l'historique)"""
+    days = DATE_RANGES[label]
+    return None if days is None else (today or datetime.date.today()) - datetime.timedelta(days=days - 1)
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices retenus par Largest-Triangle-Three-Buckets (x croissant)"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # premier et dernier points gardés, threshold - 2 paquets entre les deux
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+def downsampled_series(db, source: str, start: Optional[datetime.date] = None,
+                       budget: int = CHART_POINT_BUDGET) -> SimpleNamespace:
+    """Colonnes d'une source sur une période, chacune réduite à budget points"""
+    table, date_column, columns = SERIES_SOURCES[source]
+    since = f"AND {date_column} >= :start" if start else ""
+    traces, total = {}, 0
+    for column in columns:
+        days, values = db.execute(text(
+            "SELECT group_concat(day), group_concat(value) FROM ("
+            f"  SELECT julianday({date_column}) AS day, {column} AS value FROM {table} "
+            f"  WHERE {column} IS NOT NULL {since} ORDER BY {date_column})"
+        ), {"start": start} if start else {}).one()
+        x = csv_array(days)
+        y = csv_array(values)
+        keep = lttb(x, y, budget)
+        total = max(total, len(x))
+        traces[column] = pd.DataFrame({"Date": pd.to_datetime(x[keep] - UNIX_EPOCH_JULIAN_DAY, unit="D"),
+                                       column: y[keep]})
+    return SimpleNamespace(traces=traces, total=total)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SLEEP ANALYTICS
+# ══════════════════════════════════════════════════════════════════════════════
+# Les heures "HH:MM" sont parsées une fois, à l'écriture, en minutes depuis
+# minuit (bed_minutes, wake_minutes). L'analyse lit tout l'historique en une
+# ligne et calcule en une passe vectorisée, sur un calendrier journalier :
+# moyennes glissantes 7/30/90 jours (durée, qualité), dette cumulée, régularité
+# du coucher (statistiques circulaires : 23:50 et 00:10 sont à 20 minutes) et
+# chronotype d'après le milieu de sommeil moyen.
+
+SLEEP_WINDOWS = (7, 30, 90)
+CHRONOTYPE_WINDOW = 90
+CHRONOTYPE_MIN_NIGHTS = 14
+DAY_MINUTES = 24 * 60
+# milieu de sommeil moyen (minutes après minuit) -> chronotype
+CHRONOTYPES = [(3 * 60, "🐦 Alouette"), (5 * 60, "🕊️ Intermédiaire"), (DAY_MINUTES, "🦉 Hibou")]
+
+def clock_minutes(value) -> Optional[int]:
+    """"HH:MM" -> minutes depuis minuit (None si illisible)"""
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})(?::\d{2})?\s*", value or "")
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+def format_minutes(minutes: float) -> str:
+    minutes = int(round(minutes)) % DAY_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def backfill_sleep_minutes(conn):
+    """Minutes de coucher / lever des nuits qui ne les ont pas encore"""
+    for column, source in (("bed_minutes", "bedtime"), ("wake_minutes", "waketime")):
+        conn.execute(text(
+            f"UPDATE sleep_logs SET {column} = CAST(substr({source}, 1, instr({source}, ':') - 1) AS INTEGER) * 60 "
+            f"  + CAST(substr({source}, instr({source}, ':') + 1, 2) AS INTEGER) "
+            f"WHERE {column} IS NULL AND {source} GLOB '[0-9]*:[0-9][0-9]*'"
+        ))
+
+def circular_stats(minutes: np.ndarray) -> tuple:
+    """Moyenne (minutes) et écart-type circulaire (minutes) d'heures de la journée"""
+    minutes = minutes[~np.isnan(minutes)]
+    if not len(minutes):
+        return None, None
+    angles = minutes * (2 * np.pi / DAY_MINUTES)
+    c, s = np.cos(angles).mean(), np.sin(angles).mean()
+    resultant = min(math.hypot(c, s), 1.0)
+    mean = (math.atan2(s, c) * DAY_MINUTES / (2 * np.pi)) % DAY_MINUTES
+    if len(minutes) < 2:
+        return mean, 0.0
+    # max(0, …) : -2 log(1) vaut -0.0, affiché "-0"
+    spread = math.sqrt(max(0.0, -2 * math.log(resultant))) * DAY_MINUTES / (2 * np.pi) \
+        if resultant > 0 else float("inf")
+    return mean, spread
+
+def mid_sleep(bed: np.ndarray, wake: np.ndarray) -> np.ndarray:
+    """Milieu de la nuit (minutes depuis minuit), coucher avant ou après minuit"""
+    return (bed + ((wake - bed) % DAY_MINUTES) / 2) % DAY_MINUTES
+
+def classify_chronotype(bed: np.ndarray, wake: np.ndarray) -> str:
+    """Chronotype d'après le milieu de sommeil moyen ("" si pas assez de nuits)"""
+    valid = ~(np.isnan(bed) | np.isnan(wake))
+    if valid.sum() < CHRONOTYPE_MIN_NIGHTS:
+        return ""
+    # le milieu de sommeil est ramené sur [-12h, +12h] autour de minuit avant le seuillage
+    mean, _ = circular_stats(mid_sleep(bed[valid], wake[valid]))
+    centred = mean if mean < DAY_MINUTES / 2 else mean - DAY_MINUTES
+    return next(label for limit, label in CHRONOTYPES if centred < limit)
+
+def update_chronotype(conn) -> str:
+    """Recalcule le chronotype sur les dernières nuits et l'écrit dans le profil"""
+    rows = conn.execute(text(
+        "SELECT bed_minutes, wake_minutes FROM sleep_logs ORDER BY date DESC LIMIT :n"
+    ), {"n": CHRONOTYPE_WINDOW}).all()
+    nights = np.array(rows, dtype=float).reshape(-1, 2)
+    chronotype = classify_chronotype(nights[:, 0], nights[:, 1])
+    conn.execute(text("UPDATE user_profile SET chronotype = :c WHERE COALESCE(chronotype, '') != :c"),
+                 {"c": chronotype})
+    return chronotype
+
+@subscribe("sleep_logged")
+def _refresh_chronotype(uow, **_):
+    update_chronotype(uow.db)
+
+def sleep_analytics(db, goal_hours: float = 8.0, today: Optional[datetime.date] = None) -> SimpleNamespace:
+    """Fenêtres glissantes, dette, régularité et chronotype sur tout l'historique"""
+    today = today or datetime.date.today()
+    history = db.execute(text(
+        "SELECT group_concat(julianday(date)), group_concat(COALESCE(duration, 'nan')), "
+        "       group_concat(COALESCE(quality, 'nan')), group_concat(COALESCE(bed_minutes, 'nan')), "
+        "       group_concat(COALESCE(wake_minutes, 'nan')) "
+        "FROM (SELECT * FROM sleep_logs WHERE date <= :today ORDER BY date)"
+    ), {"today": today}).one()
+    day, duration, quality, bed, wake = (csv_array(column) for column in history)
+    result = SimpleNamespace(nights=len(day), windows=pd.DataFrame(), rolling=pd.DataFrame(),
+                             bedtime=None, bedtime_spread=None, wake=None, chronotype="")
+    if not len(day):
+        return result
+    
+    # calendrier journalier jusqu'à aujourd'hui : une nuit manquante n'ajoute ni durée ni dette
+    first = int(day.min())
+    offset = day.astype(np.int64) - first
+    span = int(pd.Timestamp(today).to_julian_date() + 0.5) - first
+    calendar = np.full((5, span), np.nan)
+    calendar[:, offset] = np.vstack([duration, quality, bed, wake,
+                                     np.maximum(goal_hours - duration, 0.0)])
+    dates = pd.to_datetime(np.arange(first, first + span) - UNIX_EPOCH_JULIAN_DAY + 0.5, unit="D")
+    frame = pd.DataFrame(calendar.T, index=dates, columns=["duration", "quality", "bed", "wake", "debt"])
+    
+    rolling, windows = {}, []
+    angles = frame["bed"] * (2 * np.pi / DAY_MINUTES)
+    for w in SLEEP_WINDOWS:
+        roll = frame.rolling(w, min_periods=1)
+        mean, debt, nights = roll.mean(), roll["debt"].sum(), roll["duration"].count()
+        rolling[f"Durée {w}j"] = mean["duration"]
+        # régularité : longueur du vecteur moyen des heures de coucher sur la fenêtre
+        resultant = np.hypot(np.cos(angles).rolling(w, min_periods=1).mean(),
+                             np.sin(angles).rolling(w, min_periods=1).mean())
+        spread = np.sqrt(np.maximum(-2 * np.log(resultant.clip(1e-9, 1.0)), 0.0)) * DAY_MINUTES / (2 * np.pi)
+        windows.append({"Fenêtre": f"{w} jours", "Nuits": int(nights.iloc[-1]),
+                        "Durée moy. (h)": mean["duration"].iloc[-1], "Qualité moy.": mean["quality"].iloc[-1],
+                        "Dette (h)": debt.iloc[-1], "Régularité coucher (± min)": spread.iloc[-1]})
+    
+    # heures moyennes et chronotype sur les dernières nuits (comme update_chronotype)
+    bed, wake = bed[-CHRONOTYPE_WINDOW:], wake[-CHRONOTYPE_WINDOW:]
+    result.windows = pd.DataFrame(windows).round(1)
+    result.rolling = pd.DataFrame(rolling).rename_axis("Date").reset_index()
+    result.bedtime, result.bedtime_spread = circular_stats(bed)
+    result.wake, _ = circular_stats(wake)
+    result.chronotype = classify_chronotype(bed, wake)
+    return result
+
+# ══════════════════════════════════════════════════════════════════════════════
+# OBJECTIFS & PRÉVISIONS
+# ══════════════════════════════════════════════════════════════════════════════
+# Chaque mise à jour d'un objectif ajoute un point à goal_progress (jamais
+# modifié) ; Goal.current_value reste la dernière valeur. La prévision ajuste
+# une tendance linéaire pondérée exponentiellement (les points récents comptent
+# plus) pour tous les objectifs à la fois, à partir de sommes groupées
+# (np.bincount), puis en déduit la date d'atteinte et la probabilité d'être à
+# la cible à la deadline. Le résultat est gardé par objectif tant qu'aucun
+# nouveau point n'est enregistré.
+
+FORECAST_HALFLIFE_DAYS = 30.0
+FORECAST_MAX_ETA_DAYS = 100 * 365.0  # au-delà, l'objectif est hors d'atteinte
+_normal_cdf = np.vectorize(lambda z: 0.5 * math.erfc(-z / math.sqrt(2)), otypes=[float])
+
+def log_goal_progress(uow, goal_id: int, value: float, at: Optional[datetime.datetime] = None):
+    """Ajoute un point de progression et met à jour la valeur courante de l'objectif"""
+    uow.db.add(GoalProgress(goal_id=goal_id, value=value, recorded_at=at or datetime.datetime.utcnow()))
+    uow.db.query(Goal).filter(Goal.id == goal_id).update({"current_value": value})
+    uow.emit("goal_progressed", goal_id=goal_id, value=value)
+
+def add_goal(uow, **fields):
+    """Crée un objectif et son premier point de progression"""
+    goal = Goal(**fields)
+    uow.db.add(goal)
+    uow.db.flush()
+    log_goal_progress(uow, goal.id, goal.current_value or 0.0)
+    return goal
+
+def delete_goals(uow, goal_ids: list):
+    """Supprime des objectifs et leur historique"""
+    uow.db.query(GoalProgress).filter(GoalProgress.goal_id.in_(goal_ids)).delete(synchronize_session=False)
+    uow.db.query(Goal).filter(Goal.id.in_(goal_ids)).delete(synchronize_session=False)
+    uow.emit("goals_deleted", goal_ids=goal_ids)
+
+def seed_goal_progress(conn):
+    """Premier point des objectifs sans historique : leur valeur actuelle"""
+    conn.execute(text(
+        "INSERT INTO goal_progress (goal_id, recorded_at, value) "
+        "SELECT id, COALESCE(created_at, :now), COALESCE(current_value, 0) FROM goals "
+        "WHERE id NOT IN (SELECT goal_id FROM goal_progress)"
+    ), {"now": datetime.datetime.utcnow()})
+
+def forecast_goal_batch(goal_ids: np.ndarray, days: np.ndarray, values: np.ndarray,
+                        targets: np.ndarray, deadlines: np.ndarray,
+                        halflife: float = FORECAST_HALFLIFE_DAYS) -> dict:
+    """Tendance pondérée (EWMA) de plusieurs objectifs en une passe vectorisée.
+
+    goal_ids / days / values : points (jours juliens), dans n'importe quel
+    ordre ; targets / deadlines : par objectif, dans l'ordre de np.unique
+    (deadline en jour julien, NaN si absente).
+    """
+    keys, group = np.unique(goal_ids, return_inverse=True)
+    k = len(keys)
+    last_day = np.full(k, -np.inf)
+    np.maximum.at(last_day, group, days)
+    x = days - last_day[group]  # <= 0 : jours avant le dernier point
+    w = 0.5 ** (-x / halflife)
+    
+    def total(v):
+        return np.bincount(group, weights=v, minlength=k)
+    sw, sww = total(w), total(w * w)
+    mean_x, mean_y = total(w * x) / sw, total(w * values) / sw
+    dx, dy = x - mean_x[group], values - mean_y[group]
+    sxx, sxy = total(w * dx * dx), total(w * dx * dy)
+    
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+        level = mean_y - slope * mean_x  # valeur ajustée au dernier point
+        n_eff = sw * sw / sww
+        residual = total(w * (dy - slope[group] * dx) ** 2) / sw
+        variance = np.where(n_eff > 2, residual * n_eff / (n_eff - 2), np.nan)
+        
+        remaining = targets - level
+        eta_days = np.where(remaining <= 0, 0.0, np.where(slope > 0, remaining / slope, np.nan))
+        eta_days = np.where(np.isfinite(eta_days) & (eta_days <= FORECAST_MAX_ETA_DAYS), eta_days, np.nan)
+        horizon = np.maximum(deadlines - last_day, 0.0)
+        expected = level + slope * horizon
+        spread = np.sqrt(variance * (1 + 1 / n_eff + (horizon - mean_x) ** 2 / sxx))
+        z = (expected - targets) / spread
+    probability = np.where(np.isfinite(z), _normal_cdf(np.nan_to_num(z)), (expected >= targets).astype(float))
+    probability = np.where(np.isnan(deadlines), np.nan, probability)
+    
+    return {int(goal_id): SimpleNamespace(
+                slope=float(slope[i]), expected=None if np.isnan(expected[i]) else float(expected[i]),
+                eta=None if np.isnan(eta_days[i]) else
+                    datetime.date(1970, 1, 1) + datetime.timedelta(
+                        days=float(last_day[i] + eta_days[i] - UNIX_EPOCH_JULIAN_DAY)),
+                probability=None if np.isnan(probability[i]) else float(probability[i]))
+            for i, goal_id in enumerate(keys)}
+
+@st.cache_resource(show_spinner=False)
+def _goal_forecast_cache() -> dict:
+    """goal_id -> (empreinte, prévision), pour tout le process"""
+    return {}
+
+def goal_forecasts(db) -> dict:
+    """Prévisions de tous les objectifs ; seuls ceux qui ont un nouveau point sont recalculés"""
+    cache = _goal_forecast_cache()
+    meta = db.execute(text(
+        "SELECT g.id, g.target_value, julianday(g.deadline) AS deadline, "
+        "       COUNT(p.id) AS n, MAX(p.id) AS last_id "
+        "FROM goals g LEFT JOIN goal_progress p ON p.goal_id = g.id GROUP BY g.id"
+    )).all()
+    fingerprints = {r.id: (r.n, r.last_id, r.target_value, r.deadline) for r in meta}
+    stale = [r for r in meta if cache.get(r.id, (None,))[0] != fingerprints[r.id]]
+    if stale:
+        # une ligne par objectif : jours et valeurs concaténés, lus sur l'index (goal_id, recorded_at)
+        history = db.execute(text(
+            "SELECT goal_id, group_concat(julianday(recorded_at)), group_concat(value) FROM goal_progress "
+            f"WHERE goal_id IN ({', '.join(str(int(r.id)) for r in stale)}) GROUP BY goal_id"
+        )).all()
+        by_id = {r.id: r for r in stale}
+        days = [csv_array(d) for _, d, _ in history]
+        forecasts = forecast_goal_batch(
+            np.repeat([g for g, _, _ in history], [len(d) for d in days]), np.concatenate(days),
+            np.concatenate([csv_array(v) for _, _, v in history]),
+            np.array([by_id[g].target_value or 0.0 for g, _, _ in history], dtype=float),
+            np.array([by_id[g].deadline if by_id[g].deadline is not None else np.nan for g, _, _ in history],
+                     dtype=float),
+        ) if history else {}
+        for r in stale:
+            cache[r.id] = (fingerprints[r.id], forecasts.get(r.id))
+    for goal_id in set(cache) - set(fingerprints):
+        del cache[goal_id]
+    return {goal_id: cache[goal_id][1] for goal_id in fingerprints}
+
+def goal_history(db, goal_id: int) -> pd.DataFrame:
+    """Série des points d'un objectif"""
+    rows = (db.query(GoalProgress.recorded_at, GoalProgress.value).filter(GoalProgress.goal_id == goal_id)
+            .order_by(GoalProgress.recorded_at).all())
+    return pd.DataFrame(rows, columns=["Date", "Valeur"])
+
+# ══════════════════════════════════════════════════════════════════════════════
+# ÉDITION EN GRILLE
+# ══════════════════════════════════════════════════════════════════════════════
+# Les grilles st.data_editor sont soumises d'un bloc : la grille éditée est
+# diffée avec l'originale (ajouts, modifications colonne par colonne,
+# suppressions) puis appliquée en lot dans un seul UnitOfWork, suivi d'un seul
+# rerun.
+
+INVESTMENT_CATEGORIES = ["Crypto", "Stocks", "RealEstate", "Savings", "Royaltiz", "Other"]
+GOAL_CATEGORIES = ["finance", "health", "career", "personal"]
+
+INVESTMENT_GRID_COLUMNS = ["name", "category", "amount", "current_value", "yield_pct", "notes"]
+GOAL_GRID_COLUMNS = ["title", "target_value", "current_value", "unit", "deadline", "category"]
+
+def _py(value):
+    """Valeur pandas/numpy -> valeur Python pour le driver"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    return value.item() if hasattr(value, "item") else value
+
+def grid_frame(rows: list, columns: list) -> pd.DataFrame:
+    """read model -> DataFrame éditable (id en première colonne)"""
+    return pd.DataFrame([{"id": r.id, **{c: getattr(r, c) for c in columns}} for r in rows],
+                        columns=["id"] + columns)
+
+def diff_grid(original: pd.DataFrame, edited: pd.DataFrame, columns: list) -> SimpleNamespace:
+    """Ajouts, modifications (colonnes changées seulement) et suppressions entre deux grilles"""
+    before = original.set_index("id")[columns]
+    known = edited[edited["id"].notna()].astype({"id": int}).set_index("id")[columns]
+    added = edited[edited["id"].isna()][columns]
+    
+    common = known.index.intersection(before.index)
+    old, new = before.loc[common].astype(object), known.loc[common].astype(object)
+    same = (old == new) | (old.isna() & new.isna())
+    updates = []
+    for entity_id in common[~same.all(axis=1).to_numpy()]:
+        changed = same.columns[~same.loc[entity_id].to_numpy()]
+        updates.append({"id": int(entity_id), **{c: _py(new.at[entity_id, c]) for c in changed}})
+    
+    inserts = [{c: _py(v) for c, v in row.items()} for row in added.to_dict("records")
+               if any(_py(v) not in (None, "") for v in row.values())]
+    return SimpleNamespace(inserts=inserts, updates=updates,
+                           deletes=sorted(int(i) for i in before.index.difference(known.index)))
+
+def apply_investment_grid(uow, diff: SimpleNamespace):
+    """Applique en lot les changements de la grille des investissements"""
+    db = uow.db
+    if diff.deletes:
+        db.query(ValuationSnapshot).filter(ValuationSnapshot.investment_id.in_(diff.deletes)).delete(synchronize_session=False)
+        db.query(Investment).filter(Investment.id.in_(diff.deletes)).delete(synchronize_session=False)
+    
+    # current_value passe par une valorisation datée du jour (historique du portefeuille)
+    revalued = [(row["id"], row.pop("current_value")) for row in diff.updates if "current_value" in row]
+    fields = [row for row in diff.updates if len(row) > 1]
+    if fields:
+        db.execute(update(Investment), fields)
+    # le montant investi est l'apport du premier point de la position
+    reinvested = [{"id": row["id"], "amount": row["amount"] or 0.0} for row in fields if "amount" in row]
+    if reinvested:
+        db.execute(text(
+            "UPDATE valuation_snapshots SET flow = :amount WHERE investment_id = :id AND date = "
+            "(SELECT MIN(date) FROM valuation_snapshots WHERE investment_id = :id)"
+        ), reinvested)
+    for investment_id, value in revalued:
+        record_valuation(uow, investment_id, value or 0.0)
+    
+    for row in diff.inserts:
+        row["category"] = row.get("category") or "Other"
+        add_investment(uow, **{k: v for k, v in row.items() if v is not None})
+    uow.emit("investments_edited", inserted=len(diff.inserts), updated=len(diff.updates), deleted=len(diff.deletes))
+
+def apply_goal_grid(uow, diff: SimpleNamespace):
+    """Applique en lot les changements de la grille des objectifs"""
+    db = uow.db
+    if diff.deletes:
+        delete_goals(uow, diff.deletes)
+    
+    # current_value passe par un point de progression (historique des objectifs)
+    progressed = [(row["id"], row.pop("current_value")) for row in diff.updates if "current_value" in row]
+    fields = [row for row in diff.updates if len(row) > 1]
+    if fields:
+        db.execute(update(Goal), fields)
+    for goal_id, value in progressed:
+        log_goal_progress(uow, goal_id, value or 0.0)
+    
+    for row in diff.inserts:
+        add_goal(uow, **{k: v for k, v in row.items() if v is not None})
+    uow.emit("goals_edited", inserted=len(diff.inserts), updated=len(diff.updates), deleted=len(diff.deletes))
+
+def render_grid(key: str, frame: pd.DataFrame, column_config: dict) -> Optional[pd.DataFrame]:
+    """Grille éditable dans un formulaire ; renvoie la grille éditée à la soumission"""
+    with st.form(key):
+        edited = st.data_editor(frame, key=f"{key}_editor", num_rows="dynamic", hide_index=True,
+                                use_container_width=True,
+                                column_config={"id": st.column_config.NumberColumn("#", disabled=True),
+                                               **column_config})
+        if st.form_submit_button("💾 Enregistrer les modifications", use_container_width=True):
+            return edited
+    return None
+
+# ══════════════════════════════════════════════════════════════════════════════
+# DAILY FEATURES
+# ══════════════════════════════════════════════════════════════════════════════
+# Une ligne par jour dans daily_features, tenue à jour par les abonnés des
+# événements d'écriture (sommes et compteurs incrémentés en upsert, dans la
+# transaction de l'action). Le coach et les analyses lisent une plage de jours
+# sur la clé primaire au lieu de compter dans chaque table de logs.
+
+DAILY_FEATURE_SOURCES = ("energy_logs", "sleep_logs", "habit_logs", "journal", "xp_logs")
+_ADDITIVE_FEATURES = ("energy_sum", "energy_count", "habits_done", "xp", "journal_count", "mood_sum", "mood_count")
+
+# humeur (mot de l'énergie ou emoji du journal) -> score 1..5
+MOOD_SCORES = {
+    "Excellent": 5, "😊": 5, "Heureux": 5, "🔥": 5, "Motivé": 5,
+    "Bien": 4, "🙂": 4, "😌": 4, "Calme": 4,
+    "Neutre": 3, "😐": 3, "🤔": 3, "Pensif": 3,
+    "Fatigué": 2, "😔": 2, "😴": 2, "😤": 2, "Stressé": 2,
+    "Épuisé": 1, "😫": 1,
+}
+
+def mood_score(mood: Optional[str]) -> Optional[int]:
+    """Score d'une humeur ("😊 Bien", "Fatigué", "🔥"...) ; None si inconnue"""
+    return next((MOOD_SCORES[token] for token in (mood or "").split() if token in MOOD_SCORES), None)
+
+def bump_daily_features(db, day: datetime.date, **deltas):
+    """Incrémente des colonnes additives de la journée (upsert)"""
+    stmt = sqlite_insert(DailyFeature).values(day=day, **deltas)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["day"],
+        set_={c: func.coalesce(getattr(DailyFeature, c), 0) + getattr(stmt.excluded, c) for c in deltas}
+    ))
+
+def set_daily_features(db, day: datetime.date, **values):
+    """Remplace des colonnes non additives de la journée (sommeil)"""
+    stmt = sqlite_insert(DailyFeature).values(day=day, **values)
+    db.execute(stmt.on_conflict_do_update(index_elements=["day"], set_=values))
+
+def _mood_deltas(mood: Optional[str], sign: int = 1) -> dict:
+    score = mood_score(mood)
+    return {} if score is None else {"mood_sum": sign * score, "mood_count": sign}
+
+@subscribe("energy_logged")
+def _feature_energy(uow, log, **_):
+    bump_daily_features(uow.db, log.timestamp.date(), energy_sum=log.level or 0, energy_count=1,
+                        **_mood_deltas(log.mood))
+
+@subscribe("sleep_logged")
+def _feature_sleep(uow, log, **_):
+    set_daily_features(uow.db, log.date, sleep_hours=log.duration, sleep_quality=log.quality)
+
+@subscribe("habit_completed")
+def _feature_habit_done(uow, day, **_):
+    bump_daily_features(uow.db, day, habits_done=1)
+
+@subscribe("habit_uncompleted")
+def _feature_habit_undone(uow, day, **_):
+    bump_daily_features(uow.db, day, habits_done=-1)
+
+@subscribe("habit_deleted")
+def _feature_habit_deleted(uow, days=(), **_):
+    for day, count in collections.Counter(days).items():
+        bump_daily_features(uow.db, day, habits_done=-count)
+
+@subscribe("journal_written")
+def _feature_journal(uow, entry, **_):
+    bump_daily_features(uow.db, entry.created_at.date(), journal_count=1, **_mood_deltas(entry.mood))
+
+@subscribe("journal_deleted")
+def _feature_journal_deleted(uow, created_at=None, mood=None, **_):
+    if created_at is not None:
+        bump_daily_features(uow.db, created_at.date(), journal_count=-1, **_mood_deltas(mood, -1))
+
+@subscribe("xp_awarded")
+def _feature_xp(uow, amount: int, skill_name: str, day: datetime.date, **_):
+    if not skill_name:
+        bump_daily_features(uow.db, day, xp=amount)
+        return
+    path = f'$."{skill_name}"'
+    stmt = sqlite_insert(DailyFeature).values(day=day, xp=amount, xp_by_skill=json.dumps({skill_name: amount}))
+    uow.db.execute(stmt.on_conflict_do_update(index_elements=["day"], set_={
+        "xp": func.coalesce(DailyFeature.xp, 0) + stmt.excluded.xp,
+        "xp_by_skill": func.json_set(func.coalesce(DailyFeature.xp_by_skill, "{}"), path,
+                                     func.coalesce(func.json_extract(DailyFeature.xp_by_skill, path), 0) + amount),
+    }))
+
+def rebuild_daily_features(conn):
+    """Reconstruit entièrement daily_features depuis les tables de logs"""
+    conn.execute(text("DELETE FROM daily_features"))
+    conn.execute(text(
+        "INSERT INTO daily_features (day, energy_sum, energy_count, habits_done, xp, xp_by_skill, "
+        "                            journal_count, mood_sum, mood_count) "
+        "SELECT day, 0, 0, 0, 0, '{}', 0, 0, 0 FROM ("
+        "  SELECT date(timestamp) AS day FROM energy_logs UNION SELECT date FROM sleep_logs "
+        "  UNION SELECT completed_at FROM habit_logs UNION SELECT date(created_at) FROM journal "
+        "  UNION SELECT day FROM xp_daily) WHERE day IS NOT NULL"
+    ))
+    aggregates = {
+        "energy_sum = a.s, energy_count = a.n":
+            "SELECT date(timestamp) AS day, SUM(level) AS s, COUNT(level) AS n FROM energy_logs GROUP BY 1",
+        "sleep_hours = a.duration, sleep_quality = a.quality":
+            "SELECT date AS day, duration, quality FROM sleep_logs "
+            "WHERE id IN (SELECT MAX(id) FROM sleep_logs GROUP BY date)",
+        "habits_done = a.n": "SELECT completed_at AS day, COUNT(*) AS n FROM habit_logs GROUP BY 1",
+        "journal_count = a.n": "SELECT date(created_at) AS day, COUNT(*) AS n FROM journal GROUP BY 1",
+        "xp = a.total, xp_by_skill = a.skills":
+            "SELECT day, SUM(amount) AS total, "
+            "       json_group_object(skill_name, amount) FILTER (WHERE skill_name != '') AS skills "
+            "FROM xp_daily GROUP BY day",
+    }
+    for assignments, source in aggregates.items():
+        conn.execute(text(f"UPDATE daily_features SET {assignments} FROM ({source}) AS a "
+                          "WHERE daily_features.day = a.day"))
+    
+    # humeur : les libellés sont agrégés par (jour, humeur) puis notés côté Python
+    moods = collections.defaultdict(lambda: [0.0, 0])
+    for day, mood, n in conn.execute(text(
+        "SELECT date(timestamp), mood, COUNT(*) FROM energy_logs GROUP BY 1, 2 "
+        "UNION ALL SELECT date(created_at), mood, COUNT(*) FROM journal GROUP BY 1, 2"
+    )):
+        score = mood_score(mood)
+        if score is not None:
+            moods[day][0] += score * n
+            moods[day][1] += n
+    if moods:
+        conn.execute(text("UPDATE daily_features SET mood_sum = :s, mood_count = :n WHERE day = :day"),
+                     [{"day": day, "s": s, "n": n} for day, (s, n) in moods.items()])
+
+def daily_features(db, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+    """Journées [start, end] (une ligne par jour, jours vides compris), lues sur la clé primaire"""
+    rows = db.query(DailyFeature).filter(DailyFeature.day >= start, DailyFeature.day <= end).all()
+    frame = pd.DataFrame([{c.key: getattr(r, c.key) for c in DailyFeature.__table__.columns} for r in rows],
+                         columns=[c.key for c in DailyFeature.__table__.columns])
+    frame.index = pd.to_datetime(frame.pop("day"))
+    frame = frame.reindex(pd.date_range(start, end, freq="D"))
+    frame[list(_ADDITIVE_FEATURES)] = frame[list(_ADDITIVE_FEATURES)].fillna(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["energy"] = frame["energy_sum"] / frame["energy_count"].where(frame["energy_count"] > 0)
+        frame["mood"] = frame["mood_sum"] / frame["mood_count"].where(frame["mood_count"] > 0)
+    frame["xp_by_skill"] = [json.loads(v) if isinstance(v, str) else {} for v in frame["xp_by_skill"]]
+    return frame
+
+# ══════════════════════════════════════════════════════════════════════════════
+# COACH IA
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Les règles lisent les COACH_WINDOW_DAYS derniers jours de daily_features (une
+# plage sur la clé primaire) ; chaque règle renvoie un conseil ou None.
+
+COACH_WINDOW_DAYS = 56
+COACH_RULES = []
+
+def coach_rule(fn):
+    COACH_RULES.append(fn)
+    return fn
+
+@coach_rule
+def _tip_habits_today(days, ctx):
+    uncompleted = ctx.habits - int(days["habits_done"].iloc[-1])
+    if ctx.habits and uncompleted > 0:
+        return f"🔥 Tu as {uncompleted} habitude(s) non complétée(s) aujourd'hui"
+
+@coach_rule
+def _tip_low_energy(days, ctx):
+    logged = days["energy"].dropna()
+    if len(logged) and logged.iloc[-1] < 5:
+        return "⚡ Ton niveau d'énergie est bas. Prends une pause !"
+
+@coach_rule
+def _tip_energy_trend(days, ctx):
+    week, before = days["energy"].iloc[-7:].dropna(), days["energy"].iloc[-28:-7].dropna()
+    if len(week) >= 3 and len(before) >= 3 and before.mean() - week.mean() >= 1:
+        return (f"📉 Ton énergie moyenne a baissé de {before.mean() - week.mean():.1f} point(s) cette semaine "
+                "par rapport aux 3 semaines précédentes")
+
+@coach_rule
+def _tip_short_sleep(days, ctx):
+    nights = days["sleep_hours"].iloc[-14:].dropna()
+    if len(nights) >= 5 and nights.mean() < 7:
+        return f"😴 Tu dors {nights.mean():.1f}h en moyenne sur 2 semaines. Vise 7-9h par nuit."
+
+@coach_rule
+def _tip_habit_momentum(days, ctx):
+    week, before = days["habits_done"].iloc[-7:].sum(), days["habits_done"].iloc[-14:-7].sum()
+    if before >= 5 and week <= 0.7 * before:
+        return f"🔁 {week:.0f} habitude(s) cochée(s) cette semaine contre {before:.0f} la semaine d'avant"
+
+@coach_rule
+def _tip_journal_gap(days, ctx):
+    if days["journal_count"].iloc[-7:].sum() == 0 and days["journal_count"].iloc[-35:-7].sum() > 0:
+        return "📝 Aucune entrée de journal depuis une semaine. Quelques lignes suffisent !"
+
+@coach_rule
+def _tip_low_mood(days, ctx):
+    recent = days["mood"].iloc[-3:]
+    if recent.notna().all() and (recent < 2.5).all():
+        return "💙 Humeur basse depuis 3 jours. Ménage-toi et parles-en à un proche."
+
+@coach_rule
+def _tip_neglected_skill(days, ctx):
+    def skills(part):
+        return {name for day in part for name, amount in day.items() if amount > 0}
+    neglected = sorted(skills(days["xp_by_skill"].iloc[:-28]) - skills(days["xp_by_skill"].iloc[-28:]))
+    if neglected:
+        return f"🧭 Compétence délaissée depuis 4 semaines : {', '.join(neglected[:3])}"
+
+@coach_rule
+def _tip_active_projects(days, ctx):
+    if ctx.active_projects > 5:
+        return f"📋 Tu as {ctx.active_projects} projets actifs. Focus sur 2-3 max."
+
+def generate_coach_tips(db, today: Optional[datetime.date] = None):
+    """Génère des conseils personnalisés"""
+    today = today or datetime.date.today()
+    days = daily_features(db, today - datetime.timedelta(days=COACH_WINDOW_DAYS - 1), today)
+    ctx = SimpleNamespace(
+        today=today,
+        habits=db.query(func.count(Habit.id)).scalar(),
+        active_projects=db.query(func.count(Project.id)).filter(Project.status == "active").scalar(),
+    )
+    tips = [tip for tip in (rule(days, ctx) for rule in COACH_RULES) if tip]
+    
+    if not tips:
+        tips.append("✨ Tu es sur la bonne voie ! Continue comme ça.")
+    
+    return tips
+
+# ══════════════════════════════════════════════════════════════════════════════
+# CORRÉLATIONS
+# ══════════════════════════════════════════════════════════════════════════════
+# Analyse de l'historique journalier (daily_features + bitsets des habitudes) :
+# corrélations de Pearson sur observations appariées, pour tous les couples et
+# tous les décalages à la fois (quelques produits matriciels sur des colonnes
+# masquées), p-valeurs par l'approximation de Fisher et tri par
+# Benjamini-Hochberg. Le calcul tourne dans un thread de fond ; la page affiche
+# le dernier résultat et en redemande un quand les données ont changé, au plus
+# une fois toutes les INSIGHT_REFRESH_S secondes.
+
+INSIGHT_MAX_DAYS = 5 * 365
+INSIGHT_MAX_LAG = 3
+INSIGHT_MIN_DAYS = 21
+INSIGHT_MIN_EFFECT = 0.2
+INSIGHT_ALPHA = 0.05
+INSIGHT_REFRESH_S = 300
+INSIGHT_WAIT_S = 1.0  # attente max d'un rendu de page avant d'afficher le résultat précédent
+
+# colonne -> libellé ; les cibles sont ce qu'on cherche à expliquer
+INSIGHT_FEATURES = {
+    "energy": "ton énergie", "mood": "ton humeur", "sleep_hours": "ta durée de sommeil",
+    "sleep_quality": "la qualité de ton sommeil", "habits_done": "tes habitudes", "xp": "ton XP",
+    "journal_count": "ton journal",
+}
+INSIGHT_TARGETS = ("energy", "mood", "sleep_quality")
+
+def insight_frame(db, end: datetime.date, max_days: int = INSIGHT_MAX_DAYS) -> pd.DataFrame:
+    """Une ligne par jour : variables journalières et une colonne 0/1 par habitude"""
+    first = db.query(func.min(DailyFeature.day)).scalar()
+    if first is None:
+        return pd.DataFrame(columns=list(INSIGHT_FEATURES))
+    start = max(first, end - datetime.timedelta(days=max_days - 1))
+    days = daily_features(db, start, end)
+    frame = days[list(INSIGHT_FEATURES)].astype(float)
+    # une journée sans aucun log ne dit rien : ses compteurs à 0 ne sont pas des mesures
+    empty = days[["energy_count", "habits_done", "xp", "journal_count", "mood_count"]].sum(axis=1).eq(0) \
+        & days["sleep_hours"].isna()
+    frame.loc[empty] = np.nan
+    
+    matrix = habit_day_matrix(db, end, (end - start).days + 1)
+    names = dict(db.query(Habit.id, Habit.name).all())
+    for habit_id, row in zip(matrix.habit_ids, matrix.matrix):
+        if row.any():
+            # avant la première complétion, l'habitude n'existait sans doute pas encore
+            values = row.astype(float)
+            values[:int(row.argmax())] = np.nan
+            values[empty.to_numpy()] = np.nan
+            frame[f"habit:{names.get(habit_id, habit_id)}"] = values
+    return frame
+
+def _pairwise_corr(x: np.ndarray, y: np.ndarray) -> tuple:
+    """Corrélations (colonnes de x) x (colonnes de y) sur les jours où les deux sont connus"""
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.nan_to_num(x), np.nan_to_num(y)
+    fx, fy = mx.astype(float), my.astype(float)
+    n = fx.T @ fy
+    sx, sy = x0.T @ fy, fx.T @ y0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = x0.T @ y0 - sx * sy / n
+        var_x = (x0 * x0).T @ fy - sx * sx / n
+        var_y = fx.T @ (y0 * y0) - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    return np.clip(r, -1, 1), n
+
+def _conditional_gap(x: np.ndarray, y: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Écart de moyenne de chaque cible entre jours où x >= seuil et jours où x < seuil"""
+    known = ~np.isnan(x)
+    high = (known & (x >= thresholds)).astype(float)
+    low = (known & (x < thresholds)).astype(float)
+    my = (~np.isnan(y)).astype(float)
+    y0 = np.nan_to_num(y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (high.T @ y0) / (high.T @ my) - (low.T @ y0) / (low.T @ my)
+
+def _threshold(name: str, values: np.ndarray) -> float:
+    if name.startswith("habit:") or name == "journal_count":
+        return 1.0
+    if name == "sleep_hours":
+        return 7.0
+    known = values[~np.isnan(values)]
+    return float(np.median(known)) if len(known) else np.nan
+
+def _condition(name: str, threshold: float) -> str:
+    if name.startswith("habit:"):
+        return f"tu fais « {name[6:]} »"
+    return {
+        "sleep_hours": f"tu as dormi {threshold:g}h+",
+        "habits_done": f"tu coches {threshold:g}+ habitude(s)",
+        "xp": f"tu gagnes {threshold:g}+ XP",
+        "journal_count": "tu écris dans ton journal",
+        "energy": f"ton énergie est à {threshold:g}+",
+        "mood": f"ton humeur est à {threshold:g}+ sur 5",
+        "sleep_quality": f"ta nuit est notée {threshold:g}+",
+    }[name]
+
+def _finding(driver: str, target: str, lag: int, gap: float, threshold: float) -> str:
+    when = {0: "les jours où", 1: "le lendemain des jours où"}.get(lag, f"{lag} jours après les jours où")
+    direction = "plus élevée" if gap > 0 else "plus basse"
+    return (f"{INSIGHT_FEATURES[target].capitalize()} est {abs(gap):.1f} point(s) {direction} "
+            f"{when} {_condition(driver, threshold)}")
+
+def correlation_insights(frame: pd.DataFrame, max_lag: int = INSIGHT_MAX_LAG,
+                         min_days: int = INSIGHT_MIN_DAYS, alpha: float = INSIGHT_ALPHA) -> SimpleNamespace:
+    """Matrice de corrélation, corrélations décalées significatives et phrases de constat"""
+    targets = [t for t in INSIGHT_TARGETS if t in frame.columns]
+    drivers = list(frame.columns)
+    values = frame.to_numpy(dtype=float)
+    y = frame[targets].to_numpy(dtype=float)
+    
+    # toutes les variables décalées de 0..max_lag jours, côte à côte : un seul produit matriciel
+    shifted = np.vstack([np.full((max_lag, len(drivers)), np.nan), values])
+    x = np.hstack([shifted[max_lag - lag:len(shifted) - lag] for lag in range(max_lag + 1)])
+    r, n = _pairwise_corr(x, y)
+    thresholds = np.array([_threshold(d, values[:, i]) for i, d in enumerate(drivers)] * (max_lag + 1))
+    gap = _conditional_gap(x, y, thresholds)
+    
+    lags = np.repeat(np.arange(max_lag + 1), len(drivers))
+    names = np.array(drivers * (max_lag + 1), dtype=object)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.arctanh(np.clip(r, -0.999999, 0.999999)) * np.sqrt(np.maximum(n - 3, 0))
+    p = np.vectorize(lambda v: math.erfc(abs(v) / math.sqrt(2)), otypes=[float])(np.nan_to_num(z))
+    
+    table = pd.DataFrame({
+        "driver": np.repeat(names, len(targets)), "lag": np.repeat(lags, len(targets)),
+        "target": targets * len(names), "r": r.ravel(), "n": n.ravel(), "p": p.ravel(), "gap": gap.ravel(),
+        "threshold": np.repeat(thresholds, len(targets)),
+    })
+    # pas d'auto-corrélation ni de doublon symétrique entre deux cibles le même jour
+    rank = {t: i for i, t in enumerate(targets)}
+    redundant = (table["driver"] == table["target"]) | \
+        ((table["lag"] == 0) & (table["driver"].map(rank) > table["target"].map(rank)))
+    table = table[~redundant & (table["n"] >= min_days) & table["r"].notna()].sort_values("p")
+    
+    # Benjamini-Hochberg sur les tests retenus
+    q = table["p"].to_numpy() * len(table) / np.arange(1, len(table) + 1)
+    table = table.assign(q=np.minimum(1.0, np.minimum.accumulate(q[::-1])[::-1]))
+    significant = table[(table["q"] <= alpha) & (table["r"].abs() >= INSIGHT_MIN_EFFECT) & table["gap"].notna()]
+    significant = significant.reindex(significant["r"].abs().sort_values(ascending=False).index)
+    
+    core = [c for c in INSIGHT_FEATURES if c in frame.columns]
+    return SimpleNamespace(
+        matrix=frame[core].corr(min_periods=min_days).rename(index=INSIGHT_FEATURES, columns=INSIGHT_FEATURES),
+        lagged=significant.reset_index(drop=True),
+        findings=[_finding(row.driver, row.target, int(row.lag), row.gap, row.threshold)
+                  for row in significant.drop_duplicates(["driver", "target"]).head(8).itertuples()],
+        days=int(frame.notna().any(axis=1).sum()),
+        tests=len(table),
+    )
+
+def compute_insights(db, today: datetime.date) -> SimpleNamespace:
+    """Analyse complète (appelée dans le thread de fond)"""
+    start = time.perf_counter()
+    result = correlation_insights(insight_frame(db, today))
+    result.computed_at = datetime.datetime.now()
+    result.seconds = time.perf_counter() - start
+    return result
+
+@st.cache_resource(show_spinner=False)
+def _insight_jobs() -> SimpleNamespace:
+    """Dernier résultat et calcul en cours, pour tout le process"""
+    return SimpleNamespace(lock=threading.Lock(), result=None, key=None, finished=0.0, pending=None,
+                           executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="aura-insights"))
+
+def _run_insights(jobs: SimpleNamespace, key: tuple, today: datetime.date):
+    db = get_db()
+    try:
+        result = compute_insights(db, today)
+    except Exception:
+        logger.exception("analyse des corrélations impossible")
+        result = jobs.result
+    finally:
+        db.close()
+    with jobs.lock:
+        jobs.result, jobs.key, jobs.finished, jobs.pending = result, key, time.monotonic(), None
+
+def request_insights(today: Optional[datetime.date] = None, wait: float = 0.0) -> SimpleNamespace:
+    """Dernière analyse disponible ; en relance une en fond si les données ont changé"""
+    today = today or datetime.date.today()
+    key = (table_versions("daily_features", "habit_day_bits", "habits"), today)
+    jobs = _insight_jobs()
+    with jobs.lock:
+        stale = jobs.key != key
+        due = jobs.result is None or time.monotonic() - jobs.finished >= INSIGHT_REFRESH_S
+        if stale and due and jobs.pending is None:
+            jobs.pending = jobs.executor.submit(_run_insights, jobs, key, today)
+        pending = jobs.pending
+    if pending is not None and wait:
+        concurrent_wait([pending], timeout=wait)
+    with jobs.lock:
+        return SimpleNamespace(result=jobs.result, computing=jobs.pending is not None, stale=jobs.key != key)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# READ MODELS (cache)
+# ══════════════════════════════════════════════════════════════════════════════
+# Les pages lisent via des read models mis en cache par st.cache_data. La clé de
+# cache contient la version des tables lues ; chaque commit qui écrit dans une
+# table incrémente sa version et n'invalide donc que les vues qui en dépendent.
+
+_WRITE_STATEMENT = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)',
+    re.IGNORECASE
+)
+
+@st.cache_resource
+def _read_cache_state() -> SimpleNamespace:
+    """Versions des tables et compteurs du cache, partagés par tous les reruns"""
+    return SimpleNamespace(versions=collections.Counter(), hits=0, misses=0)
+
+def bump_table_versions(tables):
+    """Invalide les read models qui dépendent de ces tables"""
+    versions = _read_cache_state().versions
+    for table in tables:
+        versions[table] += 1
+
+def table_versions(*tables) -> tuple:
+    """Version courante de chaque table"""
+    versions = _read_cache_state().versions
+    return tuple(versions[t] for t in tables)
+
+def _track_written_tables(conn, cursor, statement, parameters, context, executemany):
+    match = _WRITE_STATEMENT.match(statement)
+    if match:
+        conn.info.setdefault("written_tables", set()).add(match.group(1).lower())
+
+def _publish_written_tables(conn):
+    written = conn.info.pop("written_tables", None)
+    if written:
+        _write_stats().write_commits += 1
+        bump_table_versions(written)
+
+def _discard_written_tables(conn):
+    conn.info.pop("written_tables", None)
+
+def install_version_tracking(bind):
+    """Branche le suivi des écritures (version par table) sur un engine"""
+    event.listen(bind, "after_cursor_execute", _track_written_tables)
+    event.listen(bind, "commit", _publish_written_tables)
+    event.listen(bind, "rollback", _discard_written_tables)
+
+def _plain(obj) -> SimpleNamespace:
+    """Copie détachée (et sérialisable) des colonnes d'un objet ORM"""
+    return SimpleNamespace(**{c.key: getattr(obj, c.key) for c in obj.__table__.columns})
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _cached_read(model: str, versions: tuple, args: tuple, kwargs: tuple):
+    _read_cache_state().misses += 1
+    db = get_db()
+    try:
+        return READ_MODELS[model](db, *args, **dict(kwargs))
+    finally:
+        db.close()
+
+READ_MODELS = {}
+
+def read_model(*tables):
+    """Décorateur : lecture en cache, invalidée quand une de ces tables change"""
+    def decorator(fn):
+        READ_MODELS[fn.__name__] = fn
+
+        def wrapper(*args, **kwargs):
+            _read_cache_state().hits += 1
+            return _cached_read(fn.__name__, table_versions(*tables), args, tuple(sorted(kwargs.items())))
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+    return decorator
+
+def read_cache_stats() -> tuple:
+    """(hits, misses) cumulés du cache des read models"""
+    state = _read_cache_state()
+    return state.hits - state.misses, state.misses
+
+@read_model("user_profile")
+def load_profile(db):
+    """Profil utilisateur"""
+    profile = db.query(UserProfile).first()
+    return _plain(profile) if profile else None
+
+@read_model("skills")
+def load_skills(db):
+    """Compétences"""
+    return [_plain(s) for s in db.query(Skill).all()]
+
+@read_model("achievements")
+def load_achievements(db):
+    """Achievements"""
+    return [_plain(a) for a in db.query(Achievement).all()]
+
+@read_model("achievements")
+def load_locked_achievement_names(db):
+    """Noms des achievements encore verrouillés"""
+    return {name for (name,) in db.query(Achievement.name).filter(Achievement.unlocked == 0)}
+
+@read_model("investments")
+def load_investments(db):
+    """Investissements"""
+    return [_plain(i) for i in db.query(Investment).all()]
+
+@read_model("investments")
+def load_portfolio_totals(db):
+    """Nombre de positions, montant investi et valeur actuelle"""
+    return portfolio_totals(db)
+
+@read_model("investments")
+def load_portfolio_allocation(db):
+    """Répartition par catégorie"""
+    return portfolio_allocation(db)
+
+@read_model("valuation_snapshots")
+def load_portfolio_history(db):
+    """Série de valeur et rendements, recalculés à chaque nouvelle valorisation"""
+    return portfolio_history(db)
+
+@read_model("goals")
+def load_goals(db):
+    """Objectifs"""
+    return [_plain(g) for g in db.query(Goal).all()]
+
+@read_model("goals", "goal_progress")
+def load_goal_forecasts(db):
+    """Date d'atteinte et probabilité d'être à la cible, par objectif"""
+    return goal_forecasts(db)
+
+@read_model("goal_progress")
+def load_goal_history(db, goal_id: int) -> pd.DataFrame:
+    """Historique de progression d'un objectif"""
+    return goal_history(db, goal_id)
+
+@read_model("projects")
+def load_projects(db):
+    """Projets triés par priorité"""
+    return [_plain(p) for p in db.query(Project).order_by(Project.priority.desc()).all()]
+
+@read_model("projects")
+def load_active_project_count(db):
+    """Nombre de projets actifs"""
+    return db.query(Project).filter(Project.status == "active").count()
+
+@read_model("habits")
+def load_habits(db):
+    """Habitudes"""
+    return [_plain(h) for h in db.query(Habit).all()]
+
+@read_model("habit_logs")
+def load_completed_habit_ids(db, day: datetime.date):
+    """Ids des habitudes complétées à une date"""
+    return habits_completed_on(db, day)
+
+@read_model("habit_day_bits", "habits")
+def load_habit_heatmap(db, end: datetime.date, days: int = 365):
+    """Complétions des 365 derniers jours, depuis les bitsets"""
+    return habit_day_matrix(db, end, days)
+
+@read_model("energy_logs")
+def load_energy_logs(db, limit: int):
+    """Derniers logs d'énergie (plus récent en premier)"""
+    return [_plain(l) for l in db.query(EnergyLog).order_by(EnergyLog.id.desc()).limit(limit).all()]
+
+@read_model("sleep_logs")
+def load_sleep_analytics(db, goal_hours: float, today: datetime.date):
+    """Fenêtres 7/30/90 jours, régularité du coucher et chronotype"""
+    return sleep_analytics(db, goal_hours, today)
+
+@read_model("energy_logs")
+def load_energy_series(db, start: Optional[datetime.date], budget: int = CHART_POINT_BUDGET):
+    """Niveaux d'énergie de la période, sous-échantillonnés"""
+    return downsampled_series(db, "energy", start, budget)
+
+@read_model("sleep_logs")
+def load_sleep_series(db, start: Optional[datetime.date], budget: int = CHART_POINT_BUDGET):
+    """Durée et qualité des nuits de la période, sous-échantillonnées"""
+    return downsampled_series(db, "sleep", start, budget)
+
+@read_model("journal", "entity_tags", "tags")
+def load_journal_page(db, cursor: Optional[tuple] = None, limit: int = 20, tags: tuple = ()):
+    """Page du journal par curseur (created_at, id) décroissant ; renvoie (entrées, curseur suivant)"""
+    order = (JournalEntry.created_at, JournalEntry.id)
+    query = db.query(JournalEntry)
+    if tags:
+        query = query.filter(JournalEntry.id.in_(tagged_with("journal", tags)))
+    if cursor:
+        query = query.filter(tuple_(*order) < tuple_(*cursor))
+    entries = [_plain(e) for e in query.order_by(*(c.desc() for c in order)).limit(limit + 1).all()]
+    next_cursor = (entries[limit - 1].created_at, entries[limit - 1].id) if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+@read_model("journal", "entity_tags", "tags")
+def load_tag_facets(db, entity: str = "journal") -> pd.DataFrame:
+    """Facettes tag x mois"""
+    return tag_facets(db, entity)
+
+@read_model("journal", "notes", "projects", "goals")
+def load_search_results(db, query: str, kinds: tuple = (), limit: int = 30):
+    """Recherche plein texte, mise en cache par requête"""
+    return search_all(db, query, kinds, limit)
+
+@read_model("notes")
+def load_note_index(db) -> dict:
+    """Titres des notes (id -> titre), par ordre alphabétique"""
+    return dict(db.query(Note.id, Note.title).order_by(Note.title, Note.id).all())
+
+@read_model("notes")
+def load_note(db, note_id: int):
+    """Une note"""
+    note = db.get(Note, note_id)
+    return _plain(note) if note else None
+
+@read_model("note_links")
+def load_note_links(db, note_id: int) -> SimpleNamespace:
+    """Liens sortants, backlinks et voisinage à 2 sauts d'une note"""
+    distance = note_neighbourhood(db, note_id, hops=2)
+    return SimpleNamespace(
+        outgoing=[dst for (dst,) in db.query(NoteLink.dst).filter(NoteLink.src == note_id)],
+        backlinks=[src for (src,) in db.query(NoteLink.src).filter(NoteLink.dst == note_id)],
+        second_hop=[n for n, d in distance.items() if d == 2],
+    )
+
+@read_model("note_links")
+def load_note_graph(db, focus: Optional[int] = None):
+    """Graphe et placement : recalculés seulement quand les arêtes changent"""
+    return note_graph(db, focus)
+
+@read_model("journal")
+def load_journal_count(db):
+    """Nombre d'entrées du journal"""
+    return db.query(JournalEntry).count()
+
+@read_model("quests")
+def load_quests(db, quest_type: str, since: datetime.datetime):
+    """Quêtes d'un type créées depuis une date"""
+    return [_plain(q) for q in db.query(Quest).filter(
+        Quest.quest_type == quest_type, Quest.created_at >= since).all()]
+
+@read_model("quests")
+def load_active_boss(db):
+    """Boss en cours"""
+    boss = db.query(Quest).filter(Quest.quest_type == "boss", Quest.completed == 0).first()
+    return _plain(boss) if boss else None
+
+@read_model("quests")
+def load_completed_quest_count(db):
+    """Nombre total de quêtes complétées"""
+    return db.query(Quest).filter(Quest.completed == 1).count()
+
+@read_model("xp_logs")
+def load_recent_xp_logs(db, limit: int):
+    """Derniers gains d'XP"""
+    return [_plain(l) for l in db.query(XPLog).order_by(XPLog.id.desc()).limit(limit).all()]
+
+@read_model("xp_daily")
+def load_xp_per_day(db, start: datetime.date, end: datetime.date):
+    """XP par jour (rollup)"""
+    return xp_per_day(db, start, end)
+
+@read_model("xp_daily")
+def load_xp_per_skill_day(db, start: datetime.date, end: datetime.date):
+    """XP par jour et par compétence (rollup)"""
+    return xp_per_skill_day(db, start, end)
+
+@read_model("xp_daily")
+def load_level_forecast(db, total_xp: int, level: int, today: datetime.date):
+    """Jours estimés avant le prochain niveau"""
+    return forecast_days_to_level(db, total_xp, level)
+
+@read_model("daily_features", "habits", "projects")
+def load_coach_tips(db, today: datetime.date):
+    """Conseils du coach"""
+    return generate_coach_tips(db, today)
+
+@read_model("habit_logs", "achievements")
+def load_analytics_stats(db):
+    """Compteurs globaux de la page Analytics"""
+    return SimpleNamespace(
+        active_days=db.query(func.count(func.distinct(HabitLog.completed_at))).scalar(),
+        total_habits=db.query(HabitLog).count(),
+        achievements_unlocked=db.query(Achievement).filter(Achievement.unlocked == 1).count(),
+        total_achievements=db.query(Achievement).count(),
+    )
+
+@read_model("daily_features")
+def load_coach_activity(db, today: datetime.date):
+    """Volume de données et activité du jour pour le coach"""
+    data_points = db.query(func.coalesce(func.sum(
+        DailyFeature.habits_done + DailyFeature.energy_count + DailyFeature.journal_count +
+        (DailyFeature.sleep_hours.isnot(None))), 0)).scalar()
+    today_row = db.get(DailyFeature, today)
+    return SimpleNamespace(
+        data_points=data_points,
+        journal_today=today_row.journal_count if today_row else 0,
+        energy_today=today_row.energy_count if today_row else 0,
+    )
+
+# ══════════════════════════════════════════════════════════════════════════════
+# SQL PROFILER
+# ══════════════════════════════════════════════════════════════════════════════
+# Profileur opt-in : pendant un rerun, chaque requête est chronométrée et
+# rattachée à la fonction de page en cours (contextvars, donc par session).
+# Les requêtes sont regroupées par forme normalisée (littéraux -> ?) ; une même
+# forme répétée avec des paramètres différents dans un rerun est suspecte de N+1.
+
+sql_logger = logging.getLogger("aura.sql")
+
+@st.cache_resource(show_spinner=False)
+def _sql_context() -> SimpleNamespace:
+    """Contextvars partagées entre reruns (les listeners de l'engine survivent au script)"""
+    return SimpleNamespace(
+        trace=contextvars.ContextVar("aura_sql_trace", default=None),
+        scope=contextvars.ContextVar("aura_sql_scope", default="main"),
+    )
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_SPACES = re.compile(r"\s+")
+
+def normalize_sql(statement: str) -> str:
+    """Forme d'une requête : littéraux et listes IN remplacés par ?"""
+    shape = _SQL_LITERALS.sub("?", statement)
+    shape = _SQL_IN_LIST.sub("(?)", shape)
+    return _SQL_SPACES.sub(" ", shape).strip()
+
+class SqlTrace:
+    """Requêtes d'un rerun, groupées par (page, forme)"""
+    
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.stats = {}
+        self.figures = []
+    
+    def record(self, scope: str, statement: str, parameters, ms: float, executemany: bool):
+        key = (scope, normalize_sql(statement))
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = SimpleNamespace(scope=scope, shape=key[1], count=0, total_ms=0.0,
+                                                     max_ms=0.0, params=set(), executemany=executemany)
+        stat.count += 1
+        stat.total_ms += ms
+        stat.max_ms = max(stat.max_ms, ms)
+        stat.params.add(repr(parameters)[:200])
+        if ms >= SQL_SLOW_MS:
+            sql_logger.warning(json.dumps({"event": "slow_query", "page": self.page, "scope": scope,
+                                           "ms": round(ms, 2), "sql": key[1][:500]}, ensure_ascii=False))
+    
+    def record_figure(self, chart_id: str, entry: SimpleNamespace, hit: bool, render_ms: float):
+        self.figures.append(SimpleNamespace(chart=chart_id, hit=hit, points=entry.points, bytes=entry.bytes,
+                                            build_ms=0.0 if hit else entry.build_ms, render_ms=render_ms))
+    
+    def n_plus_one(self) -> list:
+        """Formes répétées avec des paramètres différents au-delà du seuil"""
+        return [s for s in self.stats.values()
+                if not s.executemany and s.count >= SQL_N_PLUS_ONE and len(s.params) > 1]
+    
+    def summary(self) -> dict:
+        return {
+            "event": "rerun",
+            "page": self.page,
+            "statements": sum(s.count for s in self.stats.values()),
+            "shapes": len(self.stats),
+            "sql_ms": round(sum(s.total_ms for s in self.stats.values()), 2),
+            "rerun_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "n_plus_one": [{"scope": s.scope, "count": s.count, "sql": s.shape[:200]} for s in self.n_plus_one()],
+            "figures": [{"chart": f.chart, "hit": f.hit, "bytes": f.bytes, "render_ms": round(f.render_ms, 2)}
+                        for f in self.figures],
+        }
+    
+    def frame(self) -> pd.DataFrame:
+        suspects = {id(s) for s in self.n_plus_one()}
+        rows = [{"Portée": s.scope, "Requête": s.shape, "N": s.count, "Total ms": round(s.total_ms, 2),
+                 "Max ms": round(s.max_ms, 2), "N+1": "⚠️" if id(s) in suspects else ""}
+                for s in sorted(self.stats.values(), key=lambda s: s.total_ms, reverse=True)]
+        return pd.DataFrame(rows, columns=["Portée", "Requête", "N", "Total ms", "Max ms", "N+1"])
+    
+    def figure_frame(self) -> pd.DataFrame:
+        rows = [{"Figure": f.chart, "Cache": "✅" if f.hit else "", "Points": f.points,
+                 "Ko": round(f.bytes / 1024, 1), "Build ms": round(f.build_ms, 2),
+                 "Rendu ms": round(f.render_ms, 2)} for f in self.figures]
+        return pd.DataFrame(rows, columns=["Figure", "Cache", "Points", "Ko", "Build ms", "Rendu ms"])
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql_context().trace.get() is not None:
+        conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context = _sql_context()
+    trace = context.trace.get()
+    started = conn.info.get("sql_started")
+    if trace is not None and started:
+        ms = (time.perf_counter() - started.pop()) * 1000
+        trace.record(context.scope.get(), statement, parameters, ms, executemany)
+
+def install_sql_profiler(bind):
+    """Branche le profileur sur un engine (inactif tant qu'aucun rerun n'est tracé)"""
+    event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+    event.listen(bind, "after_cursor_execute", _after_cursor_execute)
 
-def init_achievements(db):
-    """Initialise les achievements"""
-    if db.query(Achievement).count() == 0:
-        achievements = [
-            {"name": "Premier Pas", "description": "Compléter ta première habitude", "icon": "🚩"},
-            {"name": "Série de 7", "description": "Maintenir une habitude 7 jours", "icon": "🔥"},
-            {"name": "Série de 30", "description": "Maintenir une habitude 30 jours", "icon": "🏆"},
-            {"name": "Niveau 5", "description": "Atteindre le niveau 5", "icon": "⭐"},
-            {"name": "Niveau 10", "description": "Atteindre le niveau 10", "icon": "👑"},
-            {"name": "Millionnaire XP", "description": "Accumuler 10000 XP", "icon": "💎"},
-            {"name": "Penseur", "description": "Écrire 10 entrées de journal", "icon": "📖"},
-            {"name": "Maître Skill", "description": "Avoir une compétence niveau 10", "icon": "🏅"},
-        ]
-        for a in achievements:
-            db.add(Achievement(**a))
-        db.commit()
+@contextlib.contextmanager
+def sql_scope(name: str):
+    """Attribue les requêtes du bloc à une portée (fonction de page)"""
+    scope = _sql_context().scope
+    token = scope.set(name)
+    try:
+        yield
+    finally:
+        scope.reset(token)
+
+@contextlib.contextmanager
+def sql_profiling(page: str, enabled: bool):
+    """Trace les requêtes d'un rerun ; journalise un résumé JSON à la fin"""
+    if not enabled:
+        yield None
+        return
+    trace = SqlTrace(page)
+    context = _sql_context()
+    token = context.trace.set(trace)
+    try:
+        yield trace
+    finally:
+        context.trace.reset(token)
+        summary = trace.summary()
+        sql_logger.info(json.dumps(summary, ensure_ascii=False))
+        for suspect in summary["n_plus_one"]:
+            sql_logger.warning(json.dumps({"event": "n_plus_one", "page": page, **suspect}, ensure_ascii=False))
+
+def render_sql_panel(trace: "SqlTrace"):
+    """Panneau repliable du profileur dans la sidebar"""
+    summary = trace.summary()
+    with st.sidebar.expander(f"🐞 SQL : {summary['statements']} requête(s) · {summary['sql_ms']:.1f} ms"):
+        st.caption(f"{summary['shapes']} forme(s) distincte(s) · rerun {summary['rerun_ms']:.0f} ms")
+        for suspect in summary["n_plus_one"]:
+            st.warning(f"N+1 suspect dans {suspect['scope']} : {suspect['count']}× {suspect['sql'][:80]}")
+        if summary["statements"]:
+            st.dataframe(trace.frame(), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Aucune requête : tout vient du cache des read models")
+        if trace.figures:
+            st.dataframe(trace.figure_frame(), use_container_width=True, hide_index=True)
 
 # ══════════════════════════════════════════════════════════════════════════════
-# GAMIFICATION FUNCTIONS
+# FIGURES (cache)
 # ══════════════════════════════════════════════════════════════════════════════
+# Chaque graphique est construit par une fonction pure de ses données. La figure
+# est gardée par (identifiant, empreinte des données) : tant que les données ne
+# changent pas, le rerun réutilise la figure déjà construite et validée au lieu
+# de la refaire. Seule la construction est mise en cache : st.plotly_chart
+# sérialise encore la figure à chaque rerun. Ce temps de rendu est mesuré à
+# chaque affichage, la taille du JSON une fois à la construction, et les deux
+# remontent dans le panneau du profileur. Les traces ligne / nuage passent en
+# WebGL (scattergl) au-delà de GL_POINT_THRESHOLD points.
 
-def xp_for_level(level: int) -> int:
-    """XP nécessaire pour atteindre un niveau"""
-    return int(100 * (level ** 1.5))
+GL_POINT_THRESHOLD = 1000
+FIGURE_CACHE_SIZE = 64
+figure_logger = logging.getLogger("aura.figures")
 
-def level_from_xp(xp: int) -> int:
-    """Calcule le niveau à partir de l'XP total"""
-    level = 1
-    while xp >= xp_for_level(level + 1):
-        level += 1
-    return level
+@st.cache_resource(show_spinner=False)
+def _figure_cache() -> collections.OrderedDict:
+    """(identifiant, empreinte) -> figure, en LRU pour tout le process"""
+    return collections.OrderedDict()
 
-def get_title(level: int) -> str:
-    """Titre basé sur le niveau"""
-    titles = {
-        1: "Apprenti de la Vie",
-        5: "Explorateur",
-        10: "Aventurier",
-        15: "Guerrier du Quotidien",
-        20: "Maître de Soi",
-        25: "Sage",
-        30: "Légende Vivante",
-        40: "Architecte de Destin",
-        50: "Transcendant"
-    }
-    for lvl in sorted(titles.keys(), reverse=True):
-        if level >= lvl:
-            return titles[lvl]
-    return titles[1]
+def data_fingerprint(*data) -> str:
+    """Empreinte du contenu des données d'un graphique (DataFrame, tableaux, scalaires)"""
+    digest = hashlib.blake2b(digest_size=16)
+    
+    def feed(obj):
+        if isinstance(obj, pd.DataFrame):
+            digest.update(repr(list(obj.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(obj, index=False).to_numpy().tobytes())
+        elif isinstance(obj, np.ndarray):
+            digest.update(repr((obj.shape, obj.dtype.str)).encode())
+            digest.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, (list, tuple)):
+            digest.update(b"[")
+            for item in obj:
+                feed(item)
+            digest.update(b"]")
+        else:
+            digest.update(repr(obj).encode())
+    for obj in data:
+        feed(obj)
+    return digest.hexdigest()
 
-def award_xp(db, amount: int, source: str, skill_name: str = None):
-    """Attribue de l'XP au profil et à une compétence"""
-    profile = db.query(UserProfile).first()
-    if not profile:
-        init_profile(db)
-        profile = db.query(UserProfile).first()
-    
-    old_level = profile.level
-    profile.total_xp += amount
-    profile.level = level_from_xp(profile.total_xp)
-    profile.title = get_title(profile.level)
-    
-    if skill_name:
-        skill = db.query(Skill).filter(Skill.name == skill_name).first()
-        if skill:
-            skill.xp += amount
-            skill.level = level_from_xp(skill.xp)
-    
-    db.add(XPLog(amount=amount, source=source, skill_name=skill_name or ""))
-    db.commit()
-    
-    return profile.level > old_level
+def use_webgl(fig: go.Figure, threshold: int = GL_POINT_THRESHOLD) -> go.Figure:
+    """Remplace les traces scatter de plus de threshold points par des scattergl"""
+    def heavy(t):
+        return t.type == "scatter" and t.x is not None and len(t.x) > threshold
+    if not any(heavy(t) for t in fig.data):
+        return fig
+    return go.Figure([go.Scattergl({k: v for k, v in t.to_plotly_json().items() if k != "type"}, skip_invalid=True)
+                      if heavy(t) else t for t in fig.data], layout=fig.layout)
 
-def check_achievements(db):
-    """Vérifie et débloque les achievements"""
-    profile = db.query(UserProfile).first()
-    habits = db.query(Habit).all()
-    journal_count = db.query(JournalEntry).count()
-    skills = db.query(Skill).all()
-    
-    unlocks = []
-    checks = [
-        ("Premier Pas", any(h.streak > 0 for h in habits)),
-        ("Série de 7", any(h.best_streak >= 7 for h in habits)),
-        ("Série de 30", any(h.best_streak >= 30 for h in habits)),
-        ("Niveau 5", profile and profile.level >= 5),
-        ("Niveau 10", profile and profile.level >= 10),
-        ("Millionnaire XP", profile and profile.total_xp >= 10000),
-        ("Penseur", journal_count >= 10),
-        ("Maître Skill", any(s.level >= 10 for s in skills)),
-    ]
-    
-    for name, condition in checks:
-        if condition:
-            ach = db.query(Achievement).filter(Achievement.name == name, Achievement.unlocked == 0).first()
-            if ach:
-                ach.unlocked = 1
-                ach.unlocked_at = datetime.datetime.utcnow()
-                unlocks.append(name)
-    
-    db.commit()
-    return unlocks
+def _trace_points(trace) -> int:
+    for attribute in ("z", "x", "values", "r"):
+        values = getattr(trace, attribute, None)
+        if values is not None:
+            return int(np.size(np.asarray(values, dtype=object)))
+    return 0
 
-def generate_daily_quests(db):
-    """Génère les quêtes quotidiennes"""
-    today = datetime.date.today()
-    existing = db.query(Quest).filter(
-        Quest.quest_type == "daily",
-        Quest.created_at >= datetime.datetime.combine(today, datetime.time.min)
-    ).count()
-    
-    if existing == 0:
-        daily_quests = [
-            {"title": "Lève-tôt", "description": "Logger ton énergie", "quest_type": "daily", "xp_reward": 30, "skill_target": "Énergie", "target_value": 1},
-            {"title": "Triple Habitude", "description": "Compléter 3 habitudes", "quest_type": "daily", "xp_reward": 50, "skill_target": "Discipline", "target_value": 3},
-            {"title": "Pensée du Jour", "description": "Écrire dans le journal", "quest_type": "daily", "xp_reward": 25, "skill_target": "Intelligence", "target_value": 1},
-        ]
-        tomorrow = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time.min)
-        for q in daily_quests:
-            q["expires_at"] = tomorrow
-            db.add(Quest(**q))
-        db.commit()
+def cached_figure(chart_id: str, build, *data) -> tuple:
+    """Figure d'un graphique depuis le cache, ou construite puis mesurée ; renvoie (entrée, trouvée)"""
+    cache = _figure_cache()
+    key = (chart_id, data_fingerprint(*data))
+    entry = cache.get(key)
+    if entry is not None:
+        cache.move_to_end(key)
+        return entry, True
+    
+    start = time.perf_counter()
+    fig = use_webgl(build(*data))
+    built = time.perf_counter()
+    entry = SimpleNamespace(figure=fig, bytes=len(fig.to_json().encode()),
+                            points=sum(_trace_points(t) for t in fig.data),
+                            build_ms=(built - start) * 1000)
+    cache[key] = entry
+    while len(cache) > FIGURE_CACHE_SIZE:
+        cache.popitem(last=False)
+    figure_logger.debug(json.dumps({"event": "figure_built", "chart": chart_id, "points": entry.points,
+                                    "bytes": entry.bytes, "build_ms": round(entry.build_ms, 2)}))
+    return entry, False
 
-def generate_weekly_quest(db):
-    """Génère la quête boss hebdomadaire"""
-    today = datetime.date.today()
-    week_start = today - datetime.timedelta(days=today.weekday())
-    existing = db.query(Quest).filter(
-        Quest.quest_type == "boss",
-        Quest.created_at >= datetime.datetime.combine(week_start, datetime.time.min)
-    ).count()
-    
-    if existing == 0:
-        bosses = [
-            {"title": "🐉 Boss: Procrastination", "description": "Compléter 20 habitudes cette semaine", "xp_reward": 500, "skill_target": "Discipline", "target_value": 20},
-            {"title": "🐉 Boss: Chaos Mental", "description": "Écrire 5 entrées journal", "xp_reward": 400, "skill_target": "Intelligence", "target_value": 5},
-            {"title": "🐉 Boss: Fatigue", "description": "Logger 7 nuits de sommeil", "xp_reward": 450, "skill_target": "Santé", "target_value": 7},
-        ]
-        boss = random.choice(bosses)
-        boss["quest_type"] = "boss"
-        boss["expires_at"] = datetime.datetime.combine(week_start + datetime.timedelta(days=7), datetime.time.min)
-        db.add(Quest(**boss))
-        db.commit()
+def plot(chart_id: str, build, *data):
+    """Affiche un graphique via le cache de figures (st.plotly_chart sérialise à chaque rerun)"""
+    entry, hit = cached_figure(chart_id, build, *data)
+    start = time.perf_counter()
+    st.plotly_chart(entry.figure, use_container_width=True, key=chart_id)
+    trace = _sql_context().trace.get()
+    if trace is not None:
+        trace.record_figure(chart_id, entry, hit, (time.perf_counter() - start) * 1000)
 
-# ══════════════════════════════════════════════════════════════════════════════
-# COACH IA
-# ══════════════════════════════════════════════════════════════════════════════
+def _dark(fig: go.Figure, **layout) -> go.Figure:
+    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font_color='white', **layout)
+    return fig
 
-def generate_coach_tips(db):
-    """Génère des conseils personnalisés"""
-    tips = []
-    today = datetime.date.today()
-    
-    # Analyse des habitudes
-    habits = db.query(Habit).all()
-    uncompleted = sum(1 for h in habits if not db.query(HabitLog).filter(
-        HabitLog.habit_id == h.id, HabitLog.completed_at == today).first())
-    
-    if uncompleted > 0:
-        tips.append(f"🔥 Tu as {uncompleted} habitude(s) non complétée(s) aujourd'hui")
-    
-    # Analyse de l'énergie
-    last_energy = db.query(EnergyLog).order_by(EnergyLog.id.desc()).first()
-    if last_energy and last_energy.level < 5:
-        tips.append("⚡ Ton niveau d'énergie est bas. Prends une pause !")
-    
-    # Analyse des projets
-    active_projects = db.query(Project).filter(Project.status == "active").count()
-    if active_projects > 5:
-        tips.append(f"📋 Tu as {active_projects} projets actifs. Focus sur 2-3 max.")
-    
-    if not tips:
-        tips.append("✨ Tu es sur la bonne voie ! Continue comme ça.")
-    
-    return tips
+def portfolio_figure(series: pd.DataFrame) -> go.Figure:
+    fig = px.line(series, x="Date", y=["Valeur", "Apports"], color_discrete_sequence=['#32d7e2', '#8b5cf6'])
+    return _dark(fig, legend_title_text="")
+
+def allocation_figure(allocation: pd.DataFrame) -> go.Figure:
+    fig = px.pie(allocation, values="Valeur", names="Catégorie", title="Répartition du patrimoine",
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    return _dark(fig)
+
+def energy_figure(levels: pd.DataFrame) -> go.Figure:
+    fig = px.line(levels, x="Date", y="Niveau", markers=len(levels) <= 60)
+    fig.update_traces(line_color='#32d7e2', marker_color='#32d7e2')
+    return _dark(fig, yaxis_range=[0, 10])
+
+def sleep_figure(duration: pd.DataFrame, quality: pd.DataFrame) -> go.Figure:
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=duration["Date"], y=duration["duration"], name="Durée (h)", marker_color='#32d7e2'))
+    fig.add_trace(go.Scatter(x=quality["Date"], y=quality["quality"], name="Qualité",
+                             mode='lines+markers' if len(quality) <= 60 else 'lines',
+                             yaxis='y2', marker_color='#bf5af2'))
+    return _dark(fig,
+                 yaxis=dict(title="Durée (h)", range=[0, 12]),
+                 yaxis2=dict(title="Qualité", overlaying='y', side='right', range=[0, 10]),
+                 legend=dict(orientation="h", yanchor="bottom", y=1.02))
+
+def sleep_rolling_figure(rolling: pd.DataFrame) -> go.Figure:
+    fig = px.line(rolling, x="Date", y=[c for c in rolling.columns if c != "Date"],
+                  color_discrete_sequence=['#32d7e2', '#8b5cf6', '#f5a623'])
+    return _dark(fig, legend_title_text="", yaxis_title="Heures")
+
+def correlation_figure(matrix: pd.DataFrame) -> go.Figure:
+    fig = go.Figure(go.Heatmap(z=matrix.to_numpy(), x=list(matrix.columns), y=list(matrix.index),
+                               zmin=-1, zmax=1, colorscale="RdBu", texttemplate="%{z:.2f}"))
+    return _dark(fig, height=420, margin=dict(l=0, r=0, t=10, b=0))
+
+def skill_radar_figure(categories: list, values: list) -> go.Figure:
+    fig = go.Figure(go.Scatterpolar(
+        r=values + [values[0]],
+        theta=categories + [categories[0]],
+        fill='toself',
+        fillcolor='rgba(50, 215, 226, 0.3)',
+        line_color='#32d7e2'
+    ))
+    return _dark(fig,
+                 polar=dict(radialaxis=dict(visible=True, range=[0, max(values) + 2]), bgcolor='rgba(0,0,0,0)'),
+                 showlegend=False)
+
+def tag_facets_figure(monthly: pd.DataFrame) -> go.Figure:
+    fig = px.bar(monthly, x="Mois", y="Entrées", color="Tag")
+    fig.update_layout(height=300, margin=dict(l=0, r=0, t=10, b=0))
+    return fig
+
+def note_graph_figure(x, y, edges, labels: list, sizes: list) -> go.Figure:
+    edge_x, edge_y = [], []
+    for a, b in edges:
+        edge_x += [x[a], x[b], None]
+        edge_y += [y[a], y[b], None]
+    fig = go.Figure([
+        go.Scatter(x=edge_x, y=edge_y, mode="lines", line=dict(width=0.6, color="rgba(150,150,150,0.5)"),
+                   hoverinfo="skip"),
+        go.Scatter(x=x, y=y, mode="markers+text", hoverinfo="text", text=labels, textposition="top center",
+                   marker=dict(size=sizes, color="#8b5cf6")),
+    ])
+    fig.update_layout(showlegend=False, height=520, margin=dict(l=0, r=0, t=10, b=0),
+                      xaxis=dict(visible=False), yaxis=dict(visible=False))
+    return fig
+
+def xp_bar_figure(xp: pd.DataFrame) -> go.Figure:
+    if "Compétence" in xp.columns:
+        fig = px.bar(xp, x="Jour", y="XP", color="Compétence", color_discrete_sequence=px.colors.qualitative.Set3)
+    else:
+        fig = px.bar(xp, x="Jour", y="XP", color_discrete_sequence=['#32d7e2'])
+    return _dark(fig)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # SIDEBAR NAVIGATION
 # ══════════════════════════════════════════════════════════════════════════════
 
+MENU_PAGES = ["🏠 Dashboard", "💰 Finance", "⚡ Énergie", "🔥 Habitudes", 
+              "🎯 Objectifs", "🧪 Projets", "📔 Journal", "🗒️ Notes", "😴 Sommeil",
+              "⚔️ Quêtes", "📊 Analytics", "👤 Profil", "🤖 Coach IA", "🗄️ Données"]
+
 def render_sidebar():
     """Affiche la sidebar de navigation"""
     with st.sidebar:
@@ -554,10 +3535,7 @@ def render_sidebar():
         st.markdown("---")
         
         # Profil rapide
-        db = get_db()
-        init_profile(db)
-        profile = db.query(UserProfile).first()
-        db.close()
+        profile = load_profile()
         
         col1, col2 = st.columns([1, 2])
         with col1:
@@ -567,26 +3545,25 @@ def render_sidebar():
             st.caption(f"{profile.total_xp} XP")
         
         # Barre de progression vers prochain niveau
-        current_xp = profile.total_xp
-        current_level_xp = xp_for_level(profile.level)
-        next_level_xp = xp_for_level(profile.level + 1)
-        progress = (current_xp - current_level_xp) / (next_level_xp - current_level_xp) if next_level_xp > current_level_xp else 0
-        safe_progress = max(0.0, min(float(progress), 1.0))
-        st.progress(safe_progress)
+        st.progress(level_progress(profile.total_xp, profile.level))
         
         st.markdown("---")
         
         # Menu de navigation
         menu = st.radio(
             "Navigation",
-            ["🏠 Dashboard", "💰 Finance", "⚡ Énergie", "🔥 Habitudes", 
-             "🎯 Objectifs", "🧪 Projets", "📔 Journal", "😴 Sommeil",
-             "⚔️ Quêtes", "📊 Analytics", "👤 Profil", "🤖 Coach IA"],
+            MENU_PAGES,
             label_visibility="collapsed"
         )
         
         st.markdown("---")
         st.caption(f"📅 {datetime.date.today().strftime('%d %B %Y')}")
+        hits, misses = read_cache_stats()
+        st.caption(f"🗄️ Cache : {hits} hits · {misses} miss")
+        action = last_action()
+        if action:
+            st.caption(f"💾 {action.label} : {action.commits} commit(s) · "
+                       f"{action.events} événement(s) · {action.ms:.0f} ms")
         
         return menu
 
@@ -599,29 +3576,24 @@ def page_dashboard():
     st.title("🏠 Cockpit Principal")
     st.caption("Vue d'ensemble de ta vie")
     
-    db = get_db()
-    
-    # Initialisation
-    init_profile(db)
-    init_skills(db)
-    init_achievements(db)
-    generate_daily_quests(db)
+    with UnitOfWork("Quêtes du jour") as uow:
+        generate_daily_quests(uow.db)
     
     # Données
-    profile = db.query(UserProfile).first()
-    investments = db.query(Investment).all()
-    total_finance = sum(i.amount for i in investments)
+    profile = load_profile()
+    portfolio = load_portfolio_totals()
+    total_finance = portfolio.invested
     freedom_pct = min(round(total_finance / 50000 * 100, 1), 100) if total_finance > 0 else 0
     
-    last_energy = db.query(EnergyLog).order_by(EnergyLog.id.desc()).first()
+    last_energy = next(iter(load_energy_logs(1)), None)
     energy_level = last_energy.level if last_energy else 5
     
-    active_projects = db.query(Project).filter(Project.status == "active").count()
+    active_projects = load_active_project_count()
     
-    habits = db.query(Habit).all()
+    habits = load_habits()
     today = datetime.date.today()
-    completed_today = sum(1 for h in habits if db.query(HabitLog).filter(
-        HabitLog.habit_id == h.id, HabitLog.completed_at == today).first())
+    done_ids = load_completed_habit_ids(today)
+    completed_today = sum(1 for h in habits if h.id in done_ids)
     
     # Hero Card - Liberté Financière
     st.markdown("""
@@ -644,7 +3616,7 @@ def page_dashboard():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("💰 Patrimoine", f"{total_finance:,.0f} €", f"{len(investments)} actifs")
+        st.metric("💰 Patrimoine", f"{total_finance:,.0f} €", f"{portfolio.count} actifs")
     
     with col2:
         delta_energy = "Optimal" if energy_level >= 7 else "Modéré" if energy_level >= 4 else "Faible"
@@ -660,7 +3632,7 @@ def page_dashboard():
     
     # Conseils du Coach
     st.subheader("🤖 Conseils du Coach")
-    tips = generate_coach_tips(db)
+    tips = load_coach_tips(today)
     for tip in tips:
         st.info(tip)
     
@@ -668,10 +3640,7 @@ def page_dashboard():
     st.markdown("---")
     st.subheader("⚔️ Quêtes du Jour")
     
-    daily_quests = db.query(Quest).filter(
-        Quest.quest_type == "daily",
-        Quest.created_at >= datetime.datetime.combine(today, datetime.time.min)
-    ).all()
+    daily_quests = load_quests("daily", datetime.datetime.combine(today, datetime.time.min))
     
     if daily_quests:
         for quest in daily_quests:
@@ -687,8 +3656,6 @@ def page_dashboard():
                     st.warning("🔄")
     else:
         st.info("Aucune quête active")
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: FINANCE
@@ -698,10 +3665,12 @@ def page_finance():
     """Page de gestion des finances"""
     st.title("💰 Finance & Patrimoine")
     
-    db = get_db()
-    investments = db.query(Investment).all()
-    total = sum(i.amount for i in investments)
+    investments = load_investments()
+    totals = load_portfolio_totals()
+    history = load_portfolio_history()
+    total = totals.invested
     freedom = min(round(total / 50000 * 100, 1), 100) if total > 0 else 0
+    simple_return = (totals.value - totals.invested) / totals.invested if totals.invested else 0.0
     
     # Métriques
     col1, col2, col3 = st.columns(3)
@@ -710,10 +3679,18 @@ def page_finance():
     with col2:
         st.metric("Liberté Financière", f"{freedom}%")
     with col3:
-        st.metric("Nombre d'Actifs", len(investments))
+        st.metric("Nombre d'Actifs", totals.count)
     
     st.progress(freedom / 100)
     
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Valeur Actuelle", f"{totals.value:,.0f} €", f"{simple_return:+.1%}")
+    with col2:
+        st.metric("Rendement pondéré (TWR)", f"{history.twr:+.1%}")
+    with col3:
+        st.metric("Drawdown Max", f"{history.max_drawdown:.1%}")
+    
     st.markdown("---")
     
     # Formulaire d'ajout
@@ -724,59 +3701,69 @@ def page_finance():
                 name = st.text_input("Nom de l'actif")
                 amount = st.number_input("Montant investi (€)", min_value=0.0, step=100.0)
             with col2:
-                category = st.selectbox("Catégorie", 
-                    ["Crypto", "Stocks", "RealEstate", "Savings", "Royaltiz", "Other"])
+                category = st.selectbox("Catégorie", INVESTMENT_CATEGORIES)
                 current_value = st.number_input("Valeur actuelle (€)", min_value=0.0, step=100.0)
             
             notes = st.text_area("Notes")
             
             if st.form_submit_button("💾 Ajouter", use_container_width=True):
-                db.add(Investment(
-                    name=name, category=category, amount=amount,
-                    current_value=current_value or amount, notes=notes
-                ))
-                db.commit()
+                with UnitOfWork("Investissement ajouté") as uow:
+                    add_investment(uow, name=name, category=category, amount=amount,
+                                   current_value=current_value or amount, notes=notes)
                 st.success("✅ Investissement ajouté !")
                 st.rerun()
     
+    # Nouvelle valorisation
+    if investments:
+        with st.expander("📸 Nouvelle valorisation", expanded=False):
+            with st.form("add_valuation"):
+                names = {i.id: f"{i.name} ({i.category})" for i in investments}
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    investment_id = st.selectbox("Actif", list(names), format_func=names.get)
+                with col2:
+                    value = st.number_input("Valeur (€)", min_value=0.0, step=100.0)
+                with col3:
+                    day = st.date_input("Date", value=datetime.date.today())
+                
+                if st.form_submit_button("📸 Enregistrer", use_container_width=True):
+                    with UnitOfWork("Valorisation") as uow:
+                        record_valuation(uow, investment_id, value, day)
+                    st.rerun()
+    
     # Liste des investissements
     st.subheader("📊 Portefeuille")
     
     if investments:
+        # Valeur dans le temps
+        if len(history.series) > 1:
+            plot("portfolio_history", portfolio_figure, history.series)
+        
         # Répartition par catégorie
-        df = pd.DataFrame([{"Catégorie": i.category, "Montant": i.amount} for i in investments])
+        df = load_portfolio_allocation()
         if not df.empty:
-            fig = px.pie(df, values="Montant", names="Catégorie", 
-                        title="Répartition du patrimoine",
-                        color_discrete_sequence=px.colors.qualitative.Set3)
-            fig.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='white'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            plot("portfolio_allocation", allocation_figure, df)
         
-        # Tableau des actifs
-        for inv in investments:
-            col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-            with col1:
-                st.markdown(f"**{inv.name}**")
-                st.caption(inv.category)
-            with col2:
-                st.metric("Investi", f"{inv.amount:,.0f} €")
-            with col3:
-                gain = inv.current_value - inv.amount if inv.current_value else 0
-                st.metric("Valeur", f"{inv.current_value:,.0f} €", f"{gain:+,.0f} €")
-            with col4:
-                if st.button("🗑️", key=f"del_inv_{inv.id}"):
-                    db.query(Investment).filter(Investment.id == inv.id).delete()
-                    db.commit()
-                    st.rerun()
-            st.markdown("---")
     else:
         st.info("Aucun investissement enregistré")
     
-    db.close()
+    # Grille éditable : ajouts, modifications et suppressions en un seul commit
+    st.caption("✏️ Modifie, ajoute ou supprime des lignes puis enregistre en une fois")
+    frame = grid_frame(investments, INVESTMENT_GRID_COLUMNS)
+    edited = render_grid("investment_grid", frame, {
+        "name": st.column_config.TextColumn("Actif", required=True),
+        "category": st.column_config.SelectboxColumn("Catégorie", options=INVESTMENT_CATEGORIES, default="Other"),
+        "amount": st.column_config.NumberColumn("Investi (€)", min_value=0.0, format="%.0f", default=0.0),
+        "current_value": st.column_config.NumberColumn("Valeur (€)", min_value=0.0, format="%.0f", default=0.0),
+        "yield_pct": st.column_config.NumberColumn("Rendement %", format="%.1f", default=0.0),
+        "notes": st.column_config.TextColumn("Notes"),
+    })
+    if edited is not None:
+        diff = diff_grid(frame, edited, INVESTMENT_GRID_COLUMNS)
+        if diff.inserts or diff.updates or diff.deletes:
+            with UnitOfWork("Portefeuille édité") as uow:
+                apply_investment_grid(uow, diff)
+            st.rerun()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: ENERGIE
@@ -786,8 +3773,7 @@ def page_energy():
     """Page de suivi de l'énergie"""
     st.title("⚡ Énergie & Bien-être")
     
-    db = get_db()
-    logs = db.query(EnergyLog).order_by(EnergyLog.id.desc()).limit(20).all()
+    logs = load_energy_logs(20)
     
     last = logs[0] if logs else None
     current = last.level if last else 5
@@ -838,34 +3824,21 @@ def page_energy():
             notes = st.text_area("Notes")
             
             if st.form_submit_button("💾 Enregistrer", use_container_width=True):
-                db.add(EnergyLog(
-                    level=level, mood=mood.split()[1], activity=activity.split()[1],
-                    sleep_hours=sleep_hours, notes=notes
-                ))
-                award_xp(db, 5, "Log énergie", "Énergie")
-                db.commit()
+                with UnitOfWork("Log énergie") as uow:
+                    log_energy(uow, level=level, mood=mood.split()[1], activity=activity.split()[1],
+                               sleep_hours=sleep_hours, notes=notes)
                 st.success("✅ Énergie enregistrée ! +5 XP")
                 st.rerun()
     
     # Graphique d'évolution
     if logs:
         st.subheader("📈 Évolution")
-        df = pd.DataFrame([{
-            "Date": l.timestamp.strftime("%d/%m"),
-            "Niveau": l.level
-        } for l in reversed(logs[:14])])
+        period = st.radio("Période", list(DATE_RANGES), index=1, horizontal=True, key="energy_range")
+        series = load_energy_series(range_start(period))
+        df = series.traces["level"].rename(columns={"level": "Niveau"})
+        st.caption(f"{len(df)} points affichés sur {series.total} mesures")
         
-        fig = px.line(df, x="Date", y="Niveau", markers=True)
-        fig.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font_color='white',
-            yaxis_range=[0, 10]
-        )
-        fig.update_traces(line_color='#32d7e2', marker_color='#32d7e2')
-        st.plotly_chart(fig, use_container_width=True)
-    
-    db.close()
+        plot("energy_levels", energy_figure, df)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: HABITUDES
@@ -875,16 +3848,14 @@ def page_habits():
     """Page de gestion des habitudes"""
     st.title("🔥 Habitudes")
     
-    db = get_db()
-    habits = db.query(Habit).all()
+    habits = load_habits()
     today = datetime.date.today()
     
     # Stats
-    completed_today = sum(1 for h in habits if db.query(HabitLog).filter(
-        HabitLog.habit_id == h.id, HabitLog.completed_at == today).first())
+    done_ids = load_completed_habit_ids(today)
+    completed_today = sum(1 for h in habits if h.id in done_ids)
     best_streak = max((h.best_streak for h in habits), default=0)
-    potential_xp = sum(h.xp_reward for h in habits if not db.query(HabitLog).filter(
-        HabitLog.habit_id == h.id, HabitLog.completed_at == today).first())
+    potential_xp = sum(h.xp_reward for h in habits if h.id not in done_ids)
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -899,27 +3870,26 @@ def page_habits():
     # Liste des habitudes
     st.subheader("📋 Mes Habitudes")
     
+    heatmap = load_habit_heatmap(today)
+    heat_rates = dict(zip(heatmap.habit_ids, heatmap.rates))
+    
     for habit in habits:
-        log = db.query(HabitLog).filter(
-            HabitLog.habit_id == habit.id, 
-            HabitLog.completed_at == today
-        ).first()
-        is_done = log is not None
+        is_done = habit.id in done_ids
         
         col1, col2, col3, col4 = st.columns([1, 4, 2, 1])
         
         with col1:
-            if st.checkbox("", value=is_done, key=f"habit_{habit.id}"):
-                if not is_done:
-                    # Compléter l'habitude
-                    db.add(HabitLog(habit_id=habit.id, completed_at=today))
-                    habit.streak += 1
-                    if habit.streak > habit.best_streak:
-                        habit.best_streak = habit.streak
-                    award_xp(db, habit.xp_reward, f"Habitude: {habit.name}", habit.skill_target)
-                    db.commit()
-                    check_achievements(db)
-                    st.rerun()
+            checked = st.checkbox("", value=is_done, key=f"habit_{habit.id}")
+            if checked and not is_done:
+                # Compléter l'habitude
+                with UnitOfWork("Habitude complétée") as uow:
+                    complete_habit(uow, habit.id, today)
+                st.rerun()
+            elif not checked and is_done:
+                # Décocher : la complétion et son XP sont annulées
+                with UnitOfWork("Habitude décochée") as uow:
+                    uncomplete_habit(uow, habit.id, today)
+                st.rerun()
         
         with col2:
             status = "✅" if is_done else "⬜"
@@ -928,14 +3898,23 @@ def page_habits():
         
         with col3:
             st.caption(f"Record: {habit.best_streak}j")
+            if habit.id in heat_rates:
+                st.caption(f"📈 365j : {heat_rates[habit.id]:.0%}")
         
         with col4:
             if st.button("🗑️", key=f"del_habit_{habit.id}"):
-                db.query(HabitLog).filter(HabitLog.habit_id == habit.id).delete()
-                db.query(Habit).filter(Habit.id == habit.id).delete()
-                db.commit()
+                with UnitOfWork("Habitude supprimée") as uow:
+                    delete_habit(uow, habit.id)
                 st.rerun()
     
+    # Heatmaps 365 jours
+    if habits:
+        with st.expander("🗓️ Heatmaps (365 jours)"):
+            names = {h.id: h.name for h in habits}
+            rows = [(f"{names[h]} • {rate:.0%}", heatmap.matrix[i])
+                    for i, (h, rate) in enumerate(zip(heatmap.habit_ids, heatmap.rates)) if h in names]
+            plot("habit_heatmaps", heatmap_figure, rows, heatmap.start)
+    
     st.markdown("---")
     
     # Ajouter une habitude
@@ -953,12 +3932,10 @@ def page_habits():
             frequency = st.selectbox("Fréquence", ["daily", "weekly"])
             
             if st.form_submit_button("💾 Créer", use_container_width=True):
-                db.add(Habit(name=name, skill_target=skill_target, xp_reward=xp_reward, frequency=frequency))
-                db.commit()
+                with UnitOfWork("Habitude créée") as uow:
+                    uow.db.add(Habit(name=name, skill_target=skill_target, xp_reward=xp_reward, frequency=frequency))
                 st.success("✅ Habitude créée !")
                 st.rerun()
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: OBJECTIFS
@@ -968,48 +3945,76 @@ def page_goals():
     """Page de gestion des objectifs"""
     st.title("🎯 Objectifs")
     
-    db = get_db()
-    goals = db.query(Goal).all()
+    goals = load_goals()
+    forecasts = load_goal_forecasts()
     
     # Stats
     completed = sum(1 for g in goals if g.current_value >= g.target_value)
+    on_track = sum(1 for f in forecasts.values() if f and f.probability is not None and f.probability >= 0.5)
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Objectifs", len(goals))
     with col2:
         st.metric("Complétés", completed)
+    with col3:
+        st.metric("En bonne voie", on_track)
     
     st.markdown("---")
     
     # Liste des objectifs
     for goal in goals:
-        progress = (goal.current_value / goal.target_value * 100) if goal.target_value > 0 else 0
+        progress = (goal.current_value / goal.target_value * 100) if goal.target_value else 0
         
-        col1, col2 = st.columns([4, 1])
-        with col1:
-            st.markdown(f"**{goal.title}**")
-            st.progress(min(progress / 100, 1.0))
-            st.caption(f"{goal.current_value:,.0f} / {goal.target_value:,.0f} {goal.unit} ({progress:.0f}%)")
-            if goal.deadline:
-                days_left = (goal.deadline - datetime.date.today()).days
-                st.caption(f"📅 {days_left} jours restants")
+        st.markdown(f"**{goal.title}**")
+        st.progress(min(max(progress, 0) / 100, 1.0))
+        st.caption(f"{goal.current_value:,.0f} / {goal.target_value:,.0f} {goal.unit} ({progress:.0f}%)")
+        if goal.deadline:
+            days_left = (goal.deadline - datetime.date.today()).days
+            st.caption(f"📅 {days_left} jours restants")
         
-        with col2:
-            new_val = st.number_input("Valeur", value=float(goal.current_value), 
-                                       key=f"goal_val_{goal.id}", label_visibility="collapsed")
-            if new_val != goal.current_value:
-                goal.current_value = new_val
-                db.commit()
-                st.rerun()
-            
-            if st.button("🗑️", key=f"del_goal_{goal.id}"):
-                db.query(Goal).filter(Goal.id == goal.id).delete()
-                db.commit()
-                st.rerun()
+        forecast = forecasts.get(goal.id)
+        if forecast and forecast.eta:
+            chance = f" · {forecast.probability:.0%} de chances d'y être à la deadline" \
+                if forecast.probability is not None else ""
+            st.caption(f"📈 Atteinte estimée le {forecast.eta.strftime('%d/%m/%Y')}{chance}")
+        elif forecast and (forecast.slope > 0 or forecast.probability is not None):
+            status = "Hors d'atteinte au rythme actuel" if forecast.slope > 0 else "Tendance insuffisante"
+            chance = f" · {forecast.probability:.0%} de chances d'y être à la deadline" \
+                if forecast.probability is not None else ""
+            st.caption(f"📉 {status}{chance}")
         
         st.markdown("---")
     
+    # Historique d'un objectif
+    if goals:
+        with st.expander("📈 Historique de progression"):
+            titles = {g.id: g.title for g in goals}
+            goal_id = st.selectbox("Objectif", list(titles), format_func=titles.get, key="goal_history")
+            history = load_goal_history(goal_id)
+            if len(history) > 1:
+                st.line_chart(history, x="Date", y="Valeur")
+            else:
+                st.caption("Un seul point pour l'instant : la tendance apparaîtra avec les mises à jour")
+    
+    # Grille éditable : valeurs, ajouts et suppressions en un seul commit
+    st.caption("✏️ Mets à jour tes objectifs dans la grille puis enregistre en une fois")
+    frame = grid_frame(goals, GOAL_GRID_COLUMNS)
+    edited = render_grid("goal_grid", frame, {
+        "title": st.column_config.TextColumn("Objectif", required=True),
+        "target_value": st.column_config.NumberColumn("Cible", min_value=0.0, format="%.0f", default=0.0),
+        "current_value": st.column_config.NumberColumn("Actuel", format="%.0f", default=0.0),
+        "unit": st.column_config.TextColumn("Unité", default="€"),
+        "deadline": st.column_config.DateColumn("Deadline", format="DD/MM/YYYY"),
+        "category": st.column_config.SelectboxColumn("Catégorie", options=GOAL_CATEGORIES, default="finance"),
+    })
+    if edited is not None:
+        diff = diff_grid(frame, edited, GOAL_GRID_COLUMNS)
+        if diff.inserts or diff.updates or diff.deletes:
+            with UnitOfWork("Objectifs édités") as uow:
+                apply_goal_grid(uow, diff)
+            st.rerun()
+    
     # Ajouter un objectif
     with st.expander("➕ Nouvel Objectif"):
         with st.form("add_goal"):
@@ -1023,16 +4028,14 @@ def page_goals():
                 unit = st.text_input("Unité", "€")
                 deadline = st.date_input("Deadline")
             
-            category = st.selectbox("Catégorie", ["finance", "health", "career", "personal"])
+            category = st.selectbox("Catégorie", GOAL_CATEGORIES)
             
             if st.form_submit_button("💾 Créer", use_container_width=True):
-                db.add(Goal(title=title, target_value=target_value, current_value=current_value,
-                           unit=unit, deadline=deadline, category=category))
-                db.commit()
+                with UnitOfWork("Objectif créé") as uow:
+                    add_goal(uow, title=title, target_value=target_value, current_value=current_value,
+                             unit=unit, deadline=deadline, category=category)
                 st.success("✅ Objectif créé !")
                 st.rerun()
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: PROJETS
@@ -1042,8 +4045,7 @@ def page_projects():
     """Page de gestion des projets"""
     st.title("🧪 Lab Projets")
     
-    db = get_db()
-    projects = db.query(Project).order_by(Project.priority.desc()).all()
+    projects = load_projects()
     
     # Stats par statut
     by_status = {"idea": 0, "planning": 0, "active": 0, "paused": 0, "completed": 0}
@@ -1083,16 +4085,13 @@ def page_projects():
                         label_visibility="collapsed"
                     )
                     if new_status != project.status:
-                        project.status = new_status
-                        if new_status == "completed":
-                            project.completed_at = datetime.datetime.utcnow()
-                            award_xp(db, 50, f"Projet: {project.title}", "Business")
-                        db.commit()
+                        with UnitOfWork("Statut projet") as uow:
+                            set_project_status(uow, project.id, new_status)
                         st.rerun()
                 with col3:
                     if st.button("🗑️", key=f"del_proj_{project.id}"):
-                        db.query(Project).filter(Project.id == project.id).delete()
-                        db.commit()
+                        with UnitOfWork("Projet supprimé") as uow:
+                            uow.db.query(Project).filter(Project.id == project.id).delete()
                         st.rerun()
                 st.markdown("---")
     
@@ -1111,13 +4110,11 @@ def page_projects():
                 deadline = st.date_input("Deadline (optionnel)")
             
             if st.form_submit_button("💾 Créer", use_container_width=True):
-                db.add(Project(title=title, description=description, status=status,
-                              priority=priority, category=category, deadline=deadline))
-                db.commit()
+                with UnitOfWork("Projet créé") as uow:
+                    uow.db.add(Project(title=title, description=description, status=status,
+                                       priority=priority, category=category, deadline=deadline))
                 st.success("✅ Projet créé !")
                 st.rerun()
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: JOURNAL
@@ -1127,9 +4124,7 @@ def page_journal():
     """Page du journal"""
     st.title("📔 Journal de Pensées")
     
-    db = get_db()
-    entries = db.query(JournalEntry).order_by(JournalEntry.id.desc()).limit(20).all()
-    total = db.query(JournalEntry).count()
+    total = load_journal_count()
     
     col1, col2 = st.columns(2)
     with col1:
@@ -1152,16 +4147,55 @@ def page_journal():
                 tags = st.text_input("Tags (séparés par virgule)")
             
             if st.form_submit_button("💾 Enregistrer (+5 XP)", use_container_width=True):
-                db.add(JournalEntry(content=content, mood=mood.split()[0], tags=tags))
-                award_xp(db, 5, "Entrée journal", "Intelligence")
-                db.commit()
-                check_achievements(db)
+                with UnitOfWork("Entrée journal") as uow:
+                    write_journal_entry(uow, content=content, mood=mood.split()[0], tags=tags)
+                st.session_state.journal_cursors = [None]
                 st.success("✅ Pensée capturée ! +5 XP")
                 st.rerun()
     
-    # Entrées récentes
+    # Recherche
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        query = st.text_input("🔍 Rechercher", placeholder="mots, début de mot…", key="journal_search")
+    with col2:
+        kinds = st.multiselect("Dans", list(SEARCH_SOURCES), default=list(SEARCH_SOURCES),
+                               format_func=lambda k: f"{SEARCH_ICONS[k]} {k}")
+    
+    if query.strip():
+        started = time.perf_counter()
+        results = load_search_results(query, tuple(kinds))
+        st.caption(f"{len(results)} résultat(s) en {(time.perf_counter() - started) * 1000:.1f} ms")
+        for r in results:
+            header = r.title or (r.created_at.strftime('%d/%m/%Y %H:%M') if r.created_at else "")
+            st.markdown(f"{SEARCH_ICONS[r.kind]} **{header}**")
+            if r.snippet:
+                st.markdown(r.snippet)
+            if r.tags:
+                st.caption(f"🏷️ {r.tags}")
+            st.markdown("---")
+        return
+    
+    # Entrées récentes, filtrées par tags et paginées par curseur
     st.subheader("📝 Entrées Récentes")
     
+    facets = load_tag_facets("journal")
+    per_tag = facets.groupby("Tag")["Entrées"].sum().sort_values(ascending=False)
+    selected_tags = st.multiselect("🏷️ Filtrer par tags", list(per_tag.index),
+                                   format_func=lambda t: f"{t} ({per_tag[t]})")
+    
+    if not facets.empty:
+        with st.expander("📊 Tags par mois"):
+            top = list(selected_tags or per_tag.index[:8])
+            monthly = facets[facets["Tag"].isin(top)]
+            plot("journal_tag_facets", tag_facets_figure, monthly)
+    
+    tags_filter = tuple(sorted(selected_tags))
+    if st.session_state.get("journal_filter") != tags_filter:
+        st.session_state.journal_filter = tags_filter
+        st.session_state.journal_cursors = [None]
+    cursors = st.session_state.setdefault("journal_cursors", [None])
+    entries, next_cursor = load_journal_page(cursors[-1], tags=tags_filter)
+    
     for entry in entries:
         with st.container():
             col1, col2 = st.columns([4, 1])
@@ -1172,12 +4206,93 @@ def page_journal():
                     st.caption(f"🏷️ {entry.tags}")
             with col2:
                 if st.button("🗑️", key=f"del_journal_{entry.id}"):
-                    db.query(JournalEntry).filter(JournalEntry.id == entry.id).delete()
-                    db.commit()
+                    with UnitOfWork("Entrée supprimée") as uow:
+                        delete_journal_entry(uow, entry.id)
                     st.rerun()
             st.markdown("---")
     
-    db.close()
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        if st.button("⬅️ Plus récentes", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if st.button("Plus anciennes ➡️", disabled=next_cursor is None, use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PAGE: NOTES
+# ══════════════════════════════════════════════════════════════════════════════
+
+def page_notes():
+    """Page des notes liées ([[wiki-liens]])"""
+    st.title("🗒️ Notes & Liens")
+    
+    titles = load_note_index()
+    if "note_pending" in st.session_state:
+        st.session_state.note_selected = st.session_state.pop("note_pending")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected = st.selectbox("Note", [None] + list(titles),
+                                format_func=lambda n: "➕ Nouvelle note" if n is None else titles[n],
+                                key="note_selected")
+    with col2:
+        st.metric("Notes", len(titles))
+    
+    note = load_note(selected) if selected else None
+    
+    with st.form("note_editor"):
+        title = st.text_input("Titre", value=note.title if note else "")
+        content = st.text_area("Contenu (liens : [[Titre d'une note]])", value=note.content if note else "", height=220)
+        col1, col2 = st.columns(2)
+        with col1:
+            note_type = st.selectbox("Type", NOTE_TYPES, index=NOTE_TYPES.index(note.note_type)
+                                     if note and note.note_type in NOTE_TYPES else 0)
+        with col2:
+            tags = st.text_input("Tags", value=note.tags if note else "")
+        
+        if st.form_submit_button("💾 Enregistrer", use_container_width=True) and title.strip():
+            with UnitOfWork("Note enregistrée") as uow:
+                saved = save_note(uow, selected, title=title.strip(), content=content,
+                                  note_type=note_type, tags=tags)
+                saved_id = saved.id
+            st.session_state.note_pending = saved_id
+            st.rerun()
+    
+    if not note:
+        st.caption("Sélectionne une note pour voir ses liens et son voisinage")
+        graph = load_note_graph()
+    else:
+        links = load_note_links(note.id)
+        col1, col2, col3 = st.columns(3)
+        for col, label, ids in ((col1, "➡️ Liens", links.outgoing), (col2, "⬅️ Backlinks", links.backlinks),
+                                (col3, "🔭 À 2 sauts", links.second_hop)):
+            with col:
+                st.markdown(f"**{label}** ({len(ids)})")
+                for n in sorted(ids, key=lambda n: titles.get(n, ""))[:30]:
+                    st.caption(titles.get(n, f"#{n}"))
+        
+        if st.button("🗑️ Supprimer la note"):
+            with UnitOfWork("Note supprimée") as uow:
+                delete_note(uow, note.id)
+            st.session_state.note_pending = None
+            st.rerun()
+        graph = load_note_graph(note.id)
+    
+    st.markdown("---")
+    st.subheader("🕸️ Graphe")
+    if not graph.nodes:
+        st.info("Aucun lien pour l'instant : écris [[Titre]] dans une note pour relier tes idées")
+        return
+    
+    plot("note_graph", note_graph_figure, graph.x, graph.y, graph.edges,
+         [titles.get(n, f"#{n}") for n in graph.nodes],
+         [16 if note and n == note.id else 9 for n in graph.nodes])
+    st.caption(f"{len(graph.nodes)} notes · {len(graph.edges)} liens affichés")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: SOMMEIL
@@ -1187,16 +4302,16 @@ def page_sleep():
     """Page de suivi du sommeil"""
     st.title("😴 Sommeil & Biorythme")
     
-    db = get_db()
-    logs = db.query(SleepLog).order_by(SleepLog.date.desc()).limit(14).all()
-    
-    # Stats
-    avg_duration = round(sum(l.duration for l in logs) / len(logs), 1) if logs else 0
-    avg_quality = round(sum(l.quality for l in logs) / len(logs), 1) if logs else 0
+    profile = load_profile()
+    goal = (profile.sleep_goal if profile else None) or 8.0
+    analytics = load_sleep_analytics(goal, datetime.date.today())
     
-    profile = db.query(UserProfile).first()
-    goal = profile.sleep_goal if profile else 8.0
-    debt = sum(max(0, goal - log.duration) for log in logs[:7]) if logs else 0
+    # Stats (fenêtre de 7 jours)
+    week = analytics.windows.iloc[0] if analytics.nights else None
+    has_week = week is not None and week["Nuits"] > 0
+    avg_duration = float(week["Durée moy. (h)"]) if has_week else 0
+    avg_quality = float(week["Qualité moy."]) if has_week and not pd.isna(week["Qualité moy."]) else 0
+    debt = float(week["Dette (h)"]) if has_week else 0
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -1206,6 +4321,19 @@ def page_sleep():
     with col3:
         st.metric("Dette de Sommeil", f"{debt:.1f}h", "Élevée" if debt > 5 else "OK")
     
+    # Rythme : heures moyennes (circulaires), régularité et chronotype
+    if analytics.bedtime is not None:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Coucher moyen", format_minutes(analytics.bedtime),
+                      f"± {analytics.bedtime_spread:.0f} min", delta_color="off")
+        with col2:
+            st.metric("Lever moyen", format_minutes(analytics.wake) if analytics.wake is not None else "—")
+        with col3:
+            st.metric("Chronotype", analytics.chronotype or "À déterminer")
+        if not analytics.chronotype:
+            st.caption(f"Le chronotype apparaît après {CHRONOTYPE_MIN_NIGHTS} nuits enregistrées")
+    
     # Conseils
     st.markdown("---")
     st.subheader("💡 Conseils")
@@ -1215,9 +4343,20 @@ def page_sleep():
         st.info("💡 Qualité basse. Évite les écrans 1h avant le coucher.")
     if avg_duration < 7:
         st.info("😴 Tu dors moins de 7h. Vise 7-9h par nuit.")
+    if analytics.bedtime_spread is not None and analytics.bedtime_spread > 60:
+        st.info("⏰ Heure de coucher irrégulière. Un horaire fixe stabilise ton rythme.")
     if debt <= 5 and avg_quality >= 6 and avg_duration >= 7:
         st.success("✨ Bon rythme de sommeil ! Continue ainsi.")
     
+    # Fenêtres glissantes
+    if analytics.nights:
+        st.markdown("---")
+        st.subheader("🧮 Tendances")
+        st.dataframe(analytics.windows, use_container_width=True, hide_index=True)
+        rolling = analytics.rolling
+        step = max(1, math.ceil(len(rolling) / CHART_POINT_BUDGET))
+        plot("sleep_rolling", sleep_rolling_figure, rolling.iloc[::-1].iloc[::step].iloc[::-1])
+    
     st.markdown("---")
     
     # Logger une nuit
@@ -1242,41 +4381,22 @@ def page_sleep():
                     wake_min += 24 * 60
                 duration = round((wake_min - bed_min) / 60, 1)
                 
-                db.add(SleepLog(
-                    date=date, bedtime=bedtime.strftime("%H:%M"),
-                    waketime=waketime.strftime("%H:%M"),
-                    duration=duration, quality=quality, notes=notes
-                ))
-                award_xp(db, 10, "Log sommeil", "Santé")
-                db.commit()
+                with UnitOfWork("Log sommeil") as uow:
+                    log_sleep(uow, date=date, bedtime=bedtime.strftime("%H:%M"),
+                              waketime=waketime.strftime("%H:%M"),
+                              duration=duration, quality=quality, notes=notes)
                 st.success("✅ Nuit enregistrée ! +10 XP")
                 st.rerun()
     
     # Graphique
-    if logs:
+    if analytics.nights:
         st.subheader("📊 Historique")
-        df = pd.DataFrame([{
-            "Date": l.date.strftime("%d/%m"),
-            "Durée": l.duration,
-            "Qualité": l.quality
-        } for l in reversed(logs)])
-        
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=df["Date"], y=df["Durée"], name="Durée (h)", marker_color='#32d7e2'))
-        fig.add_trace(go.Scatter(x=df["Date"], y=df["Qualité"], name="Qualité", 
-                                  mode='lines+markers', yaxis='y2', marker_color='#bf5af2'))
+        period = st.radio("Période", list(DATE_RANGES), index=1, horizontal=True, key="sleep_range")
+        series = load_sleep_series(range_start(period))
+        duration, quality = series.traces["duration"], series.traces["quality"]
+        st.caption(f"{len(duration)} points affichés sur {series.total} nuits")
         
-        fig.update_layout(
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font_color='white',
-            yaxis=dict(title="Durée (h)", range=[0, 12]),
-            yaxis2=dict(title="Qualité", overlaying='y', side='right', range=[0, 10]),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02)
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    
-    db.close()
+        plot("sleep_history", sleep_figure, duration, quality)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: QUÊTES
@@ -1286,14 +4406,14 @@ def page_quests():
     """Page des quêtes"""
     st.title("⚔️ Quêtes & Missions")
     
-    db = get_db()
-    generate_daily_quests(db)
-    generate_weekly_quest(db)
+    with UnitOfWork("Génération des quêtes") as uow:
+        generate_daily_quests(uow.db)
+        generate_weekly_quest(uow.db)
     
     today = datetime.date.today()
     
     # Boss de la semaine
-    boss = db.query(Quest).filter(Quest.quest_type == "boss", Quest.completed == 0).first()
+    boss = load_active_boss()
     
     if boss:
         st.markdown("### 🐉 Boss de la Semaine")
@@ -1311,10 +4431,7 @@ def page_quests():
     # Quêtes du jour
     st.markdown("### 📋 Quêtes du Jour")
     
-    daily = db.query(Quest).filter(
-        Quest.quest_type == "daily",
-        Quest.created_at >= datetime.datetime.combine(today, datetime.time.min)
-    ).all()
+    daily = load_quests("daily", datetime.datetime.combine(today, datetime.time.min))
     
     for quest in daily:
         col1, col2, col3 = st.columns([3, 1, 1])
@@ -1325,19 +4442,18 @@ def page_quests():
         with col2:
             st.caption(f"+{quest.xp_reward} XP")
         with col3:
-            if not quest.completed:
+            if quest.trigger_event:
+                st.caption(f"{min(quest.current_value or 0, quest.target_value)}/{quest.target_value}")
+            elif not quest.completed:
                 if st.button("Compléter", key=f"quest_{quest.id}"):
-                    quest.completed = 1
-                    award_xp(db, quest.xp_reward, f"Quête: {quest.title}", quest.skill_target)
-                    db.commit()
+                    with UnitOfWork("Quête complétée") as uow:
+                        complete_quest(uow, quest.id)
                     st.rerun()
     
     # Stats
     st.markdown("---")
-    completed_total = db.query(Quest).filter(Quest.completed == 1).count()
+    completed_total = load_completed_quest_count()
     st.metric("Total Quêtes Complétées", completed_total)
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: ANALYTICS
@@ -1347,56 +4463,29 @@ def page_analytics():
     """Page des analytics"""
     st.title("📊 Analytics Personnel")
     
-    db = get_db()
-    init_skills(db)
-    
     # Stats globales
-    active_days = db.query(HabitLog).distinct(HabitLog.completed_at).count()
-    total_habits = db.query(HabitLog).count()
-    profile = db.query(UserProfile).first()
+    stats = load_analytics_stats()
+    profile = load_profile()
     total_xp = profile.total_xp if profile else 0
-    achievements_unlocked = db.query(Achievement).filter(Achievement.unlocked == 1).count()
-    total_achievements = db.query(Achievement).count()
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Jours Actifs", active_days)
+        st.metric("Jours Actifs", stats.active_days)
     with col2:
-        st.metric("Habitudes Faites", total_habits)
+        st.metric("Habitudes Faites", stats.total_habits)
     with col3:
         st.metric("XP Total", f"{total_xp:,}")
     with col4:
-        st.metric("Achievements", f"{achievements_unlocked}/{total_achievements}")
+        st.metric("Achievements", f"{stats.achievements_unlocked}/{stats.total_achievements}")
     
     st.markdown("---")
     
     # Radar des compétences
     st.subheader("🎯 Radar des Compétences")
     
-    skills = db.query(Skill).all()
+    skills = load_skills()
     if skills:
-        categories = [s.name for s in skills]
-        values = [s.level for s in skills]
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatterpolar(
-            r=values + [values[0]],
-            theta=categories + [categories[0]],
-            fill='toself',
-            fillcolor='rgba(50, 215, 226, 0.3)',
-            line_color='#32d7e2'
-        ))
-        
-        fig.update_layout(
-            polar=dict(
-                radialaxis=dict(visible=True, range=[0, max(values) + 2]),
-                bgcolor='rgba(0,0,0,0)'
-            ),
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_color='white',
-            showlegend=False
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        plot("skill_radar", skill_radar_figure, [s.name for s in skills], [s.level for s in skills])
         
         # Détail des skills
         cols = st.columns(4)
@@ -1408,30 +4497,37 @@ def page_analytics():
     
     st.markdown("---")
     
+    today = datetime.date.today()
+    
+    # Heatmap combinée : part des habitudes faites chaque jour
+    heatmap = load_habit_heatmap(today)
+    if heatmap.habit_ids:
+        st.subheader("🗓️ Régularité (365 jours)")
+        combined = heatmap.matrix.mean(axis=0)
+        plot("habit_heatmap_combined", heatmap_figure,
+             [(f"Toutes les habitudes • {combined.mean():.0%}", combined)], heatmap.start)
+        st.markdown("---")
+    
     # XP des 7 derniers jours
     st.subheader("📈 XP des 7 Derniers Jours")
     
+    week_xp = load_xp_per_day(today - datetime.timedelta(days=6), today)
     xp_data = []
-    today = datetime.date.today()
     for i in range(6, -1, -1):
         day = today - datetime.timedelta(days=i)
-        day_start = datetime.datetime.combine(day, datetime.time.min)
-        day_end = datetime.datetime.combine(day, datetime.time.max)
-        day_xp = sum(log.amount for log in db.query(XPLog).filter(
-            XPLog.created_at >= day_start, XPLog.created_at <= day_end
-        ).all())
-        xp_data.append({"Jour": day.strftime("%a"), "XP": day_xp})
-    
-    df = pd.DataFrame(xp_data)
-    fig = px.bar(df, x="Jour", y="XP", color_discrete_sequence=['#32d7e2'])
-    fig.update_layout(
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font_color='white'
-    )
-    st.plotly_chart(fig, use_container_width=True)
+        xp_data.append({"Jour": day.strftime("%a"), "XP": week_xp.get(day, 0)})
+    
+    plot("xp_week", xp_bar_figure, pd.DataFrame(xp_data))
+    
+    # XP par compétence sur 30 jours
+    st.subheader("🧬 XP par Compétence (30 jours)")
     
-    db.close()
+    df_skills = load_xp_per_skill_day(today - datetime.timedelta(days=29), today)
+    df_skills = df_skills[df_skills["Compétence"] != ""]
+    if not df_skills.empty:
+        plot("xp_per_skill", xp_bar_figure, df_skills)
+    else:
+        st.info("Pas encore d'XP par compétence sur la période")
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: PROFIL
@@ -1441,16 +4537,10 @@ def page_profile():
     """Page du profil"""
     st.title("👤 Profil Cognitif")
     
-    db = get_db()
-    init_profile(db)
-    init_skills(db)
-    init_achievements(db)
-    check_achievements(db)
-    
-    profile = db.query(UserProfile).first()
-    skills = db.query(Skill).all()
-    achievements = db.query(Achievement).all()
-    xp_logs = db.query(XPLog).order_by(XPLog.id.desc()).limit(10).all()
+    profile = load_profile()
+    skills = load_skills()
+    achievements = load_achievements()
+    xp_logs = load_recent_xp_logs(10)
     
     # Header profil
     col1, col2 = st.columns([1, 3])
@@ -1469,13 +4559,9 @@ def page_profile():
         st.caption(f"🎮 Classe: {profile.character_class}")
         
         # Barre XP
-        current_xp = profile.total_xp
-        current_level_xp = xp_for_level(profile.level)
         next_level_xp = xp_for_level(profile.level + 1)
-        progress = (current_xp - current_level_xp) / (next_level_xp - current_level_xp) if next_level_xp > current_level_xp else 0
-        
-        st.progress(min(progress, 1.0))
-        st.caption(f"{current_xp} / {next_level_xp} XP → Niveau {profile.level + 1}")
+        st.progress(level_progress(profile.total_xp, profile.level))
+        st.caption(f"{profile.total_xp} / {next_level_xp} XP → Niveau {profile.level + 1}")
     
     st.markdown("---")
     
@@ -1510,8 +4596,6 @@ def page_profile():
             st.caption(f"{log.skill_name or 'Global'} • {log.created_at.strftime('%d/%m %H:%M')}")
         with col2:
             st.markdown(f"**+{log.amount} XP**")
-    
-    db.close()
 
 # ══════════════════════════════════════════════════════════════════════════════
 # PAGE: COACH IA
@@ -1522,111 +4606,460 @@ def page_coach():
     st.title("🤖 Coach IA Personnel")
     st.caption("Conseils intelligents basés sur tes données")
     
-    db = get_db()
-    
-    # Data points
-    data_points = (
-        db.query(HabitLog).count() +
-        db.query(EnergyLog).count() +
-        db.query(SleepLog).count() +
-        db.query(JournalEntry).count()
-    )
+    today = datetime.date.today()
+    activity = load_coach_activity(today)
     
-    st.info(f"📊 Analyse basée sur {data_points} points de données")
+    st.info(f"📊 Analyse basée sur {activity.data_points} points de données")
     
     st.markdown("---")
     
     # Conseils
     st.subheader("💡 Conseils Personnalisés")
-    tips = generate_coach_tips(db)
+    tips = load_coach_tips(today)
     for tip in tips:
         st.markdown(f"> {tip}")
     
     st.markdown("---")
     
+    # Corrélations (calculées en fond)
+    st.subheader("🔬 Ce que disent tes données")
+    status = request_insights(today, wait=INSIGHT_WAIT_S)
+    insights = status.result
+    if insights is None:
+        st.info("⏳ Analyse de ton historique en cours...")
+        st.button("🔄 Actualiser", key="insights_refresh")
+    else:
+        for finding in insights.findings:
+            st.markdown(f"- {finding}")
+        if not insights.findings:
+            st.caption(f"Pas encore de lien net dans tes données (au moins {INSIGHT_MIN_DAYS} jours communs requis)")
+        refresh = " · mise à jour en cours" if status.computing else ""
+        st.caption(f"{insights.days} jours analysés · {insights.tests} tests · "
+                   f"calculé à {insights.computed_at.strftime('%H:%M')} en {insights.seconds:.2f} s{refresh}")
+        if not insights.matrix.empty:
+            with st.expander("🧮 Matrice de corrélation et décalages"):
+                plot("insight_matrix", correlation_figure, insights.matrix)
+                if not insights.lagged.empty:
+                    st.dataframe(insights.lagged[["driver", "lag", "target", "r", "n", "gap"]].round(3),
+                                 use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    
     # Prédiction
     st.subheader("📈 Prédiction de Progression")
     
-    profile = db.query(UserProfile).first()
-    xp_logs_week = db.query(XPLog).filter(
-        XPLog.created_at >= datetime.datetime.now() - datetime.timedelta(days=7)
-    ).all()
-    
-    avg_xp_day = sum(l.amount for l in xp_logs_week) / 7 if xp_logs_week else 10
+    profile = load_profile()
     current_level = profile.level if profile else 1
     current_xp = profile.total_xp if profile else 0
-    next_level_xp = xp_for_level(current_level + 1)
-    xp_needed = next_level_xp - current_xp
-    days_to_level = max(1, int(xp_needed / avg_xp_day)) if avg_xp_day > 0 else 30
+    days_to_level = load_level_forecast(current_xp, current_level, today)
     
-    st.metric("Prochain Niveau", current_level + 1, f"dans ~{days_to_level} jours")
-    st.progress(min(current_xp / next_level_xp, 1.0))
+    eta = f"dans ~{days_to_level} jours" if days_to_level else "rythme encore inconnu"
+    st.metric("Prochain Niveau", current_level + 1, eta)
+    st.progress(level_progress(current_xp, current_level))
     
     st.markdown("---")
     
     # Actions recommandées
     st.subheader("🎯 Actions Recommandées")
     
-    today = datetime.date.today()
-    
     # Journal
-    journal_today = db.query(JournalEntry).filter(
-        JournalEntry.created_at >= datetime.datetime.combine(today, datetime.time.min)
-    ).count()
-    if journal_today == 0:
+    if activity.journal_today == 0:
         st.markdown("- 📝 Écrire dans ton journal (+5 XP)")
     
     # Énergie
-    energy_today = db.query(EnergyLog).filter(
-        EnergyLog.timestamp >= datetime.datetime.combine(today, datetime.time.min)
-    ).count()
-    if energy_today == 0:
+    if activity.energy_today == 0:
         st.markdown("- ⚡ Logger ton niveau d'énergie (+5 XP)")
     
     # Habitudes
-    habits = db.query(Habit).all()
+    habits = load_habits()
+    done_ids = load_completed_habit_ids(today)
     for h in habits[:3]:
-        log = db.query(HabitLog).filter(HabitLog.habit_id == h.id, HabitLog.completed_at == today).first()
-        if not log:
+        if h.id not in done_ids:
             st.markdown(f"- ✅ Compléter: {h.name} (+{h.xp_reward} XP)")
+
+# ══════════════════════════════════════════════════════════════════════════════
+# PAGE: DONNÉES
+# ══════════════════════════════════════════════════════════════════════════════
+
+def page_data():
+    """Page d'import / export en masse"""
+    st.title("🗄️ Import & Export")
+    st.caption("Migre ton historique depuis d'autres trackers (CSV ou NDJSON)")
+    
+    tables = list(IMPORT_SPECS)
+    
+    # Import
+    st.subheader("📥 Import")
+    with st.form("bulk_import"):
+        table_name = st.selectbox("Table", tables, key="import_table")
+        uploaded = st.file_uploader("Fichier", type=["csv", "ndjson", "jsonl"])
+        spec = IMPORT_SPECS[table_name]
+        st.caption("Colonnes : " + ", ".join(spec["columns"]) +
+                   f" • Dédoublonnage sur : {', '.join(spec['key'])}")
+        
+        if st.form_submit_button("📥 Importer", use_container_width=True) and uploaded:
+            fmt = "csv" if uploaded.name.lower().endswith(".csv") else "ndjson"
+            with st.spinner("Import en cours..."):
+                report = import_file(table_name, uploaded, fmt)
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Lignes lues", f"{report.read:,}")
+            col2.metric("Insérées", f"{report.inserted:,}")
+            col3.metric("Doublons", f"{report.duplicates:,}")
+            col4.metric("Débit", f"{report.rows_per_s:,.0f} lignes/s", f"{report.seconds:.2f} s")
+            if report.invalid:
+                st.warning(f"⚠️ {report.invalid} ligne(s) invalide(s) ignorée(s)")
+                for error in report.errors:
+                    st.caption(error)
+    
+    st.markdown("---")
+    
+    # Export
+    st.subheader("📤 Export")
+    col1, col2 = st.columns(2)
+    with col1:
+        export_name = st.selectbox("Table", tables, key="export_table")
+    with col2:
+        fmt = st.radio("Format", ["csv", "ndjson"], horizontal=True)
+    
+    if st.button("📤 Préparer l'export", use_container_width=True):
+        path = os.path.join(tempfile.gettempdir(), f"aura_{export_name}.{fmt}")
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            count = export_table(export_name, out, fmt)
+        st.success(f"✅ {count:,} lignes exportées")
+        with open(path, "rb") as exported:
+            st.download_button("💾 Télécharger", exported, file_name=os.path.basename(path),
+                               use_container_width=True)
+
+# ══════════════════════════════════════════════════════════════════════════════
+# BENCHMARK
+# ══════════════════════════════════════════════════════════════════════════════
+# Jeu de données synthétique déterministe (graine + date de fin) et rendu
+# headless des pages via AppTest : temps à froid / à chaud, nombre de requêtes
+# SQL et pic mémoire, écrits en JSON et comparables d'un run à l'autre.
+
+BENCH_PAGES = ["🏠 Dashboard", "🔥 Habitudes", "📊 Analytics", "🤖 Coach IA"]
+
+_BENCH_HABITS = [
+    ("Lire", "📚", "Intelligence"), ("Sport", "🏃", "Santé"), ("Méditer", "🧘", "Discipline"),
+    ("Écrire", "✍️", "Créativité"), ("Deep work", "🎯", "Focus"), ("Appeler un ami", "👥", "Social"),
+    ("Prospection", "💼", "Business"), ("Marche", "🚶", "Énergie"),
+]
+_BENCH_MOODS = ["😊 Bien", "😐 Neutre", "😔 Fatigué", "🔥 Motivé", "😤 Stressé"]
+_BENCH_ACTIVITIES = ["Travail", "Sport", "Repos", "Social", "Créatif"]
+
+def generate_dataset(bind, habits: int = 10, years: float = 2, seed: int = 42,
+                     end: Optional[datetime.date] = None) -> dict:
+    """Remplit la base de N habitudes et M années de logs (habitudes, énergie, sommeil, journal, XP)"""
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    days = [end - datetime.timedelta(days=i) for i in range(int(365 * years) - 1, -1, -1)]
+    start_at = datetime.datetime.combine(days[0], datetime.time())
+    
+    habit_rows, habit_logs, energy, sleep, journal, xp = [], [], [], [], [], []
+    for n in range(habits):
+        name, icon, skill = _BENCH_HABITS[n % len(_BENCH_HABITS)]
+        rate = rng.uniform(0.4, 0.9)
+        for day in days:
+            if rng.random() < rate:
+                habit_logs.append({"habit_id": n + 1, "completed_at": day})
+                xp.append({"amount": 10, "source": f"Habit: {name}", "skill_name": skill,
+                           "created_at": datetime.datetime.combine(day, datetime.time(7 + n % 12))})
+        habit_rows.append({"id": n + 1, "name": name if n < len(_BENCH_HABITS) else f"{name} {n + 1}",
+                           "icon": icon, "color": "emerald", "frequency": "daily", "streak": 0,
+                           "best_streak": 0, "skill_target": skill, "xp_reward": 10,
+                           "created_at": start_at})
+    
+    for day in days:
+        for hour in rng.sample(range(7, 23), rng.randint(1, 3)):
+            at = datetime.datetime.combine(day, datetime.time(hour, rng.randrange(60)))
+            energy.append({"timestamp": at, "level": rng.randint(3, 10), "mood": rng.choice(_BENCH_MOODS),
+                           "activity": rng.choice(_BENCH_ACTIVITIES), "sleep_hours": 0.0, "notes": ""})
+            xp.append({"amount": 5, "source": "Energy log", "skill_name": "Énergie", "created_at": at})
+        duration = round(min(10.0, max(4.0, rng.gauss(7.2, 0.9))), 1)
+        bed = datetime.datetime.combine(day, datetime.time(22, 30)) + datetime.timedelta(minutes=rng.randint(-60, 90))
+        wake = bed + datetime.timedelta(hours=duration)
+        at = datetime.datetime.combine(day, datetime.time(9))
+        sleep.append({"date": day, "bedtime": bed.strftime("%H:%M"), "waketime": wake.strftime("%H:%M"),
+                      "duration": duration, "quality": rng.randint(4, 10),
+                      "deep_sleep": round(duration * rng.uniform(0.15, 0.25), 1), "notes": "", "created_at": at})
+        xp.append({"amount": 10, "source": "Sleep log", "skill_name": "Santé", "created_at": at})
+        if rng.random() < 0.5:
+            at = datetime.datetime.combine(day, datetime.time(21, rng.randrange(60)))
+            words = rng.choices(["focus", "sport", "projet", "idée", "fatigue", "lecture", "objectif"], k=40)
+            journal.append({"content": " ".join(words).capitalize() + ".", "mood": rng.choice(_BENCH_MOODS),
+                            "tags": ", ".join(sorted(set(words[:2]))), "created_at": at})
+            xp.append({"amount": 5, "source": "Journal", "skill_name": "Intelligence", "created_at": at})
+    
+    tables = [(Habit, habit_rows), (HabitLog, habit_logs), (EnergyLog, energy), (SleepLog, sleep),
+              (JournalEntry, journal), (XPLog, xp)]
+    with bind.begin() as conn:
+        for model, rows in tables:
+            for offset in range(0, len(rows), IMPORT_CHUNK_SIZE):
+                conn.execute(model.__table__.insert(), rows[offset:offset + IMPORT_CHUNK_SIZE])
+        resync_derived_data(conn, "habit_logs")
+        resync_derived_data(conn, "journal")
+        resync_derived_data(conn, "xp_logs")
+        resync_derived_data(conn, "sleep_logs")
+    return {model.__tablename__: len(rows) for model, rows in tables}
+
+_bench_state = SimpleNamespace(queries=0)
+
+def _count_queries(conn, cursor, statement, parameters, context, executemany):
+    _bench_state.queries += 1
+
+def _render(at, page: str) -> tuple:
+    """Rend une page, renvoie (ms, requêtes)"""
+    _bench_state.queries = 0
+    started = time.perf_counter()
+    at.sidebar.radio[0].set_value(page).run()
+    elapsed = (time.perf_counter() - started) * 1000
+    if at.exception:
+        raise RuntimeError(f"{page} : {at.exception[0].message}")
+    return elapsed, _bench_state.queries
+
+def run_benchmark(url: str, pages=BENCH_PAGES, runs: int = 3) -> dict:
+    """Rend chaque page headless (à froid puis à chaud) et mesure temps, requêtes et pic mémoire"""
+    from streamlit.testing.v1 import AppTest
+    
+    os.environ["AURA_DATABASE_URL"] = url
+    at = AppTest.from_file(os.path.abspath(__file__), default_timeout=300)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    
+    results = {}
+    event.listen(Engine, "before_cursor_execute", _count_queries)
+    try:
+        for page in pages:
+            cold, warm = [], []
+            for _ in range(runs):
+                st.cache_data.clear()
+                cold.append(_render(at, page))
+                warm.append(_render(at, page))
+            st.cache_data.clear()
+            tracemalloc.start()
+            _render(at, page)
+            peak = tracemalloc.get_traced_memory()[1] - at.session_state["_bench_memory_base"]
+            tracemalloc.stop()
+            results[page] = {
+                "cold_ms": round(statistics.median(ms for ms, _ in cold), 1),
+                "warm_ms": round(statistics.median(ms for ms, _ in warm), 1),
+                "cold_queries": cold[-1][1],
+                "warm_queries": warm[-1][1],
+                "peak_kib": round(peak / 1024),
+            }
+    finally:
+        event.remove(Engine, "before_cursor_execute", _count_queries)
+    return results
+
+BENCH_METRICS = ["cold_ms", "warm_ms", "cold_queries", "warm_queries", "peak_kib"]
+
+def compare_benchmarks(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Lignes de comparaison page/métrique ; une régression dépasse la tolérance relative"""
+    rows = []
+    for page, metrics in current["pages"].items():
+        before = baseline["pages"].get(page)
+        if not before:
+            continue
+        for metric in BENCH_METRICS:
+            old, new = before.get(metric), metrics[metric]
+            if old is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else math.inf)
+            rows.append({"page": page, "metric": metric, "baseline": old, "current": new,
+                         "change": change, "regression": change > tolerance})
+    return rows
+
+def benchmark_command(args) -> int:
+    """Sous-commande bench : base jetable, génération, mesures, JSON et comparaison"""
+    workdir = tempfile.mkdtemp(prefix="aura-bench-")
+    url = f"sqlite:///{os.path.join(workdir, 'aura_bench.db')}"
+    end = datetime.date.fromisoformat(args.end) if args.end else None
+    
+    started = time.perf_counter()
+    rows = generate_dataset(bootstrap(url), args.habits, args.years, args.seed, end)
+    generation = time.perf_counter() - started
+    print(f"Jeu de données : {sum(rows.values()):,} lignes en {generation:.1f} s {rows}")
+    
+    if not args.pages:
+        pages = BENCH_PAGES
+    elif args.pages == ["all"]:
+        pages = MENU_PAGES
+    else:
+        pages = [p for p in MENU_PAGES if any(k.lower() in p.lower() for k in args.pages)]
+    result = {
+        "meta": {"habits": args.habits, "years": args.years, "seed": args.seed, "runs": args.runs,
+                 "rows": rows, "generation_s": round(generation, 2),
+                 "python": sys.version.split()[0], "sqlite": sqlite3.sqlite_version,
+                 "created_at": datetime.datetime.now().isoformat(timespec="seconds")},
+        "pages": run_benchmark(url, pages, args.runs),
+    }
     
-    db.close()
+    print(f"{'page':<16}{'froid ms':>10}{'chaud ms':>10}{'req. froid':>12}{'req. chaud':>12}{'pic KiB':>10}")
+    for page, m in result["pages"].items():
+        print(f"{page:<16}{m['cold_ms']:>10}{m['warm_ms']:>10}{m['cold_queries']:>12}"
+              f"{m['warm_queries']:>12}{m['peak_kib']:>10}")
+    
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as out:
+            json.dump(result, out, ensure_ascii=False, indent=2)
+        print(f"Résultats écrits dans {args.out}")
+    
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as stream:
+        baseline = json.load(stream)
+    rows = compare_benchmarks(result, baseline, args.tolerance)
+    for row in rows:
+        flag = "  ⚠️ régression" if row["regression"] else ""
+        print(f"{row['page']:<16}{row['metric']:<14}{row['baseline']:>10} -> {row['current']:<10}"
+              f"{row['change']:+.0%}{flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
 
 # ══════════════════════════════════════════════════════════════════════════════
 # MAIN APP
 # ══════════════════════════════════════════════════════════════════════════════
 
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def create_app_engine(url: str = DATABASE_URL):
+    """Crée l'engine ; en SQLite, applique les pragmas à chaque connexion"""
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=DB_ECHO, pool_pre_ping=True)
+    path = make_url(url).database
+    if path and path != ":memory:":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    engine = create_engine(url, echo=DB_ECHO, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+@st.cache_resource(show_spinner=False)
+def bootstrap(url: str = DATABASE_URL):
+    """Engine, schéma, migrations et données par défaut : une fois par process"""
+    engine = create_app_engine(url)
+    install_version_tracking(engine)
+    install_sql_profiler(engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        init_profile(db)
+        init_skills(db)
+        init_achievements(db)
+    finally:
+        db.close()
+    return engine
+
+engine = bootstrap(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+PAGE_ROUTES = {
+    "🏠 Dashboard": page_dashboard,
+    "💰 Finance": page_finance,
+    "⚡ Énergie": page_energy,
+    "🔥 Habitudes": page_habits,
+    "🎯 Objectifs": page_goals,
+    "🧪 Projets": page_projects,
+    "📔 Journal": page_journal,
+    "🗒️ Notes": page_notes,
+    "😴 Sommeil": page_sleep,
+    "⚔️ Quêtes": page_quests,
+    "📊 Analytics": page_analytics,
+    "👤 Profil": page_profile,
+    "🤖 Coach IA": page_coach,
+    "🗄️ Données": page_data,
+}
+
 def main():
     """Point d'entrée principal"""
+    profiling = SQL_PROFILE or st.session_state.get("sql_profile", False)
     
-    # Sidebar et navigation
-    menu = render_sidebar()
-    
-    # Router vers la bonne page
-    if menu == "🏠 Dashboard":
-        page_dashboard()
-    elif menu == "💰 Finance":
-        page_finance()
-    elif menu == "⚡ Énergie":
-        page_energy()
-    elif menu == "🔥 Habitudes":
-        page_habits()
-    elif menu == "🎯 Objectifs":
-        page_goals()
-    elif menu == "🧪 Projets":
-        page_projects()
-    elif menu == "📔 Journal":
-        page_journal()
-    elif menu == "😴 Sommeil":
-        page_sleep()
-    elif menu == "⚔️ Quêtes":
-        page_quests()
-    elif menu == "📊 Analytics":
-        page_analytics()
-    elif menu == "👤 Profil":
-        page_profile()
-    elif menu == "🤖 Coach IA":
-        page_coach()
+    with sql_profiling("main", profiling) as trace:
+        # Séries interrompues remises à zéro au premier rerun du jour
+        ensure_daily_rollover()
+        
+        # Sidebar et navigation
+        with sql_scope("render_sidebar"):
+            menu = render_sidebar()
+        
+        # Router vers la bonne page
+        page = PAGE_ROUTES[menu]
+        if trace:
+            trace.page = page.__name__
+        if tracemalloc.is_tracing():
+            # bench : le pic mémoire ne compte que la page, pas la compilation du script
+            tracemalloc.reset_peak()
+            st.session_state["_bench_memory_base"] = tracemalloc.get_traced_memory()[0]
+        with sql_scope(page.__name__):
+            page()
+    
+    if not SQL_PROFILE:
+        st.sidebar.toggle("🐞 Profileur SQL", key="sql_profile")
+    if trace:
+        render_sql_panel(trace)
+
+def cli(argv) -> int:
+    """Commandes hors Streamlit : python aura-life.py import|export ..."""
+    parser = argparse.ArgumentParser(prog="aura-life.py", description="Aura Life OS - outils en ligne de commande")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    import_cmd = commands.add_parser("import", help="importer un fichier CSV/NDJSON")
+    import_cmd.add_argument("table", choices=list(IMPORT_SPECS))
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--format", choices=["csv", "ndjson"])
+    import_cmd.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    
+    export_cmd = commands.add_parser("export", help="exporter une table en CSV/NDJSON")
+    export_cmd.add_argument("table", choices=list(IMPORT_SPECS))
+    export_cmd.add_argument("path", help="fichier de sortie, ou - pour stdout")
+    export_cmd.add_argument("--format", choices=["csv", "ndjson"])
+    
+    seed_cmd = commands.add_parser("seed", help="remplir la base avec un jeu de données synthétique")
+    bench_cmd = commands.add_parser("bench", help="mesurer le rendu des pages sur une base synthétique")
+    for sub in (seed_cmd, bench_cmd):
+        sub.add_argument("--habits", type=int, default=10)
+        sub.add_argument("--years", type=float, default=2)
+        sub.add_argument("--seed", type=int, default=42)
+        sub.add_argument("--end", help="dernier jour généré (AAAA-MM-JJ, défaut : aujourd'hui)")
+    bench_cmd.add_argument("--pages", nargs="*", help="pages à mesurer (sous-chaînes du menu, ou all)")
+    bench_cmd.add_argument("--runs", type=int, default=3)
+    bench_cmd.add_argument("--out", help="fichier JSON de résultats")
+    bench_cmd.add_argument("--baseline", help="résultats JSON de référence à comparer")
+    bench_cmd.add_argument("--tolerance", type=float, default=0.2, help="régression relative tolérée")
+    
+    args = parser.parse_args(argv)
+    if args.command == "bench":
+        return benchmark_command(args)
+    if args.command == "seed":
+        end = datetime.date.fromisoformat(args.end) if args.end else None
+        rows = generate_dataset(engine, args.habits, args.years, args.seed, end)
+        print(f"{sum(rows.values()):,} lignes générées : {rows}")
+        return 0
+    
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    
+    if args.command == "import":
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            report = import_records(args.table, iter_records(stream, fmt), args.chunk_size)
+        print(f"{report.table}: {report.read} lus, {report.inserted} insérés, {report.duplicates} doublons, "
+              f"{report.invalid} invalides en {report.seconds:.2f} s ({report.rows_per_s:,.0f} lignes/s)")
+        for error in report.errors:
+            print(f"  {error}")
+    elif args.command == "export":
+        if args.path == "-":
+            count = export_table(args.table, sys.stdout, fmt)
+        else:
+            with open(args.path, "w", encoding="utf-8", newline="") as out:
+                count = export_table(args.table, out, fmt)
+        print(f"{args.table}: {count} lignes exportées", file=sys.stderr)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    if runtime.exists():
+        main()
+    else:
+        sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import pathlib
+
+import pytest
+
+APP_PATH = pathlib.Path(__file__).resolve().parent.parent / "aura-life.py"
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """Module aura-life chargé sur une base SQLite temporaire (partagée par les tests)"""
+    database = tmp_path_factory.mktemp("data") / "aura_life.db"
+    os.environ["AURA_DATABASE_URL"] = f"sqlite:///{database}"
+    spec = importlib.util.spec_from_file_location("aura_life", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def habit_id(app):
+    """Une habitude neuve"""
+    with app.UnitOfWork() as uow:
+        habit = app.Habit(name="Test", xp_reward=10, skill_target="Discipline", frequency="daily")
+        uow.db.add(habit)
+        uow.db.flush()
+        return habit.id
@@ -0,0 +1,31 @@
+import datetime
+
+def snapshot(app, habit_id, day):
+    """(logs de l'habitude, habits_done du jour, XP totale)"""
+    db = app.get_db()
+    try:
+        logs = db.query(app.HabitLog).filter(app.HabitLog.habit_id == habit_id).count()
+        feature = db.get(app.DailyFeature, day)
+        return logs, feature.habits_done if feature else 0, db.query(app.UserProfile.total_xp).scalar()
+    finally:
+        db.close()
+
+def test_complete_habit_twice_logs_once(app, habit_id):
+    day = datetime.date.today()
+    with app.UnitOfWork() as uow:
+        assert app.complete_habit(uow, habit_id, day) is not None
+    first = snapshot(app, habit_id, day)
+    assert first[0] == 1
+    
+    with app.UnitOfWork() as uow:
+        assert app.complete_habit(uow, habit_id, day) is None
+        assert uow.events == []
+    assert snapshot(app, habit_id, day) == first
+
+def test_uncomplete_habit_without_log_emits_nothing(app, habit_id):
+    day = datetime.date.today() - datetime.timedelta(days=3)
+    before = snapshot(app, habit_id, day)
+    with app.UnitOfWork() as uow:
+        assert app.uncomplete_habit(uow, habit_id, day) is None
+        assert uow.events == []
+    assert snapshot(app, habit_id, day) == before
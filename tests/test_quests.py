@@ -0,0 +1,24 @@
+import datetime
+
+def triple_habit_progress(app):
+    """Progression de la quête "Triple Habitude" en cours"""
+    db = app.get_db()
+    try:
+        active = (app.Quest.title == "Triple Habitude", app.Quest.expires_at > datetime.datetime.now())
+        return db.query(app.Quest.current_value).filter(*active).order_by(app.Quest.id.desc()).limit(1).scalar() or 0
+    finally:
+        db.close()
+
+def test_backdated_completion_does_not_advance_daily_quest(app, habit_id):
+    with app.UnitOfWork() as uow:
+        app.generate_daily_quests(uow.db)
+    today = datetime.date.today()
+    before = triple_habit_progress(app)
+    
+    with app.UnitOfWork() as uow:
+        app.complete_habit(uow, habit_id, today - datetime.timedelta(days=1))
+    assert triple_habit_progress(app) == before
+    
+    with app.UnitOfWork() as uow:
+        app.complete_habit(uow, habit_id, today)
+    assert triple_habit_progress(app) == before + 1